@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+YouTube API 転送量ベンチマーク
+部分レスポンス（fields=）と gzip の有無で、1回の投稿処理（search 1回 + videos 1回 + channels 1回）の
+転送バイト数と JSON 解析時間を比較します。
+
+使い方:
+    python bench_youtube_transfer.py                 # 実際の応答を模した合成データで比較（オフライン）
+    python bench_youtube_transfer.py --live AI       # 実APIで比較（YOUTUBE_API_KEY が必要。約204 units 消費）
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import statistics
+
+import requests
+
+from enhanced_auto_post_production import YOUTUBE_FIELDS, YOUTUBE_HEADERS
+
+RESULTS = 20
+CHANNELS = 12
+
+
+def _thumbnails(video_id):
+    return {size: {"url": f"https://i.ytimg.com/vi/{video_id}/{size}.jpg", "width": w, "height": h}
+            for size, w, h in (("default", 120, 90), ("medium", 320, 180), ("high", 480, 360))}
+
+
+def _etag(rng):
+    return "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_") for _ in range(27))
+
+
+def _text(rng, n):
+    words = ["ITパスポート", "勉強法", "解説", "入門", "セキュリティ", "クラウド", "AWS", "初心者", "わかりやすい",
+             "資格", "試験対策", "ネットワーク", "https://example.com/", "#shorts", "チャンネル登録", "よろしく"]
+    return " ".join(rng.choice(words) for _ in range(n))
+
+
+def synthetic_responses(seed=1):
+    """パイプラインが受け取る full / masked の応答（search, videos, channels）を作る"""
+    rng = random.Random(seed)
+    video_ids = [f"v{rng.randrange(10**9):010d}" for _ in range(RESULTS)]
+    channel_ids = [f"UC{rng.randrange(10**12):022d}" for _ in range(CHANNELS)]
+    search_items, video_items = [], []
+    for vid in video_ids:
+        cid = rng.choice(channel_ids)
+        snippet = {
+            "publishedAt": "2026-09-01T10:00:00Z", "channelId": cid, "title": _text(rng, 8),
+            "description": _text(rng, 30), "thumbnails": _thumbnails(vid), "channelTitle": _text(rng, 2),
+            "liveBroadcastContent": "none", "publishTime": "2026-09-01T10:00:00Z",
+        }
+        search_items.append({"kind": "youtube#searchResult", "etag": _etag(rng),
+                             "id": {"kind": "youtube#video", "videoId": vid}, "snippet": snippet})
+        video_items.append({
+            "kind": "youtube#video", "etag": _etag(rng), "id": vid,
+            "contentDetails": {"duration": "PT12M34S", "dimension": "2d", "definition": "hd", "caption": "false",
+                               "licensedContent": True, "contentRating": {}, "projection": "rectangular"},
+            "statistics": {"viewCount": str(rng.randrange(10**6)), "likeCount": str(rng.randrange(10**4)),
+                           "favoriteCount": "0", "commentCount": str(rng.randrange(10**3))},
+        })
+    channel_items = [{
+        "kind": "youtube#channel", "etag": _etag(rng), "id": cid,
+        "snippet": {"title": _text(rng, 2), "description": _text(rng, 200), "customUrl": "@example",
+                    "publishedAt": "2015-01-01T00:00:00Z", "thumbnails": _thumbnails(cid),
+                    "localized": {"title": _text(rng, 2), "description": _text(rng, 200)}, "country": "JP"},
+        "statistics": {"viewCount": str(rng.randrange(10**8)), "subscriberCount": str(rng.randrange(10**6)),
+                       "hiddenSubscriberCount": False, "videoCount": str(rng.randrange(10**3))},
+    } for cid in channel_ids]
+    page = {"kind": "youtube#searchListResponse", "etag": _etag(rng), "nextPageToken": "CBQQAA", "regionCode": "JP",
+            "pageInfo": {"totalResults": 1000000, "resultsPerPage": RESULTS}}
+    full = {
+        "search": {**page, "items": search_items},
+        "videos": {"kind": "youtube#videoListResponse", "etag": _etag(rng), "items": video_items,
+                   "pageInfo": {"totalResults": RESULTS, "resultsPerPage": RESULTS}},
+        "channels": {"kind": "youtube#channelListResponse", "etag": _etag(rng), "items": channel_items,
+                     "pageInfo": {"totalResults": CHANNELS, "resultsPerPage": CHANNELS}},
+    }
+    masked = {
+        "search": {"items": [{"id": {"videoId": i["id"]["videoId"]},
+                              "snippet": {k: i["snippet"][k] for k in ("publishedAt", "channelId", "title",
+                                                                        "description", "channelTitle")}
+                              | {"thumbnails": {"high": {"url": i["snippet"]["thumbnails"]["high"]["url"]}}}}
+                             for i in search_items]},
+        "videos": {"etag": _etag(rng), "items": [{"id": i["id"], "statistics": {"viewCount": i["statistics"]["viewCount"]},
+                                                "contentDetails": {"duration": i["contentDetails"]["duration"]}}
+                                               for i in video_items]},
+        "channels": {"etag": _etag(rng), "items": [{"id": i["id"],
+                                                  "statistics": {"subscriberCount": i["statistics"]["subscriberCount"]}}
+                                                 for i in channel_items]},
+    }
+    return full, masked
+
+
+def measure(bodies, repeat=200):
+    """応答ごとの (展開後バイト, gzip後バイト, JSON解析時間の中央値[秒])"""
+    result = {}
+    for endpoint, body in bodies.items():
+        raw = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            json.loads(raw)
+            timings.append(time.perf_counter() - start)
+        result[endpoint] = (len(raw), len(gzip.compress(raw)), statistics.median(timings))
+    return result
+
+
+def print_table(rows):
+    print(f"{'転送量':>9}{'(比率)':>9}{'展開後':>10}{'JSON解析':>10}  構成")
+    base = None
+    for label, (wire, body, parse) in rows:
+        base = base or wire
+        print(f"{wire / 1024:>6.1f} KB{wire / base * 100:>8.1f}%{body / 1024:>7.1f} KB{parse * 1e6:>8.0f} µs  {label}")
+
+
+def offline():
+    full, masked = synthetic_responses()
+    m_full, m_masked = measure(full), measure(masked)
+
+    def total(m, compressed):
+        return (sum(v[1] if compressed else v[0] for v in m.values()), sum(v[0] for v in m.values()),
+                sum(v[2] for v in m.values()))
+
+    print("📊 1回の投稿処理あたり（合成データ: search 20件 / videos 20件 / channels 12件）")
+    print_table([
+        ("full・非圧縮（従来）", total(m_full, False)),
+        ("full・gzip", total(m_full, True)),
+        ("fields・非圧縮", total(m_masked, False)),
+        ("fields・gzip（現在）", total(m_masked, True)),
+    ])
+    print()
+    for endpoint in full:
+        f, m = m_full[endpoint], m_masked[endpoint]
+        print(f"   {endpoint:<9} {f[0] / 1024:6.1f} KB → {m[1] / 1024:5.1f} KB（gzip後）  "
+              f"解析 {f[2] * 1e6:5.0f} µs → {m[2] * 1e6:5.0f} µs")
+
+
+def live(query):
+    api_key = os.getenv("YOUTUBE_API_KEY")
+    if not api_key:
+        print("❌ YOUTUBE_API_KEY が設定されていません")
+        return
+    base = "https://www.googleapis.com/youtube/v3"
+
+    def run(masked, compressed):
+        headers = dict(YOUTUBE_HEADERS) if compressed else {"Accept-Encoding": "identity"}
+        wire = body = parse = 0.0
+
+        def get(endpoint, params):
+            nonlocal wire, body, parse
+            if masked:
+                params = {**params, "fields": YOUTUBE_FIELDS[endpoint]}
+            r = requests.get(f"{base}/{endpoint}", params={**params, "key": api_key}, headers=headers, timeout=30)
+            r.raise_for_status()
+            wire += r.raw.tell() or len(r.content)
+            body += len(r.content)
+            start = time.perf_counter()
+            data = json.loads(r.content)
+            parse += time.perf_counter() - start
+            return data
+
+        data = get("search", {"part": "snippet", "q": query, "type": "video", "maxResults": RESULTS,
+                              "regionCode": "JP", "relevanceLanguage": "ja"})
+        vids = [i["id"]["videoId"] for i in data.get("items", [])]
+        chans = sorted({i["snippet"]["channelId"] for i in data.get("items", [])})
+        get("videos", {"part": "statistics,contentDetails", "id": ",".join(vids)})
+        get("channels", {"part": "statistics" if masked else "statistics,snippet", "id": ",".join(chans)})
+        return wire, body, parse
+
+    print(f"📊 実API: {query}")
+    print_table([("full・非圧縮（従来）", run(False, False)), ("fields・gzip（現在）", run(True, True))])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "--live":
+        live(sys.argv[2])
+    elif len(sys.argv) == 1:
+        offline()
+    else:
+        print(__doc__)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+投稿候補プールの保存
+pool_replenisher.py が日中に検索・スコアリングしておいた未投稿の高品質動画を、カテゴリ（ContentCategory）と
+スケジュールのキーワードごとのプールに保存します。当日の自動投稿は、プールに未投稿の高品質動画が
+POST_VIDEOS 本以上あれば検索せずにそこから選びます（スケジュールの日はそのキーワードのプールを合わせて見ます）。プールを書き換えるのは補充処理だけで、
+自動投稿は読むだけです（投稿済みの動画は投稿履歴から判定して除外します）。
+"""
+
+import os
+import json
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Set
+
+POOL_FILE = Path(__file__).parent / "state" / "candidate_pools.json"
+
+# 1回の投稿で紹介する動画数。プールにこの本数以上の高品質動画がなければ当日に検索する
+POST_VIDEOS = 3
+# 未投稿の高品質動画がこの本数を下回ったプールを補充する
+LOW_WATER = 6
+# 1つのプールに置く動画の上限（スコアの高い順）
+HIGH_WATER = 15
+# プールに入れてからこの日数を過ぎた動画は使わない（再生数・登録者数が古くなるため）。
+# スケジュールのキーワードは週に1回しか使われないため、1回の検索で数週分を賄えるようにする
+MAX_AGE_DAYS = 28
+# 同じプールで同じキーワードを検索し直すまでの日数（すぐに検索し直してもほぼ同じ結果になるため）。
+# 検索しても新しい動画が POST_VIDEOS 本未満しか増えなかったキーワードは、続いた回数に応じて
+# 最大 MAX_AGE_DAYS 日まで間隔を倍にする
+REFRESH_DAYS = 3
+# 補充で消費したクォータを残す日数
+QUOTA_DAYS = 7
+
+
+def category_pool_key(category: str) -> str:
+    """ContentCategory の値（technical など）のプール"""
+    return f"category:{category}"
+
+
+def keyword_pool_key(keyword: str) -> str:
+    """スケジュールのキーワードのプール"""
+    return f"keyword:{keyword}"
+
+
+class CandidatePools:
+    """
+    プールのキー → {label, keywords, candidates（スコア付きの動画。keyword・pooled_at 付き）, searched（キーワード → 検索日時）,
+    dry（キーワード → 新しい動画が POST_VIDEOS 本未満だった検索の連続回数）}。
+    quota は日付（YYYY-MM-DD）→ 補充で消費したクォータ。
+    """
+
+    def __init__(self, path: Path = POOL_FILE):
+        self.path = Path(path)
+        self.pools: Dict[str, Dict] = {}
+        self.quota: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.pools = data.get("pools", {})
+            self.quota = data.get("quota", {})
+        except FileNotFoundError:
+            self.pools = {}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 候補プールの読み込みエラー: {e}")
+            self.pools = {}
+
+    def candidates(self, key: str, posted: Set[str], now: datetime) -> List[Dict]:
+        """未投稿で、プールに入れてから MAX_AGE_DAYS 日以内の動画（コピー）"""
+        cutoff = (now - timedelta(days=MAX_AGE_DAYS)).isoformat(timespec="seconds")
+        pool = self.pools.get(key, {})
+        return [dict(v) for v in pool.get("candidates", [])
+                if v["video_id"] not in posted and v.get("pooled_at", "") >= cutoff]
+
+    def union(self, keys: List[str], posted: Set[str], now: datetime) -> List[Dict]:
+        """複数のプールの candidates（同じ動画は先のプールのものだけ）"""
+        seen: Set[str] = set()
+        videos = []
+        for key in keys:
+            for v in self.candidates(key, posted, now):
+                if v["video_id"] not in seen:
+                    seen.add(v["video_id"])
+                    videos.append(v)
+        return videos
+
+    def fill(self, keys: List[str], posted: Set[str], now: datetime, cutoff: float) -> int:
+        """プール（複数なら合わせて）にある未投稿の高品質動画の本数"""
+        return sum(1 for v in self.union(keys, posted, now) if v.get("quality_score", 0) >= cutoff)
+
+    def keywords_due(self, key: str, now: datetime) -> List[str]:
+        """プールのキーワードのうち、検索し直す間隔（REFRESH_DAYS 日から、空振りが続くと倍々）が過ぎたもの"""
+        pool = self.pools.get(key, {})
+        searched, dry = pool.get("searched", {}), pool.get("dry", {})
+        due = []
+        for k in pool.get("keywords", []):
+            wait = min(REFRESH_DAYS * 2 ** dry.get(k, 0), MAX_AGE_DAYS)
+            if searched.get(k, "") < (now - timedelta(days=wait)).isoformat(timespec="seconds"):
+                due.append(k)
+        return due
+
+    def sync(self, wanted: Dict[str, Dict], posted: Set[str], now: datetime):
+        """
+        プールを wanted（キー → {label, keywords}）に合わせる。不要になったプールを捨て、
+        投稿済み・期限切れの動画を取り除く
+        """
+        with self._lock:
+            self.pools = {key: {**self.pools.get(key, {}), **spec, "candidates": self.candidates(key, posted, now)}
+                          for key, spec in wanted.items()}
+
+    def add(self, key: str, keyword: str, videos: Iterable[Dict], posted: Set[str], now: datetime, cutoff: float) -> int:
+        """検索した動画のうち未投稿の高品質動画をプールに加え（スコアの高い順に HIGH_WATER 本まで）、増えた本数を返す"""
+        stamp = now.isoformat(timespec="seconds")
+        with self._lock:
+            pool = self.pools.setdefault(key, {"label": key, "keywords": [keyword]})
+            pool.setdefault("searched", {})[keyword] = stamp
+            candidates = pool.setdefault("candidates", [])
+            have = {v["video_id"] for v in candidates}
+            before = len(candidates)
+            for v in videos:
+                if v["video_id"] in have or v["video_id"] in posted or v.get("quality_score", 0) < cutoff:
+                    continue
+                candidates.append({**v, "keyword": keyword, "pooled_at": stamp})
+                have.add(v["video_id"])
+            added = len(candidates) - before
+            dry = pool.setdefault("dry", {})
+            dry[keyword] = 0 if added >= POST_VIDEOS else dry.get(keyword, 0) + 1
+            candidates.sort(key=lambda v: v.get("quality_score", 0), reverse=True)
+            del candidates[HIGH_WATER:]
+            return max(0, len(candidates) - before)
+
+    def spent(self, day: str) -> int:
+        return self.quota.get(day, 0)
+
+    def spend(self, day: str, units: int):
+        with self._lock:
+            self.quota[day] = self.quota.get(day, 0) + units
+            for old in sorted(self.quota)[:-QUOTA_DAYS]:
+                del self.quota[old]
+
+    def save(self):
+        with self._lock:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=".candidate_pools-", suffix=".json")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(json.dumps({"pools": self.pools, "quota": self.quota}, ensure_ascii=False, indent=2))
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"⚠️ 候補プールの保存エラー: {e}")
+
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+チャットワーク投稿の永続アウトボックス
+作成済みメッセージを冪等キー（ルーム＋日付＋スケジュールID）付きで保存してから送信し、
+失敗時は検索・スコアリングをやり直さずに再送できるようにします。
+
+使い方:
+    python chatwork_outbox.py status   # 未送信・送信済みの一覧
+    python chatwork_outbox.py drain    # 未送信メッセージを再送
+    python chatwork_outbox.py drain --retry-failed   # 送信失敗・再試行上限のメッセージも送り直す
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+
+from work_lease import WorkLeases
+
+STATE_DIR = Path(__file__).parent / "state"
+OUTBOX_FILE = STATE_DIR / "chatwork_outbox.sqlite3"
+
+PENDING = "pending"
+SENDING = "sending"  # 送信を開始したが結果を記録できていない（クラッシュ時は送信済みか不明）
+SENT = "sent"
+FAILED = "failed"
+
+
+def make_idempotency_key(room_id: str, date: str, schedule_id: str) -> str:
+    return f"{room_id}:{date}:{schedule_id}"
+
+
+class ChatworkOutbox:
+    """SQLite に保存するアウトボックス。状態遷移は pending → sending → sent / failed"""
+
+    def __init__(self, path: Path = OUTBOX_FILE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                idempotency_key TEXT PRIMARY KEY,
+                room_id TEXT NOT NULL,
+                body TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                message_id TEXT,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def enqueue(self, key: str, room_id: str, body: str) -> bool:
+        """メッセージを保存する。同じキーが既にあれば何もせず False を返す"""
+        now = time.time()
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO outbox (idempotency_key, room_id, body, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, room_id, body, PENDING, now, now),
+            )
+            return cur.rowcount == 1
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM outbox WHERE idempotency_key = ?", (key,)).fetchone()
+        return dict(row) if row else None
+
+    def unsent(self) -> List[Dict]:
+        """未送信（pending / sending）のメッセージを古い順に返す"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM outbox WHERE status IN (?, ?) ORDER BY created_at", (PENDING, SENDING)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def requeue(self, keys: Optional[List[str]] = None) -> int:
+        """
+        送信失敗（failed）・未送信（pending）のメッセージを再試行回数0の pending に戻し、戻した件数を返す。
+        トークンの期限切れなどを直した後や、再試行回数の上限に達したメッセージを送り直すときに使う。
+        sending（送信済みか不明）のものは二重投稿を避けるため戻さない
+        """
+        sql = "UPDATE outbox SET status = ?, attempts = 0, updated_at = ? WHERE status IN (?, ?)"
+        params: list = [PENDING, time.time(), FAILED, PENDING]
+        if keys is not None:
+            sql += f" AND idempotency_key IN ({', '.join('?' for _ in keys)})"
+            params += keys
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params).rowcount
+
+    def all(self, limit: int = 50) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM outbox ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(r) for r in rows]
+
+    def claim(self, key: str, attempts: int) -> bool:
+        """
+        送信する権利を取る（sending にして再試行回数を1つ進める）。読み込んだときから再試行回数が変わっていない
+        未送信・送信失敗のメッセージでなければ取れない（他の送信処理が先に取った）ため、取れたときだけ送信する
+        """
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = NULL, updated_at = ? "
+                "WHERE idempotency_key = ? AND status IN (?, ?, ?) AND attempts = ?",
+                (SENDING, time.time(), key, PENDING, SENDING, FAILED, attempts),
+            )
+            return cur.rowcount == 1
+
+    def mark(self, key: str, status: str, message_id: Optional[str] = None, error: Optional[str] = None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, message_id = COALESCE(?, message_id), last_error = ?, "
+                "updated_at = ? WHERE idempotency_key = ?",
+                (status, message_id, error, time.time(), key),
+            )
+
+
+class ChatworkSender:
+    """
+    アウトボックスを送信する。5xx・通信エラーは指数バックオフで再試行し、
+    429 やレート制限ヘッダ（x-ratelimit-remaining / x-ratelimit-reset）に従って待機する。
+    送信途中でクラッシュした（sending のまま残った）メッセージは、ルームの最新メッセージに
+    同じ本文があるかを確認してから再送するため二重投稿しない。
+    送信前にアウトボックスの行を claim() で取るため、同じメッセージを複数の送信処理（drain と今すぐ送信など）が
+    同時に送ることはない。sending の行は stale_sending 秒たつまでは他の送信処理が送信中とみなす。
+    leases を渡すと、drain() は冪等キーごとに作業リースを取ってから送信し（他のインスタンスが処理中のものは
+    送らない）、送信済みになれば完了にする。自分で取ったリースは送信できなければ手放す。
+    """
+
+    def __init__(self, api_token: str, outbox: ChatworkOutbox, base_url: str = "https://api.chatwork.com/v2",
+                 max_attempts: int = 5, backoff: float = 2.0, max_wait: float = 60.0, timeout: float = 10.0,
+                 leases: Optional[WorkLeases] = None):
+        self.api_token = api_token
+        self.outbox = outbox
+        self.base_url = base_url
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.leases = leases
+        self.rate_limit_reset = 0.0  # この時刻まではレート制限で送信しない
+        # 送信中の処理が投稿と確認（バックオフ込み）を終えるまでの時間
+        self.stale_sending = 2 * timeout + max_wait
+        self._lock = threading.Lock()
+
+    def _headers(self) -> Dict[str, str]:
+        return {"X-ChatWorkToken": self.api_token}
+
+    def _observe_rate_limit(self, response: requests.Response):
+        remaining = response.headers.get("x-ratelimit-remaining")
+        reset = response.headers.get("x-ratelimit-reset")
+        if response.status_code == 429 or (remaining is not None and remaining.strip() == "0"):
+            try:
+                until = float(reset)
+            except (TypeError, ValueError):
+                until = time.time() + self.backoff
+            # ジョブのスレッドから同時に送信されるため、遅い方の解除時刻を残す
+            with self._lock:
+                self.rate_limit_reset = max(self.rate_limit_reset, until)
+
+    def _sleep(self, seconds: float, deadline: Optional[float]):
+        """期限を越えない範囲で待つ"""
+        left = self._time_left(deadline)
+        time.sleep(max(0.0, seconds if left is None else min(seconds, left)))
+
+    def _wait_for_rate_limit(self, left: Optional[float] = None):
+        with self._lock:
+            delay = self.rate_limit_reset - time.time()
+        if delay > 0:
+            delay = min(delay, self.max_wait) if left is None else min(delay, self.max_wait, max(0.0, left))
+            print(f"⏳ チャットワークのレート制限により {delay:.1f}秒待機")
+            time.sleep(delay)
+
+    def already_posted(self, room_id: str, body: str) -> Optional[bool]:
+        """ルームの最新メッセージに同じ本文があるか。確認できなければ None"""
+        try:
+            response = requests.get(f"{self.base_url}/rooms/{room_id}/messages", headers=self._headers(),
+                                    params={"force": 1}, timeout=self.timeout)
+            self._observe_rate_limit(response)
+            if response.status_code == 204:
+                return False
+            if response.status_code != 200:
+                return None
+            return any(m.get("body", "").strip() == body.strip() for m in response.json())
+        except (requests.RequestException, ValueError):
+            return None
+
+    def _time_left(self, deadline: Optional[float]) -> Optional[float]:
+        return None if deadline is None else deadline - time.monotonic()
+
+    def send(self, item: Dict, deadline: Optional[float] = None) -> str:
+        """
+        1件送信して最終状態を返す。
+        deadline（time.monotonic() 基準）を過ぎたら再試行せず、未送信のままアウトボックスに残す。
+        """
+        key = item["idempotency_key"]
+        if item["status"] == SENT:
+            return SENT
+        if item["status"] == SENDING:
+            if time.time() - item["updated_at"] < self.stale_sending:
+                print(f"⏳ 他の送信処理が送信中です: {key}")
+                return SENDING
+            posted = self.already_posted(item["room_id"], item["body"])
+            if posted is None:
+                print(f"⚠️ 送信済みか確認できないため再送を保留: {key}")
+                return SENDING
+            if posted:
+                print(f"✅ 前回の送信が届いていたため送信済みにしました: {key}")
+                self.outbox.mark(key, SENT)
+                return SENT
+
+        attempts = item["attempts"]
+        first = True
+        while attempts < self.max_attempts:
+            left = self._time_left(deadline)
+            if not first and left is not None and left <= 0:
+                print(f"⏱️ 期限を過ぎたため再試行を次回に持ち越します: {key}")
+                return PENDING
+            first = False
+            self._wait_for_rate_limit(left)
+            if not self.outbox.claim(key, attempts):
+                current = self.outbox.get(key) or {}
+                print(f"⏭️ 他の送信処理が先に送信を始めたため送信しません: {key}")
+                return current.get("status", SENDING)
+            attempts += 1
+            # 期限が近くても1回は送信を試みる
+            timeout = self.timeout if left is None else max(1.0, min(self.timeout, left))
+            try:
+                response = requests.post(f"{self.base_url}/rooms/{item['room_id']}/messages",
+                                         headers=self._headers(), data={"body": item["body"]}, timeout=timeout)
+            except requests.RequestException as e:
+                # 送信できたか不明なので、再送前にルームを確認する
+                print(f"❌ 投稿エラー: {e}")
+                self._sleep(min(self.backoff ** attempts, self.max_wait), deadline)
+                posted = self.already_posted(item["room_id"], item["body"])
+                if posted:
+                    self.outbox.mark(key, SENT)
+                    return SENT
+                if posted is None:
+                    self.outbox.mark(key, SENDING, error=str(e))
+                    return SENDING
+                continue
+
+            self._observe_rate_limit(response)
+            if response.status_code == 200:
+                message_id = None
+                try:
+                    message_id = str(response.json().get("message_id"))
+                except ValueError:
+                    pass
+                self.outbox.mark(key, SENT, message_id=message_id)
+                return SENT
+
+            error = f"{response.status_code}: {response.text[:200]}"
+            print(f"❌ 投稿失敗: {error}")
+            if response.status_code == 429 or response.status_code >= 500:
+                # 受理されていない応答なので再送してよい
+                self.outbox.mark(key, PENDING, error=error)
+                if response.status_code != 429:
+                    self._sleep(min(self.backoff ** attempts, self.max_wait), deadline)
+                continue
+            self.outbox.mark(key, FAILED, error=error)
+            return FAILED
+
+        print(f"❌ 再試行回数の上限に達しました: {key}")
+        return PENDING
+
+    def drain(self, keys: Optional[List[str]] = None, deadline: Optional[float] = None) -> Dict[str, str]:
+        """未送信メッセージ（keys 指定時はそのキーのみ）を送信し、キーごとの最終状態を返す"""
+        results = {}
+        for item in self.outbox.unsent():
+            key = item["idempotency_key"]
+            if keys is not None and key not in keys:
+                continue
+            if self.leases is None:
+                results[key] = self.send(item, deadline=deadline)
+                continue
+            # 自動投稿・即時配信が既に取っているリースはそのまま使い、完了・解放はその処理に任せる
+            held = self.leases.holds(key)
+            if not held and not self.leases.claim(key):
+                print(f"🔒 他のインスタンスが処理中または処理済みのため送信しません: {key}")
+                continue
+            status = SENDING
+            try:
+                status = results[key] = self.send(item, deadline=deadline)
+            finally:
+                if not held and status == SENT:
+                    self.leases.complete(key)
+                elif not held:
+                    self.leases.release(key)
+        return results
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    outbox = ChatworkOutbox()
+    if command == "status":
+        for item in outbox.all():
+            print(f"{item['status']:8} attempts={item['attempts']} {item['idempotency_key']}"
+                  f"{'  ' + item['last_error'] if item['last_error'] else ''}")
+    elif command == "drain":
+        api_token = os.getenv("CHATWORK_API_TOKEN")
+        if not api_token:
+            print("❌ CHATWORK_API_TOKEN が設定されていません")
+            return
+        if "--retry-failed" in sys.argv[2:]:
+            print(f"🔁 {outbox.requeue()}件を送り直します")
+        results = ChatworkSender(api_token, outbox, leases=WorkLeases()).drain()
+        for key, status in results.items():
+            print(f"{status:8} {key}")
+        if not results:
+            print("✅ 未送信メッセージはありません")
+    else:
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,16 +2,208 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
+import argparse
 import requests
 import json
 import random
+import re
 import time
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Tuple, Optional
+from typing import Any, Callable, Iterator, List, Dict, Tuple, Optional, NamedTuple
 from enum import Enum
 from pathlib import Path
 from urllib.parse import quote
 
+from candidate_pool import POOL_FILE, POST_VIDEOS, CandidatePools, category_pool_key, keyword_pool_key
+from chatwork_outbox import FAILED, PENDING, SENT, ChatworkOutbox, ChatworkSender, make_idempotency_key
+from jp_holidays import holiday_name
+from keyword_bandit import KeywordBandit
+from post_history import PostHistory
+from post_plan import PLAN_FILE, PostPlan
+from query_similarity import SearchQueryIndex, blend_search_results
+from single_flight import SingleFlight, normalize_query
+from run_budget import BUDGET_LOG, RunBudget
+from run_checkpoint import CHECKPOINT_DIR, RunCheckpoint
+from video_stats_store import CHANNEL, VIDEO, VideoStatsStore
+from work_lease import WorkLeases
+from youtube_cache import YouTubeResponseCache
+from youtube_resilience import RESILIENCE_FILE, CircuitBreaker, CircuitOpenError, ResilientCaller
+
+# 投稿できなかった実行の結果（プロセスは終了コード1で終了する）
+FAILED_RUN_STATUSES = ("failed", "error", "no_videos")
+# 流用する検索結果（同じ検索・類似検索のキャッシュ）からは、この日数以内に投稿した動画を除く
+REUSE_REPOST_DAYS = 30
+
+# 日付・曜日の判定はすべて日本時間で行う
+JST = timezone(timedelta(hours=9))
+
+# YouTube Data API v3 のエンドポイントごとのクォータ消費量
+YOUTUBE_QUOTA_COST = {"search": 100, "videos": 1, "channels": 1}
+
+# パイプラインで使う項目だけを返させる部分レスポンス指定（fields=）
+YOUTUBE_FIELDS = {
+    "search": "items(id/videoId,snippet(publishedAt,channelId,title,description,channelTitle,thumbnails/high/url))",
+    "videos": "etag,items(id,statistics/viewCount,contentDetails/duration)",
+    "channels": "etag,items(id,statistics/subscriberCount)",
+}
+
+# YouTube API は Accept-Encoding に加えて User-Agent に "gzip" を含む場合に圧縮して返す
+YOUTUBE_HEADERS = {
+    "Accept-Encoding": "gzip",
+    "User-Agent": "it-helpdesk-learning-system/1.0 (gzip)",
+}
+
+class YouTubeAPIError(Exception):
+    """YouTube API が 200 以外を返した"""
+
+    def __init__(self, status_code: int, detail: str = ""):
+        super().__init__(f"HTTP {status_code}: {detail}")
+        self.status_code = status_code
+
+# 同じ検索（正規化したキーワード＋パラメータ、同じ配点・絞り込み条件）はプロセス内の全スケジュール・ルームで合流させる
+SEARCH_FLIGHT = SingleFlight(window=300.0)
+
+class YouTubeResponse(NamedTuple):
+    """YouTube API の応答（304 Not Modified の場合 body は None）"""
+    status_code: int
+    body: Optional[Dict]
+    etag: Optional[str]
+    size: int  # 展開後の本文サイズ（バイト）
+    wire_size: int = 0  # 転送時（圧縮後）のサイズ（バイト）
+    parse_seconds: float = 0.0
+
+# タイトルに含まれていれば品質が高いとみなす語
+TITLE_QUALITY_KEYWORDS = (
+    '解説', 'わかりやすい', '入門', '基礎', '実践', '方法',
+    '初心者', '完全版', 'まとめ', 'ノウハウ', 'コツ', '攻略'
+)
+
+class ScoringWeights(NamedTuple):
+    """
+    品質スコアの配点と閾値。各段階は (閾値, 点数) の組を上から順に判定し、最初に当てはまったものを加点する。
+    cutoff 点以上の動画を高品質として優先的に紹介する（scoring_sweep.py で配点を比較できる）。
+    """
+    subscriber_tiers: Tuple[Tuple[float, float], ...] = ((100000, 30), (50000, 25), (10000, 20), (1000, 10))
+    view_tiers: Tuple[Tuple[float, float], ...] = ((100000, 25), (50000, 20), (10000, 15), (1000, 10))
+    # (最短秒, 最長秒, 点数)。短すぎず長すぎない動画を優先
+    duration_tiers: Tuple[Tuple[float, float, float], ...] = ((300, 1800, 20), (180, 300, 15), (1800, 3600, 15))
+    title_points: float = 5
+    title_max: float = 15
+    # (経過日数以内, 点数)
+    recency_tiers: Tuple[Tuple[float, float], ...] = ((30, 10), (90, 8), (180, 6), (365, 4))
+    velocity_tiers: Tuple[Tuple[float, float], ...] = ((5000, 10), (1000, 7), (200, 4), (50, 2))
+    cutoff: float = 50
+
+def score_features(weights: ScoringWeights, subscribers: float, views: float, duration_seconds: float,
+                   title_hits: int, days_ago: Optional[float], views_per_day: Optional[float]) -> float:
+    """特徴量から品質スコアを計算する（days_ago・views_per_day が不明なら None）"""
+    score = 0.0
+    for threshold, points in weights.subscriber_tiers:
+        if subscribers >= threshold:
+            score += points
+            break
+    for threshold, points in weights.view_tiers:
+        if views >= threshold:
+            score += points
+            break
+    for shortest, longest, points in weights.duration_tiers:
+        if shortest <= duration_seconds <= longest:
+            score += points
+            break
+    score += min(title_hits * weights.title_points, weights.title_max)
+    if days_ago is not None:
+        for limit, points in weights.recency_tiers:
+            if days_ago <= limit:
+                score += points
+                break
+    if views_per_day is not None:
+        for threshold, points in weights.velocity_tiers:
+            if views_per_day >= threshold:
+                score += points
+                break
+    return min(score, 100.0)
+
+ISO_DURATION_PATTERN = re.compile(r'PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?')
+
+def parse_duration(duration_str: str) -> int:
+    """ISO 8601形式の時間（PT1H2M3S）を秒数に変換（解釈できなければ 0）"""
+    match = ISO_DURATION_PATTERN.match(duration_str or '')
+    if not match:
+        return 0
+    hours, minutes, seconds = (int(x) if x else 0 for x in match.groups())
+    return hours * 3600 + minutes * 60 + seconds
+
+# 検索の videoDuration で指定できる長さの区分（最短秒, 最長秒未満）
+YOUTUBE_DURATION_BUCKETS = {"short": (0, 240), "medium": (240, 1200), "long": (1200, None)}
+
+class SearchPushdown(NamedTuple):
+    """
+    検索リクエストで YouTube 側に絞り込ませる条件（None は絞り込まない）。
+    条件から外れる動画は検索結果に入らないため、その詳細取得とスコアリングをしなくて済む。
+    """
+    video_duration: Optional[str] = None  # short / medium / long
+    published_within_days: Optional[int] = None
+    video_definition: Optional[str] = None  # high（HDのみ）
+    video_caption: Optional[str] = None  # closedCaption（字幕ありのみ）
+
+    def search_params(self, now: datetime) -> Dict:
+        params = {}
+        if self.video_duration:
+            params['videoDuration'] = self.video_duration
+        if self.published_within_days:
+            # 月初に切り下げ、同じ月の検索はキャッシュキーが変わらないようにする
+            since = now - timedelta(days=self.published_within_days)
+            params['publishedAfter'] = since.strftime('%Y-%m-01T00:00:00Z')
+        if self.video_definition:
+            params['videoDefinition'] = self.video_definition
+        if self.video_caption:
+            params['videoCaption'] = self.video_caption
+        return params
+
+    def excludes(self, video: Dict, now: datetime) -> bool:
+        """動画が条件から外れているか（長さ・公開日のみ判定。YouTube 側で絞り込めているかの確認用）"""
+        if self.video_duration:
+            shortest, longest = YOUTUBE_DURATION_BUCKETS[self.video_duration]
+            seconds = video.get('duration_seconds', 0)
+            if seconds < shortest or (longest is not None and seconds >= longest):
+                return True
+        if self.published_within_days:
+            since = self.search_params(now)['publishedAfter'][:10]
+            if video.get('published_at', '') < since:
+                return True
+        return False
+
+def pushdown_from_scoring(weights: ScoringWeights) -> SearchPushdown:
+    """
+    品質スコアの配点から検索条件を決める。区分内のどの長さでも長さの点が入る videoDuration の区分（複数あれば最も広いもの）と、
+    新しさの点が入る期間を絞り込む。画質・字幕は配点にないため絞り込まない。
+    長さ・新しさの点はスコアの一部でしかなく、区分外の長さ（20〜60分など）や1年以上前の動画でも
+    選ばれることがあるため、この条件で絞り込むと選ばれる動画が変わりうる（SEARCH_PUSHDOWN=1 のときだけ使う）。
+    """
+    covered = []
+    for name, (shortest, longest) in YOUTUBE_DURATION_BUCKETS.items():
+        if longest is None:
+            continue
+        # 区分の全体が配点のある長さの範囲（連続する段階をつないだもの）に収まるか
+        start = shortest
+        for lo, hi, points in sorted(weights.duration_tiers):
+            if points > 0 and lo <= start <= hi:
+                start = hi
+        if start >= longest - 1:
+            covered.append((longest - shortest, name))
+    recency = [limit for limit, points in weights.recency_tiers if points > 0]
+    return SearchPushdown(video_duration=max(covered)[1] if covered else None,
+                          published_within_days=int(max(recency)) if recency else None)
+
+def is_youtube_failure(error: BaseException) -> bool:
+    """サーキットブレーカーの失敗として数える例外か（リクエスト不正などの4xxは数えない）"""
+    if isinstance(error, YouTubeAPIError):
+        return error.status_code >= 500 or error.status_code in (403, 429)
+    return True
+
 class ContentCategory(Enum):
     TECHNICAL = "technical"
     HUMAN_SKILLS = "human_skills"
@@ -19,17 +211,104 @@ class ContentCategory(Enum):
     ADVANCED_IT = "advanced_it"  # 先端IT分野（AI、IoT、クラウド、セキュリティ）
     MIXED = "mixed"
 
+# 平日に get_category_by_day が選ぶカテゴリと、その割合
+POOLED_CATEGORIES = (ContentCategory.TECHNICAL, ContentCategory.HUMAN_SKILLS, ContentCategory.AI_ML,
+                     ContentCategory.ADVANCED_IT)
+CATEGORY_WEIGHTS = (0.30, 0.20, 0.20, 0.30)
+
 class ProductionChatworkAutoPost:
-    def __init__(self, api_token: str, room_id: str, youtube_api_key: str):
+    def __init__(self, api_token: str, room_id: str, youtube_api_key: str,
+                 hedge_requests: bool = False, response_cache: Optional[YouTubeResponseCache] = None,
+                 outbox: Optional[ChatworkOutbox] = None, prefer_cache: bool = False,
+                 stats_store: Optional[VideoStatsStore] = None, clock: Optional[Callable[[], datetime]] = None,
+                 run_budget: Optional[float] = None, leases: Optional[WorkLeases] = None,
+                 bandit: Optional[KeywordBandit] = None, history: Optional[PostHistory] = None,
+                 scoring: Optional[ScoringWeights] = None, resilience: Optional[ResilientCaller] = None):
         """
         本番用：YouTube API連携版チャットワーク自動投稿システム
         技術力×人間力×AI活用力の総合学習支援
+        hedge_requests=True で動画・チャンネル詳細取得にヘッジリクエストを使う
+        prefer_cache=True でキャッシュ済みレスポンスがあればAPIを呼ばずに使う（プレビュー用）
+        clock は現在時刻（タイムゾーン付き datetime）を返す関数。シミュレーションで差し替える
+        run_budget は run_production_auto_post 全体の実行時間予算（秒）。None なら無制限
+        leases は複数インスタンスで同じ投稿を取り合わないためのリース表
+        bandit はキーワードごとの高品質動画の収穫率（クォータあたり）を学習してキーワードを選ぶモデル
+        history は実行ごとの結果と集計を記録する投稿履歴
+        scoring は品質スコアの配点と高品質とみなす点数（既定は ScoringWeights()）
+        resilience はサーキットブレーカーと応答時間の統計。同じプロセスの投稿処理で共有すると、
+        連続障害の判定と p95 のヘッジ待ち時間が投稿処理をまたいで効く（既定は state/ に保存するもの）
         """
         self.api_token = api_token
         self.room_id = room_id
         self.youtube_api_key = youtube_api_key
         self.chatwork_base_url = "https://api.chatwork.com/v2"
         self.youtube_base_url = "https://www.googleapis.com/youtube/v3"
+        self.clock = clock or (lambda: datetime.now(JST))
+        self.schedules_path = Path(__file__).parent / "schedules.json"
+        
+        # 🛡️ YouTube API 耐障害設定（サーキットブレーカー・ヘッジ・キャッシュフォールバック）
+        self.request_timeout = 10.0
+        self.resilience = resilience or ResilientCaller(is_failure=is_youtube_failure, path=RESILIENCE_FILE)
+        self.hedge_endpoints = {"videos", "channels"} if hedge_requests else set()
+        self.response_cache = response_cache or YouTubeResponseCache()
+        self.prefer_cache = prefer_cache
+        # 詳細取得は ETag で条件付きリクエスト（変更がなければ 304 で本文を受け取らない）
+        self.revalidate_endpoints = {"videos", "channels"}
+        self.revalidation = {"requests": 0, "not_modified": 0, "bytes_saved": 0}
+        # エンドポイントごとの転送量（圧縮後・展開後）とJSON解析時間
+        self.transfer: Dict[str, Dict[str, float]] = {}
+        
+        # ⏱️ 実行時間予算（段階ごとのタイムアウトは残り時間から決める）
+        self.run_budget = run_budget
+        self.budget = RunBudget(wall_clock=self.clock)
+        self.budget_log = BUDGET_LOG
+        
+        # 🏅 品質スコアの配点
+        self.scoring = scoring or ScoringWeights()
+        # 🔽 検索の時点で YouTube 側に除外させる条件（None で絞り込まない。選ばれる動画が変わりうるため既定は絞り込まない）
+        self.pushdown: Optional[SearchPushdown] = None
+        # 絞り込んだ後の候補について数える（絞り込みで省けた分は実行時には分からない。simulate_calendar.py --pushdown で比べる）
+        self.pushdown_stats = {"searches": 0, "candidates": 0, "low_score_remaining": 0, "outside": 0,
+                               "dropped_stale": 0}
+        
+        # 📈 再生数・登録者数の時系列（再生速度スコアに使用）
+        self.stats_store = stats_store or VideoStatsStore()
+        self.quota_used = 0
+        self.cache_fallbacks = 0
+        self.shared_searches = 0
+        self.search_flight = SEARCH_FLIGHT
+        self._stats_lock = threading.Lock()
+        
+        # 🔎 表記が少し違うだけの検索はキャッシュ済みの類似検索の結果を流用する（None で無効。既定は流用しない）
+        self.similar_search_threshold: Optional[float] = None
+        self.similar_search_max_age = 72 * 3600.0
+        self.query_index = SearchQueryIndex.from_cache(self.response_cache)
+        self.similar_searches = {"exact": 0, "served": 0, "blended": 0}
+        
+        # 🎰 キーワード選択（高品質動画が多く得られるキーワードを学習して選ぶ）
+        self.bandit = bandit or KeywordBandit()
+        
+        # 🗂️ 投稿履歴（実行ごとの結果と、日・週・カテゴリなどの集計）
+        self.history = history or PostHistory()
+        self.run_outcome: Dict = {}
+        # 🗓️ weekly_planner.py で事前に作成した投稿（あれば当日は検索せずに送信する）
+        self.plan_path = PLAN_FILE
+        # 🎌 日本の祝日は週末と同じく投稿しない（False で祝日も投稿する）
+        self.skip_holidays = True
+        # 💾 段階ごとの結果を保存し、途中で止まった実行を再開できるようにする（run_production_auto_post の間だけ）
+        self.checkpoint_dir = CHECKPOINT_DIR
+        self.checkpoint: Optional[RunCheckpoint] = None
+        # 🧺 pool_replenisher.py が補充した候補プールに十分な動画があれば検索せずに使う（False で常に検索する）
+        self.pool_path = POOL_FILE
+        self.serve_from_pools = True
+        self.pool_stats = {"served": 0, "missed": 0}
+        
+        # 📮 投稿アウトボックス（作成済みメッセージを保存してから送信）
+        self.outbox = outbox or ChatworkOutbox()
+        # 🔒 複数インスタンス実行時の作業リース（ルーム＋日付＋スケジュールID単位）。送信もリースを取ってから行う
+        self.leases = leases or WorkLeases()
+        self.chatwork_sender = ChatworkSender(api_token, self.outbox, base_url=self.chatwork_base_url,
+                                              leases=self.leases)
         
         # 🔧 技術系検索キーワード
         self.technical_keywords = [
@@ -238,51 +517,78 @@ class ProductionChatworkAutoPost:
             "📈 未来を見据えた技術投資をしよう"
         ]
 
-    def load_schedule_from_json(self) -> Optional[Tuple[List[str], str]]:
+    def now(self) -> datetime:
+        """現在時刻（日本時間）"""
+        return self.clock().astimezone(JST)
+
+    @contextmanager
+    def as_of(self, when: datetime) -> Iterator[None]:
+        """その日に投稿する場合と同じ日付でスケジュール選択・スコアリング・メッセージ作成を行う"""
+        clock = self.clock
+        self.clock = lambda: when
+        try:
+            yield
+        finally:
+            self.clock = clock
+
+    def day_off(self, when: datetime) -> Optional[str]:
+        """投稿しない日なら理由（週末・祝日名）を返す"""
+        if when.weekday() >= 5:
+            return "週末"
+        if self.skip_holidays:
+            return holiday_name(when)
+        return None
+
+    def get_today_schedule(self) -> Optional[Dict]:
         """
-        schedules.json から今日のスケジュールを読み込み、キーワードとカテゴリ名を返す。
+        schedules.json から今日の曜日に該当する最初のスケジュールを返す。
         ファイルが存在しない、または該当スケジュールがない場合は None を返す。
         """
         try:
-            schedules_path = Path(__file__).parent / "schedules.json"
-            if not schedules_path.exists():
+            if not self.schedules_path.exists():
                 return None
-            with open(schedules_path, "r", encoding="utf-8") as f:
+            with open(self.schedules_path, "r", encoding="utf-8") as f:
                 data = json.load(f)
             schedules = data.get("schedules", [])
             if not schedules:
                 return None
-            jst = timezone(timedelta(hours=9))
-            today_weekday = datetime.now(jst).weekday()
+            today_weekday = self.now().weekday()
             for s in schedules:
                 if s.get("weekday") == today_weekday:
                     keywords = s.get("keywords", [])
                     if isinstance(keywords, list) and keywords:
-                        name = s.get("name", "カスタム")
-                        return (keywords, name)
+                        return s
             return None
         except Exception as e:
             print(f"⚠️ schedules.json 読み込みエラー: {e}")
             return None
 
+    def load_schedule_from_json(self) -> Optional[Tuple[List[str], str]]:
+        """
+        schedules.json から今日のスケジュールを読み込み、キーワードとカテゴリ名を返す。
+        ファイルが存在しない、または該当スケジュールがない場合は None を返す。
+        """
+        schedule = self.get_today_schedule()
+        if schedule is None:
+            return None
+        return (schedule["keywords"], schedule.get("name", "カスタム"))
+
     def get_category_by_day(self) -> ContentCategory:
         """曜日ベースのカテゴリ選択（平日のみ実行）"""
-        jst = timezone(timedelta(hours=9))
-        today = datetime.now(jst).weekday()
+        today = self.now().weekday()
         
         if today < 5:  # 平日（月〜金）
             # 30%技術系、20%人間力系、20%AI・機械学習系、30%先端IT系
-            return random.choices(
-                [ContentCategory.TECHNICAL, ContentCategory.HUMAN_SKILLS, ContentCategory.AI_ML, ContentCategory.ADVANCED_IT],
-                weights=[0.30, 0.20, 0.20, 0.30]
-            )[0]
+            return random.choices(POOLED_CATEGORIES, weights=CATEGORY_WEIGHTS)[0]
         else:
             return ContentCategory.TECHNICAL
 
     def get_keywords_and_template(self) -> Tuple[List[str], List[str], str]:
         """カテゴリに応じたキーワードとテンプレートを取得"""
-        category = self.get_category_by_day()
-        
+        return self.category_content(self.get_category_by_day())
+
+    def category_content(self, category: ContentCategory) -> Tuple[List[str], List[str], str]:
+        """カテゴリのキーワード・テンプレート・カテゴリ名"""
         if category == ContentCategory.TECHNICAL:
             return (
                 self.technical_keywords,
@@ -319,24 +625,22 @@ class ProductionChatworkAutoPost:
         チャンネルIDのリストから詳細情報（登録者数等）を取得
         """
         try:
-            channels_url = f"{self.youtube_base_url}/channels"
-            
             params = {
-                'part': 'statistics,snippet',
+                'part': 'statistics',
                 'id': ','.join(channel_ids),
+                'fields': YOUTUBE_FIELDS['channels'],
                 'key': self.youtube_api_key
             }
             
-            response = requests.get(channels_url, params=params)
+            entry = self._youtube_get_entry('channels', params)
             
-            if response.status_code != 200:
-                print(f"❌ チャンネル詳細取得エラー: {response.status_code}")
+            if entry is None:
+                print("❌ チャンネル詳細取得エラー")
                 return {}
             
-            data = response.json()
             details = {}
             
-            for item in data.get('items', []):
+            for item in entry["body"].get('items', []):
                 channel_id = item['id']
                 statistics = item.get('statistics', {})
                 
@@ -346,6 +650,7 @@ class ProductionChatworkAutoPost:
                     'viewCount': statistics.get('viewCount', '0')
                 }
             
+            self.record_stats(CHANNEL, {cid: d['subscriberCount'] for cid, d in details.items()}, entry["fetched_at"])
             return details
             
         except Exception as e:
@@ -354,120 +659,75 @@ class ProductionChatworkAutoPost:
 
     def calculate_video_quality_score(self, video: Dict) -> float:
         """
-        動画の質を数値化してスコア算出
-        """
-        score = 0.0
-        
-        # 登録者数スコア (最大30点)
-        subscriber_count = int(video.get('subscriber_count', '0'))
-        if subscriber_count >= 100000:  # 10万人以上
-            score += 30
-        elif subscriber_count >= 50000:  # 5万人以上
-            score += 25
-        elif subscriber_count >= 10000:  # 1万人以上
-            score += 20
-        elif subscriber_count >= 1000:   # 1000人以上
-            score += 10
-        
-        # 再生数スコア (最大25点)
-        view_count = int(video.get('view_count_raw', '0'))
-        if view_count >= 100000:  # 10万再生以上
-            score += 25
-        elif view_count >= 50000:  # 5万再生以上
-            score += 20
-        elif view_count >= 10000:  # 1万再生以上
-            score += 15
-        elif view_count >= 1000:   # 1000再生以上
-            score += 10
-        
-        # 動画の長さスコア (最大20点) - 短すぎず長すぎない動画を優先
-        duration_seconds = self.parse_duration_to_seconds(video.get('duration', 'PT0S'))
-        if 300 <= duration_seconds <= 1800:  # 5分〜30分
-            score += 20
-        elif 180 <= duration_seconds <= 300:  # 3分〜5分
-            score += 15
-        elif 1800 <= duration_seconds <= 3600:  # 30分〜1時間
-            score += 15
-        
-        # タイトル品質スコア (最大15点)
+        動画の質を数値化してスコア算出（配点は self.scoring）
+        """
         title = video.get('title', '').lower()
-        quality_keywords = [
-            '解説', 'わかりやすい', '入門', '基礎', '実践', '方法', 
-            '初心者', '完全版', 'まとめ', 'ノウハウ', 'コツ', '攻略'
-        ]
-        title_score = sum(5 for keyword in quality_keywords if keyword in title)
-        score += min(title_score, 15)  # 最大15点
-        
-        # 投稿日の新しさスコア (最大10点)
         try:
             published_date = datetime.strptime(video.get('published_at', '2000-01-01'), '%Y-%m-%d')
-            days_ago = (datetime.now() - published_date).days
-            if days_ago <= 30:      # 1ヶ月以内
-                score += 10
-            elif days_ago <= 90:    # 3ヶ月以内
-                score += 8
-            elif days_ago <= 180:   # 6ヶ月以内
-                score += 6
-            elif days_ago <= 365:   # 1年以内
-                score += 4
+            days_ago = (self.now().replace(tzinfo=None) - published_date).days
         except:
-            pass
-        
-        return score
+            days_ago = None
+        return score_features(
+            self.scoring,
+            subscribers=int(video.get('subscriber_count', '0')),
+            views=int(video.get('view_count_raw', '0')),
+            duration_seconds=video.get('duration_seconds', 0),
+            title_hits=sum(1 for keyword in TITLE_QUALITY_KEYWORDS if keyword in title),
+            days_ago=days_ago,
+            views_per_day=video.get('views_per_day'),
+        )
 
     def parse_duration_to_seconds(self, duration_str: str) -> int:
         """ISO 8601形式の時間を秒数に変換"""
-        try:
-            import re
-            pattern = r'PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?'
-            match = re.match(pattern, duration_str)
-            
-            if not match:
-                return 0
-            
-            hours, minutes, seconds = match.groups()
-            total_seconds = 0
-            total_seconds += int(hours) * 3600 if hours else 0
-            total_seconds += int(minutes) * 60 if minutes else 0
-            total_seconds += int(seconds) if seconds else 0
-            
-            return total_seconds
-        except:
-            return 0
+        return parse_duration(duration_str)
+
+    def build_search_params(self, query: str, max_results: int = 20) -> Dict:
+        """YouTube Data API v3 検索エンドポイントのパラメータ（self.pushdown の絞り込み条件を含む）"""
+        return {
+            'part': 'snippet',
+            'q': query,
+            'type': 'video',
+            'maxResults': max_results,
+            'order': 'relevance',
+            'regionCode': 'JP',
+            'relevanceLanguage': 'ja',
+            'fields': YOUTUBE_FIELDS['search'],
+            'key': self.youtube_api_key,
+            **(self.pushdown.search_params(self.now()) if self.pushdown else {}),
+        }
+
+    def has_cached_search(self, query: str, max_results: int = 20) -> bool:
+        key = YouTubeResponseCache.make_key('search', self.build_search_params(query, max_results))
+        return self.response_cache.peek(key) is not None
 
     def search_youtube_videos_api(self, query: str, max_results: int = 20) -> List[Dict]:
         """
         改良版YouTube動画検索（質の高い動画を優先選択）
+        同じ検索が同時に（または5分以内に）行われた場合は1回の検索結果を共有し、クォータを節約する。
+        結果はスコア順に並べたものなので、配点や絞り込み条件が異なる検索とは共有しない。
         """
+        params = self.build_search_params(normalize_query(query), max_results)
+        flight_key = "|".join((YouTubeResponseCache.make_key('search', params), repr(self.scoring), repr(self.pushdown)))
+        videos, shared = self.search_flight.do(flight_key, lambda: self._search_and_score_videos(query, max_results))
+        if shared:
+            self.shared_searches += 1
+            print(f"🤝 同じ検索の結果を共有しました: {query}（{len(videos)}本）")
+        return videos
+
+    def _search_and_score_videos(self, query: str, max_results: int) -> List[Dict]:
+        """検索・詳細取得・品質スコアリングを実際に行う"""
         try:
-            # YouTube Data API v3 検索エンドポイント
-            search_url = f"{self.youtube_base_url}/search"
+            params = self.build_search_params(query, max_results)
             
-            params = {
-                'part': 'snippet',
-                'q': query,
-                'type': 'video',
-                'maxResults': max_results,
-                'order': 'relevance',
-                'regionCode': 'JP',
-                'relevanceLanguage': 'ja',
-                'key': self.youtube_api_key
-            }
-            
-            print(f"🔍 YouTube API検索中: {query}")
-            response = requests.get(search_url, params=params)
+            data = self.checkpointed(f"search:{query}", lambda: self._search_or_reuse(query, params))
             
-            if response.status_code != 200:
-                print(f"❌ YouTube API エラー: {response.status_code}")
+            if data is None:
                 return []
             
-            data = response.json()
-            
             if 'items' not in data or not data['items']:
                 print("❌ 検索結果が見つかりませんでした")
                 return []
             
-            videos = []
             video_ids = []
             channel_ids = []
             
@@ -479,77 +739,180 @@ class ProductionChatworkAutoPost:
                 channel_ids.append(channel_id)
             
             # 動画の詳細情報とチャンネル詳細を並行取得
-            video_details = self.get_video_details(video_ids)
-            channel_details = self.get_channel_details(list(set(channel_ids)))
+            details = self.checkpointed(f"details:{query}", lambda: {
+                "videos": self.get_video_details(video_ids),
+                "channels": self.get_channel_details(list(set(channel_ids))),
+            })
             
-            for item in data['items']:
-                video_id = item['id']['videoId']
-                channel_id = item['snippet']['channelId']
-                snippet = item['snippet']
-                
-                # 詳細情報を取得
-                v_details = video_details.get(video_id, {})
-                c_details = channel_details.get(channel_id, {})
-                
-                video_info = {
-                    'title': snippet['title'],
-                    'url': f"https://www.youtube.com/watch?v={video_id}",
-                    'video_id': video_id,
-                    'channel_name': snippet['channelTitle'],
-                    'channel_id': channel_id,
-                    'channel_url': f"https://www.youtube.com/channel/{channel_id}",
-                    'thumbnail': snippet['thumbnails'].get('high', {}).get('url', ''),
-                    'description': snippet['description'][:200],
-                    'published_at': snippet['publishedAt'][:10],
-                    'views': self.format_number(v_details.get('viewCount', '0')),
-                    'view_count_raw': v_details.get('viewCount', '0'),
-                    'duration': self.format_duration(v_details.get('duration', 'PT0S')),
-                    'subscriber_count': c_details.get('subscriberCount', '0'),
-                    'subscriber_count_formatted': self.format_number(c_details.get('subscriberCount', '0')),
-                    'category': self.determine_category(snippet['title'], snippet['description'])
-                }
-                
-                videos.append(video_info)
+            def score() -> List[Dict]:
+                videos = self.rank_videos(self.collect_video_infos(data['items'], details["videos"], details["channels"]))
+                self.note_search_candidates(videos)
+                print(f"✅ {len(videos)}本の動画を取得・品質評価完了")
+                # 上位の質の高い動画のみを返す
+                return videos[:min(10, len(videos))]
+            
+            return self.checkpointed(f"scored:{query}", score)
             
-            # 動画の質スコアを計算してソート
+        except Exception as e:
+            print(f"❌ YouTube API検索エラー: {e}")
+            return []
+
+    def collect_video_infos(self, items: List[Dict], video_details: Dict, channel_details: Dict) -> List[Dict]:
+        """検索結果の各動画に詳細情報（再生数・長さ・登録者数など）を付ける"""
+        videos = []
+        for item in items:
+            video_id = item['id']['videoId']
+            channel_id = item['snippet']['channelId']
+            snippet = item['snippet']
+            
+            # 詳細情報を取得
+            v_details = video_details.get(video_id, {})
+            c_details = channel_details.get(channel_id, {})
+            
+            video_info = {
+                'title': snippet['title'],
+                'url': f"https://www.youtube.com/watch?v={video_id}",
+                'video_id': video_id,
+                'channel_name': snippet['channelTitle'],
+                'channel_id': channel_id,
+                'channel_url': f"https://www.youtube.com/channel/{channel_id}",
+                'thumbnail': snippet['thumbnails'].get('high', {}).get('url', ''),
+                'description': snippet['description'][:200],
+                'published_at': snippet['publishedAt'][:10],
+                'views': self.format_number(v_details.get('viewCount', '0')),
+                'view_count_raw': v_details.get('viewCount', '0'),
+                'duration': self.format_duration(v_details.get('duration', 'PT0S')),
+                'duration_seconds': self.parse_duration_to_seconds(v_details.get('duration', 'PT0S')),
+                'subscriber_count': c_details.get('subscriberCount', '0'),
+                'subscriber_count_formatted': self.format_number(c_details.get('subscriberCount', '0')),
+                'views_per_day': self.stats_store.views_per_day(video_id, now=self.now().timestamp()),
+                'category': self.determine_category(snippet['title'], snippet['description'])
+            }
+            
+            videos.append(video_info)
+        return videos
+
+    def note_search_candidates(self, videos: List[Dict]):
+        """絞り込み検索で得た候補（スコア付け済み）の数と、そのうち絞り込んでも残った低スコア・条件外の数を集計する"""
+        if not self.pushdown:
+            return
+        now = self.now()
+        self.pushdown_stats["searches"] += 1
+        self.pushdown_stats["candidates"] += len(videos)
+        self.pushdown_stats["low_score_remaining"] += sum(1 for v in videos if v.get('quality_score', 0) < self.scoring.cutoff)
+        self.pushdown_stats["outside"] += sum(1 for v in videos if self.pushdown.excludes(v, now))
+
+    def rank_videos(self, videos: List[Dict]) -> List[Dict]:
+        """品質スコアを付けて高い順に並べる"""
+        # 動画の質スコアを計算してソート
+        with self.budget.stage("scoring"):
             for video in videos:
                 video['quality_score'] = self.calculate_video_quality_score(video)
             
             # スコア順でソート（高い順）
             videos.sort(key=lambda x: x['quality_score'], reverse=True)
-            
-            print(f"✅ {len(videos)}本の動画を取得・品質評価完了")
-            
-            # 上位の質の高い動画のみを返す
-            return videos[:min(10, len(videos))]
-            
-        except Exception as e:
-            print(f"❌ YouTube API検索エラー: {e}")
-            return []
+        return videos
+
+    def start_budget(self, seconds: Optional[float] = None) -> RunBudget:
+        """新しい実行の時間予算（None で無制限）と段階ごとの記録を始める"""
+        self.budget = RunBudget(seconds, wall_clock=self.clock)
+        return self.budget
+
+    def search_or_reuse(self, query: str, max_results: int = 20) -> Tuple[Optional[Dict], bool]:
+        """
+        スコアリングせずに検索する（鮮度内のキャッシュや類似検索があれば流用する）。
+        検索結果と、実際に検索APIから結果を得たか（キーワード選択の学習に数えるか）を返す
+        """
+        stage_mark = len(self.budget.stages)
+        data = self._search_or_reuse(query, self.build_search_params(query, max_results))
+        searched = any(s["stage"] == "search" and s["status"] == "ok" for s in self.budget.stages[stage_mark:])
+        return data, searched
+
+    def _search_or_reuse(self, query: str, params: Dict) -> Optional[Dict]:
+        """
+        鮮度内のキャッシュに同じ検索か、類似度が閾値以上の過去の検索があれば、APIを呼ばずにその結果を使う
+        （同じ検索を優先し、類似検索が複数あれば順位を交互に並べて混ぜる）。なければ通常どおり検索する。
+        流用する結果からは REUSE_REPOST_DAYS 日以内に投稿した動画を除き、POST_VIDEOS 本に満たなければ流用しない。
+        """
+        cache_key = YouTubeResponseCache.make_key('search', params)
+        if self.similar_search_threshold is not None:
+            since = (self.now() - timedelta(days=REUSE_REPOST_DAYS)).isoformat(timespec="seconds")
+            posted = self.history.posted_video_ids(since=since)
+
+            def reusable(key: str) -> Optional[Dict]:
+                entry = self.response_cache.get(key, max_age=self.similar_search_max_age)
+                if entry is None:
+                    return None
+                items = [item for item in entry["body"].get("items", []) if item["id"]["videoId"] not in posted]
+                return {**entry["body"], "items": items} if len(items) >= POST_VIDEOS else None
+
+            body = reusable(cache_key)
+            if body is not None:
+                with self.budget.stage('search') as stage:
+                    stage["status"] = "cache"
+                    self.similar_searches["exact"] += 1
+                    print(f"🗄️ 同じ検索の結果を再利用: {query}")
+                    return self.drop_outside_pushdown(body)
+            matches = []
+            for key, other_query, score in self.query_index.similar(cache_key, self.similar_search_threshold):
+                body = reusable(key)
+                if body is not None:
+                    matches.append((other_query, score, body))
+            if matches:
+                with self.budget.stage('search') as stage:
+                    stage["status"] = "similar"
+                    labels = "、".join(f"{q}（{score:.2f}）" for q, score, _ in matches)
+                    if len(matches) == 1:
+                        self.similar_searches["served"] += 1
+                        print(f"🔎 類似検索の結果を流用: {query} → {labels}")
+                        return self.drop_outside_pushdown(matches[0][2])
+                    self.similar_searches["blended"] += 1
+                    print(f"🔎 類似検索の結果を混合: {query} → {labels}")
+                    return self.drop_outside_pushdown(
+                        blend_search_results([body for _, _, body in matches], int(params['maxResults'])))
+        
+        print(f"🔍 YouTube API検索中: {query}")
+        data = self._youtube_get('search', params)
+        if data is not None:
+            self.query_index.add(cache_key)
+        return self.drop_outside_pushdown(data)
+
+    def drop_outside_pushdown(self, data: Optional[Dict]) -> Optional[Dict]:
+        """
+        検索結果から公開日が絞り込み条件より前の動画を、詳細を取得する前に除く（流用した類似検索の結果は
+        別の条件で検索したものがあるため）。除いた本数は pushdown_stats["dropped_stale"] に数える
+        """
+        if not data or not self.pushdown or not self.pushdown.published_within_days:
+            return data
+        since = self.pushdown.search_params(self.now())['publishedAfter']
+        items = [item for item in data.get('items', []) if item['snippet'].get('publishedAt', '') >= since]
+        dropped = len(data.get('items', [])) - len(items)
+        if not dropped:
+            return data
+        self.pushdown_stats["dropped_stale"] += dropped
+        return {**data, 'items': items}
 
     def get_video_details(self, video_ids: List[str]) -> Dict:
         """
         動画IDのリストから詳細情報を取得
         """
         try:
-            videos_url = f"{self.youtube_base_url}/videos"
-            
             params = {
                 'part': 'statistics,contentDetails',
                 'id': ','.join(video_ids),
+                'fields': YOUTUBE_FIELDS['videos'],
                 'key': self.youtube_api_key
             }
             
-            response = requests.get(videos_url, params=params)
+            entry = self._youtube_get_entry('videos', params)
             
-            if response.status_code != 200:
-                print(f"❌ 動画詳細取得エラー: {response.status_code}")
+            if entry is None:
+                print("❌ 動画詳細取得エラー")
                 return {}
             
-            data = response.json()
             details = {}
             
-            for item in data.get('items', []):
+            for item in entry["body"].get('items', []):
                 video_id = item['id']
                 statistics = item.get('statistics', {})
                 content_details = item.get('contentDetails', {})
@@ -559,12 +922,177 @@ class ProductionChatworkAutoPost:
                     'duration': content_details.get('duration', 'PT0S')
                 }
             
+            self.record_stats(VIDEO, {vid: d['viewCount'] for vid, d in details.items()}, entry["fetched_at"])
             return details
             
         except Exception as e:
             print(f"❌ 動画詳細取得エラー: {e}")
             return {}
 
+    def _send_youtube_request(self, url: str, params: Dict, timeout: float,
+                              headers: Optional[Dict] = None) -> YouTubeResponse:
+        """YouTube API への実際のHTTPリクエスト（200・304以外は YouTubeAPIError）"""
+        response = requests.get(url, params=params, headers={**YOUTUBE_HEADERS, **(headers or {})}, timeout=timeout)
+        # 転送バイト数（圧縮後）。取得できなければ Content-Length
+        try:
+            wire_size = response.raw.tell()
+        except (AttributeError, OSError):
+            wire_size = 0
+        wire_size = wire_size or int(response.headers.get('Content-Length', 0) or 0)
+        if response.status_code == 304:
+            return YouTubeResponse(304, None, response.headers.get('ETag'), 0, wire_size)
+        if response.status_code != 200:
+            raise YouTubeAPIError(response.status_code, response.text[:200])
+        content = response.content
+        start = time.perf_counter()
+        body = json.loads(content)
+        parse_seconds = time.perf_counter() - start
+        return YouTubeResponse(200, body, response.headers.get('ETag') or body.get('etag'), len(content),
+                               wire_size or len(content), parse_seconds)
+
+    def _youtube_get(self, endpoint: str, params: Dict) -> Optional[Dict]:
+        """
+        YouTube API への GET。エンドポイントごとのサーキットブレーカーで連続障害時は即座に諦め、
+        失敗時・サーキットオープン時はキャッシュ済みレスポンスにフォールバックする。
+        取得できなければ None を返す。
+        """
+        entry = self._youtube_get_entry(endpoint, params)
+        return entry["body"] if entry is not None else None
+
+    def _youtube_get_entry(self, endpoint: str, params: Dict) -> Optional[Dict]:
+        """_youtube_get と同じだが、取得時刻（fetched_at）付きのキャッシュエントリ形式で返す"""
+        with self.budget.stage(endpoint) as stage:
+            return self._fetch_youtube_entry(endpoint, params, stage)
+
+    def _fetch_youtube_entry(self, endpoint: str, params: Dict, stage: Dict) -> Optional[Dict]:
+        url = f"{self.youtube_base_url}/{endpoint}"
+        cache_key = YouTubeResponseCache.make_key(endpoint, params)
+        
+        if self.prefer_cache:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                stage["status"] = "cache"
+                return cached
+        
+        # 実行時間予算の残りからタイムアウトを決める。足りなければ呼び出さずキャッシュで代替
+        timeout = self.budget.timeout_for(self.request_timeout)
+        if timeout is None:
+            stage["status"] = "skipped"
+            cached = self.response_cache.get_stale(cache_key)
+            self.budget.degrade(f"残り時間が少ないため {endpoint} の呼び出しを省略"
+                                f"（{'キャッシュを使用' if cached is not None else 'データなし'}）")
+            return cached
+        stage["timeout"] = round(timeout, 2)
+        
+        headers = None
+        cached = self.response_cache.peek(cache_key) if endpoint in self.revalidate_endpoints else None
+        if cached is not None and cached.get("etag"):
+            headers = {'If-None-Match': cached["etag"]}
+        
+        def fetch():
+            with self._stats_lock:
+                self.quota_used += YOUTUBE_QUOTA_COST.get(endpoint, 1)
+            return self._send_youtube_request(url, params, timeout, headers=headers)
+        
+        try:
+            response = self.resilience.call(endpoint, fetch, hedge=endpoint in self.hedge_endpoints)
+        except CircuitOpenError:
+            print(f"🚧 {endpoint} のサーキットが開いているため呼び出しをスキップ")
+        except YouTubeAPIError as e:
+            print(f"❌ YouTube API エラー ({endpoint}): {e.status_code}")
+        except requests.RequestException as e:
+            print(f"❌ YouTube API 通信エラー ({endpoint}): {e}")
+        else:
+            self.record_transfer(endpoint, response)
+            if headers:
+                with self._stats_lock:
+                    self.revalidation["requests"] += 1
+                    if response.status_code == 304:
+                        self.revalidation["not_modified"] += 1
+                        self.revalidation["bytes_saved"] += cached.get("size", 0)
+            if response.status_code == 304:
+                # 変更なし: キャッシュ済みの本文を最新として扱う
+                stage["status"] = "not_modified"
+                return self.response_cache.touch(cache_key) or cached
+            return self.response_cache.put(cache_key, response.body, etag=response.etag, size=response.size)
+        
+        stage["status"] = "failed"
+        cached = self.response_cache.get_stale(cache_key)
+        if cached is not None:
+            stage["status"] = "fallback"
+            self.cache_fallbacks += 1
+            print(f"♻️ キャッシュ済みレスポンスにフォールバック ({endpoint})")
+            return cached
+        return None
+
+    def record_transfer(self, endpoint: str, response: YouTubeResponse):
+        """エンドポイントごとの転送量とJSON解析時間を集計"""
+        with self._stats_lock:
+            t = self.transfer.setdefault(endpoint, {"calls": 0, "wire_bytes": 0, "body_bytes": 0, "parse_seconds": 0.0})
+            t["calls"] += 1
+            t["wire_bytes"] += response.wire_size
+            t["body_bytes"] += response.size
+            t["parse_seconds"] += response.parse_seconds
+
+    def record_stats(self, kind: int, counts: Dict[str, str], fetched_at: float):
+        """取得した再生数・登録者数を時系列ストアに記録（キャッシュ由来の古い値は記録されない）"""
+        try:
+            values = {entity_id: int(count) for entity_id, count in counts.items() if str(count).isdigit()}
+            if values:
+                self.stats_store.record_many(kind, values, timestamp=fetched_at)
+        except OSError as e:
+            print(f"⚠️ 統計の記録エラー: {e}")
+
+    def search_cached_catalog(self, keywords: List[str], max_results: int = 20) -> Tuple[List[Dict], Optional[str]]:
+        """
+        検索のサーキットが開いている間、同じキーワード群のキャッシュ済み検索結果から動画を探す。
+        見つかった動画リストとそのキーワードを返す。
+        """
+        for keyword in keywords:
+            videos = self.search_youtube_videos_api(keyword, max_results=max_results)
+            if videos:
+                return videos, keyword
+        return [], None
+
+    def print_api_summary(self):
+        """YouTube API 呼び出しの統計を表示"""
+        print("📊 YouTube API 統計:")
+        print(f"   - 消費クォータ: {self.quota_used} units")
+        print(f"   - キャッシュフォールバック: {self.cache_fallbacks}回")
+        if self.revalidation['requests']:
+            ratio = self.revalidation['not_modified'] / self.revalidation['requests'] * 100
+            print(f"   - ETag再検証: {self.revalidation['requests']}回中 {self.revalidation['not_modified']}回が未変更"
+                  f"（ヒット率 {ratio:.0f}%、節約 {self.revalidation['bytes_saved'] / 1024:.1f} KB）")
+        if self.shared_searches:
+            saved = self.shared_searches * (YOUTUBE_QUOTA_COST['search'] + 2 * YOUTUBE_QUOTA_COST['videos'])
+            print(f"   - 検索の共有: {self.shared_searches}回（節約したクォータ 約{saved} units）")
+        reused = sum(self.similar_searches.values())
+        if reused:
+            print(f"   - 検索結果の流用: {reused}回（うち同じ検索 {self.similar_searches['exact']}回、"
+                  f"類似検索の混合 {self.similar_searches['blended']}回、"
+                  f"節約したクォータ {reused * YOUTUBE_QUOTA_COST['search']} units）")
+        if self.pushdown and self.pushdown_stats['searches']:
+            ps = self.pushdown_stats
+            conditions = "、".join(f"{k}={v}" for k, v in self.pushdown.search_params(self.now()).items())
+            print(f"   - 検索の絞り込み（{conditions}）: {ps['searches']}回、絞り込んだ後の候補 {ps['candidates']}本中 "
+                  f"低スコア {ps['low_score_remaining']}本、条件外 {ps['outside']}本、"
+                  f"流用した結果から除いた古い動画 {ps['dropped_stale']}本")
+        if self.pool_stats['served'] or self.pool_stats['missed']:
+            print(f"   - 候補プール: {self.pool_stats['served']}回使用 / {self.pool_stats['missed']}回不足で検索")
+        flight = self.search_flight.stats
+        if flight['shared']:
+            print(f"   - プロセス全体の検索: {flight['calls']}回中 {flight['shared']}回を共有")
+        for endpoint, t in self.transfer.items():
+            print(f"   - {endpoint} 転送量: {t['wire_bytes'] / 1024:.1f} KB（展開後 {t['body_bytes'] / 1024:.1f} KB、"
+                  f"{t['calls']}回、JSON解析 {t['parse_seconds'] * 1000:.1f}ms）")
+        stats = self.resilience.stats
+        print(f"   - 呼び出し: {stats['calls']}回 / 失敗: {stats['failures']}回 / 遮断: {stats['rejected']}回")
+        if self.hedge_endpoints:
+            print(f"   - ヘッジ: {stats['hedged']}回（ヘッジ側が先着: {stats['hedge_wins']}回）")
+        for endpoint, info in self.resilience.summary().items():
+            p95 = f"{info['p95'] * 1000:.0f}ms" if info['p95'] is not None else "-"
+            print(f"   - {endpoint}: {info['state']} (p95 {p95})")
+
     def format_number(self, number_str: str) -> str:
         """数値を見やすい形式にフォーマット"""
         try:
@@ -633,9 +1161,9 @@ class ProductionChatworkAutoPost:
         """
         改良版：見やすいChatwork投稿フォーマット
         """
-        jst = timezone(timedelta(hours=9))
-        current_time = datetime.now(jst).strftime("%Y年%m月%d日")
-        weekday_name = ["月", "火", "水", "木", "金", "土", "日"][datetime.now(jst).weekday()]
+        now = self.now()
+        current_time = now.strftime("%Y年%m月%d日")
+        weekday_name = ["月", "火", "水", "木", "金", "土", "日"][now.weekday()]
         
         # ヘッダー部分の改良
         message = f"""
@@ -799,48 +1327,262 @@ SES企業が競争から脱却するための重要な技術領域を学びま
         }
         return messages.get(category, "学んだことを実践で活かし、継続的なスキル向上を心がけましょう。")
 
-    def post_to_chatwork(self, message: str) -> bool:
-        """チャットワークにメッセージを投稿"""
-        url = f"{self.chatwork_base_url}/rooms/{self.room_id}/messages"
-        headers = {
-            "X-ChatWorkToken": self.api_token,
-            "Content-Type": "application/x-www-form-urlencoded"
-        }
+    def get_post_key(self, schedule_id: str) -> str:
+        """今日の投稿の冪等キー（ルーム＋日付＋スケジュールID）"""
+        return make_idempotency_key(self.room_id, self.now().strftime("%Y-%m-%d"), schedule_id)
+
+    def post_to_chatwork(self, message: str, idempotency_key: Optional[str] = None) -> bool:
+        """
+        チャットワークにメッセージを投稿。
+        メッセージはアウトボックスに保存してから送信するため、失敗しても再送できる。
+        同じ冪等キーのメッセージが送信済みなら再投稿しない。
+        """
+        key = idempotency_key or self.get_post_key("default")
         # 先頭に [toall] を追加
-        data = {"body": "[toall]\n" + message}
+        body = "[toall]\n" + message
         
-        try:
-            print("📤 チャットワークに投稿中...")
-            response = requests.post(url, headers=headers, data=data)
-            
-            if response.status_code == 200:
-                print("✅ チャットワークに投稿完了")
+        if not self.outbox.enqueue(key, self.room_id, body):
+            existing = self.outbox.get(key)
+            if existing and existing["status"] == SENT:
+                print(f"✅ 送信済みのため再投稿しません: {key}")
                 return True
-            else:
-                print(f"❌ 投稿失敗: {response.status_code}")
-                print(f"エラー詳細: {response.text}")
-                return False
-                
+            print(f"📮 アウトボックスの未送信メッセージを再送します: {key}")
+        
+        print("📤 チャットワークに投稿中...")
+        with self.budget.stage("post") as stage:
+            status = self.chatwork_sender.drain([key], deadline=self.budget.deadline()).get(key)
+            stage["status"] = "ok" if status == SENT else status
+        if status == SENT:
+            print("✅ チャットワークに投稿完了")
+            return True
+        print(f"❌ 投稿失敗（アウトボックスに保存済み: {status}）")
+        return False
+
+    def run_production_auto_post(self, resume: bool = False, run_id: Optional[str] = None):
+        """
+        本番用自動投稿実行（run_budget を指定した場合は全体をその秒数に収める）。
+        resume=True なら、同じ実行ID（既定は今日の投稿の冪等キー）のチェックポイントの最後に完了した段階から再開する。
+        """
+        self.start_budget(self.run_budget)
+        self.run_outcome = {"status": "error"}
+        quota_before = self.quota_used
+        try:
+            self._run_production_auto_post(resume, run_id)
+        finally:
+            self.checkpoint = None
+            if self.run_budget is not None:
+                self.budget.print_summary()
+                self.budget.append_to(self.budget_log)
+            self.record_run("scheduled", quota=self.quota_used - quota_before, **self.run_outcome)
+
+    def record_run(self, source: str, status: str, schedule: Optional[Dict] = None, post: Optional[Dict] = None,
+                   quota: int = 0):
+        """実行結果を投稿履歴に記録する（記録に失敗しても投稿処理は止めない）"""
+        run = {
+            "run_at": self.now().isoformat(timespec="seconds"),
+            "source": source,
+            "status": status,
+            "schedule_id": schedule.get("id") if schedule else None,
+            "quota": quota,
+            "elapsed": round(self.budget.elapsed(), 3),
+        }
+        if post is not None:
+            run["category"] = post["category_name"]
+            run["keyword"] = post["keyword"]
+            run["videos"] = [{"video_id": v.get("video_id"), "title": v.get("title"), "channel_name": v.get("channel_name"),
+                              "quality_score": v.get("quality_score", 0)} for v in post["videos"][:3]]
+        try:
+            self.history.record(run)
         except Exception as e:
-            print(f"❌ 投稿エラー: {e}")
-            return False
+            print(f"⚠️ 投稿履歴の記録エラー: {e}")
 
-    def run_production_auto_post(self):
-        """本番用自動投稿実行"""
-        jst = timezone(timedelta(hours=9))
-        current_time = datetime.now(jst)
+    def _run_production_auto_post(self, resume: bool = False, run_id: Optional[str] = None):
+        current_time = self.now()
         
         print(f"[{current_time}] 本番用自動投稿システム開始")
         
-        # 平日チェック
-        if current_time.weekday() >= 5:
-            print("⏰ 今日は週末のため投稿をスキップします")
+        # 平日チェック（祝日も休み）
+        day_off = self.day_off(current_time)
+        if day_off:
+            print(f"⏰ 今日は{day_off}のため投稿をスキップします")
+            self.run_outcome = {"status": "weekend" if current_time.weekday() >= 5 else "holiday"}
             return
         
         # スケジュール設定があれば優先、なければ従来のカテゴリ選択
-        schedule_result = self.load_schedule_from_json()
-        if schedule_result:
-            keywords, category_name = schedule_result
+        schedule = self.get_today_schedule()
+        post_key = self.get_post_key(schedule.get("id", "custom") if schedule else "default")
+        self.run_outcome = {"status": "error", "schedule": schedule}
+        
+        # 他のインスタンスが処理中・処理済みならスキップ（落ちたインスタンスの作業は期限切れ後に引き継ぐ）
+        if not self.leases.claim(post_key):
+            print(f"🔒 他のインスタンスが処理中または処理済みのためスキップします: {post_key}")
+            self.run_outcome["status"] = "leased"
+            return
+        self.checkpoint = RunCheckpoint(run_id or post_key, self.checkpoint_dir, resume=resume)
+        if resume:
+            last = self.checkpoint.last_completed()
+            print(f"💾 チェックポイントから再開します: {last}" if last else "💾 チェックポイントがないため最初から実行します")
+        done = False
+        try:
+            with self.leases.hold(post_key) as lost:
+                done = self._post_today(schedule, post_key, lost)
+        finally:
+            if done:
+                self.leases.complete(post_key)
+                self.checkpoint.finish()
+            else:
+                self.leases.release(post_key)
+
+    def _post_today(self, schedule: Optional[Dict], post_key: str, lease_lost: threading.Event) -> bool:
+        """今日の投稿を作成・送信する。送信済みになれば True"""
+        # 今日の投稿が作成済みなら、検索からやり直さずアウトボックスの送信だけ行う
+        queued = self.outbox.get(post_key)
+        if queued is not None:
+            if queued["status"] == SENT:
+                print(f"✅ 今日の投稿は送信済みです: {post_key}")
+                self.run_outcome["status"] = "already_sent"
+            elif queued["status"] == FAILED:
+                # 認証エラーなど再送しても直らない失敗。原因を直してから明示的に送り直す
+                print(f"❌ 今日の投稿は送信に失敗しています（{queued['last_error']}）: {post_key}")
+                print("   原因を直してから python chatwork_outbox.py drain --retry-failed で送り直してください")
+                self.run_outcome["status"] = "failed"
+                return False
+            else:
+                if queued["status"] == PENDING and queued["attempts"] >= self.chatwork_sender.max_attempts:
+                    # 前回の実行で再試行回数の上限に達した一時的な失敗は、今回の実行で改めて再試行する
+                    self.outbox.requeue([post_key])
+                print(f"📮 作成済みの投稿を再送します: {post_key}")
+                status = self.chatwork_sender.drain([post_key], deadline=self.budget.deadline()).get(post_key)
+                if status is None:
+                    status = (self.outbox.get(post_key) or {}).get("status", "不明")
+                print("✅ チャットワークに投稿完了" if status == SENT else f"❌ 投稿失敗（{status}）")
+                self.run_outcome["status"] = "resent" if status == SENT else "failed"
+                return status == SENT
+            return True
+        
+        post = PostPlan(self.plan_path).get(post_key, schedule)
+        if post is not None:
+            print(f"🗓️ 事前に作成した投稿を使用します: {post['category_name']} / {post['keyword']}")
+        else:
+            post = self.build_post(schedule)
+        self.stats_store.flush()
+        if post is None:
+            self.run_outcome["status"] = "no_videos"
+            self.print_api_summary()
+            return False
+        self.run_outcome["post"] = post
+        
+        if lease_lost.is_set():
+            print("🔒 作業が他のインスタンスに引き継がれたため投稿しません")
+            self.run_outcome["status"] = "lease_lost"
+            return False
+        
+        # チャットワークに投稿
+        success = self.post_to_chatwork(post["message"], idempotency_key=post_key)
+        self.run_outcome["status"] = "posted" if success else "failed"
+        
+        if success:
+            selected = post["videos"][:3]
+            print(f"✅ 投稿完了!")
+            print(f"   - カテゴリ: {post['category_name']}")
+            print(f"   - キーワード: {post['keyword']}")
+            print(f"   - 動画数: {len(selected)}本")
+            print(f"   - 平均品質スコア: {sum(v.get('quality_score', 0) for v in selected) / len(selected):.1f}点")
+        else:
+            print("❌ 投稿失敗")
+        
+        self.print_api_summary()
+        return success
+
+    def learn_keyword_yield(self, keyword: str, videos: List[Dict], quota: int, searched: bool):
+        """
+        検索結果の高品質動画数と消費クォータをキーワードの成績として記録する。
+        実際に検索APIから結果を得た場合（searched=True）だけ記録し、共有・キャッシュ・類似検索の流用・
+        障害時の代替は数えない。
+        """
+        if not searched:
+            return
+        hits = sum(1 for v in videos if v.get('quality_score', 0) >= self.scoring.cutoff)
+        self.bandit.update(keyword, hits, len(videos), quota, now=self.now())
+
+    def checkpointed(self, stage: str, compute: Callable[[], Any]) -> Any:
+        """
+        チェックポイントに stage の結果があればそれを返し、なければ compute() の結果を保存して返す。
+        結果が None（失敗）なら保存しないため、再開時にはその段階からやり直す。
+        """
+        if self.checkpoint is None:
+            return compute()
+        if self.checkpoint.has(stage):
+            print(f"⏩ チェックポイントから再開: {stage}")
+            return self.checkpoint.get(stage)
+        result = compute()
+        if result is not None:
+            self.checkpoint.save(stage, result)
+        return result
+
+    def build_post(self, schedule: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        スケジュール（None なら従来のカテゴリ選択）に従って動画を検索・選出し、投稿メッセージを作成する。
+        投稿はしない。メッセージ・キーワード・カテゴリ名・選出動画を返し、動画がなければ None。
+        """
+        return self.checkpointed("message", lambda: self._build_post(schedule))
+
+    def _build_post(self, schedule: Optional[Dict]) -> Optional[Dict]:
+        keywords, templates, category_name, selected_keyword = self.checkpointed(
+            "keyword", lambda: list(self.choose_keyword(schedule)))
+        
+        pooled = self.take_from_pool(schedule, keywords, selected_keyword, category_name)
+        if pooled is not None:
+            videos, selected_keyword = pooled
+            return self.compose_post(videos, selected_keyword, templates, category_name)
+        
+        # YouTube APIで動画を検索（品質スコア付き）
+        quota_before, stage_mark = self.quota_used, len(self.budget.stages)
+        videos = self.search_youtube_videos_api(selected_keyword, max_results=20)
+        stages = self.budget.stages[stage_mark:]
+        self.learn_keyword_yield(selected_keyword, videos, self.quota_used - quota_before,
+                                 any(s["stage"] == "search" and s["status"] == "ok" for s in stages))
+        
+        search_failed = any(s["stage"] == "search" and s["status"] in ("failed", "skipped") for s in stages)
+        if not videos and (search_failed or self.resilience.breaker('search').state != CircuitBreaker.CLOSED):
+            # 検索に失敗した（または検索APIが障害中の）場合は同じキーワード群のキャッシュ済み結果で代替
+            others = [k for k in keywords if k != selected_keyword]
+            videos, fallback_keyword = self.search_cached_catalog(others)
+            if videos:
+                print(f"♻️ キャッシュ済みの検索結果を使用: {fallback_keyword}")
+                selected_keyword = fallback_keyword
+        
+        return self.compose_post(videos, selected_keyword, templates, category_name)
+
+    def take_from_pool(self, schedule: Optional[Dict], keywords: List[str], selected_keyword: str,
+                       category_name: str) -> Optional[Tuple[List[Dict], str]]:
+        """
+        候補プール（スケジュールならそのキーワードのプールを合わせたもの、なければカテゴリのプール）に
+        未投稿の高品質動画が POST_VIDEOS 本以上あれば、今の時点で採点し直したスコア順の動画とそのキーワードを返す
+        """
+        if not self.serve_from_pools:
+            return None
+        pools = CandidatePools(self.pool_path)
+        if not pools.pools:
+            return None
+        if schedule:
+            keys = [keyword_pool_key(k) for k in [selected_keyword] + [k for k in keywords if k != selected_keyword]]
+        else:
+            keys = [category_pool_key(c.value) for c in POOLED_CATEGORIES if self.category_content(c)[2] == category_name]
+        videos = self.rank_videos(pools.union(keys, self.history.posted_video_ids(), self.now()))
+        high = [v for v in videos if v['quality_score'] >= self.scoring.cutoff]
+        if len(high) < POST_VIDEOS:
+            self.pool_stats["missed"] += 1
+            print(f"🧺 候補プールの高品質動画が{len(high)}本しかないため検索します")
+            return None
+        self.pool_stats["served"] += 1
+        print(f"🧺 候補プールから選出: 高品質 {len(high)}本（キーワード: {high[0]['keyword']}）")
+        return videos[:min(10, len(videos))], high[0]['keyword']
+
+    def choose_keyword(self, schedule: Optional[Dict] = None) -> Tuple[List[str], List[str], str, str]:
+        """スケジュール（None なら従来のカテゴリ選択）のキーワード群・テンプレート・カテゴリ名と、今回使うキーワード"""
+        if schedule:
+            keywords, category_name = schedule["keywords"], schedule.get("name", "カスタム")
             templates = [
                 "📚 今日の学習コンテンツ",
                 "🎯 スキルアップに役立つ動画",
@@ -852,18 +1594,23 @@ SES企業が競争から脱却するための重要な技術領域を学びま
             keywords, templates, category_name = self.get_keywords_and_template()
             print(f"📂 選択カテゴリ: {category_name}")
         
-        selected_keyword = random.choice(keywords)
+        candidates = keywords
+        if self.prefer_cache:
+            # キャッシュ済みの検索があるキーワードを優先（APIを呼ばずに済む）
+            candidates = [k for k in keywords if self.has_cached_search(k)] or keywords
+        selected_keyword = self.bandit.choose(candidates)
         print(f"🔍 選択キーワード: {selected_keyword}")
-        
-        # YouTube APIで動画を検索（品質スコア付き）
-        videos = self.search_youtube_videos_api(selected_keyword, max_results=20)
-        
+        return keywords, templates, category_name, selected_keyword
+
+    def compose_post(self, videos: List[Dict], keyword: str, templates: List[str],
+                     category_name: str) -> Optional[Dict]:
+        """スコア順の動画から高品質な動画を選び、投稿メッセージを作成する。動画がなければ None"""
         if not videos:
             print("❌ 動画が見つかりませんでした")
-            return
+            return None
         
-        # 品質スコアによるフィルタリング（スコア50点以上の動画のみ選択）
-        high_quality_videos = [v for v in videos if v.get('quality_score', 0) >= 50]
+        # 品質スコアによるフィルタリング（スコアが cutoff 点（既定50点）以上の動画のみ選択）
+        high_quality_videos = [v for v in videos if v.get('quality_score', 0) >= self.scoring.cutoff]
         
         if not high_quality_videos:
             print("⚠️ 高品質動画が見つかりませんでした。全動画から選択します。")
@@ -875,22 +1622,24 @@ SES企業が競争から脱却するための重要な技術領域を学びま
         template = random.choice(templates)
         
         # 投稿内容作成
-        message = self.format_video_post(high_quality_videos, template, category_name)
-        
-        # チャットワークに投稿
-        success = self.post_to_chatwork(message)
+        with self.budget.stage("render"):
+            message = self.format_video_post(high_quality_videos, template, category_name)
         
-        if success:
-            print(f"✅ 投稿完了!")
-            print(f"   - カテゴリ: {category_name}")
-            print(f"   - キーワード: {selected_keyword}")
-            print(f"   - 動画数: {min(3, len(high_quality_videos))}本")
-            print(f"   - 平均品質スコア: {sum(v.get('quality_score', 0) for v in high_quality_videos[:3]) / min(3, len(high_quality_videos)):.1f}点")
-        else:
-            print("❌ 投稿失敗")
+        return {
+            "message": message,
+            "keyword": keyword,
+            "category_name": category_name,
+            "videos": high_quality_videos,
+        }
 
 def main():
     """メイン実行関数"""
+    parser = argparse.ArgumentParser(description="本番用自動投稿")
+    parser.add_argument("--resume", action="store_true",
+                        help="途中で止まった実行を、チェックポイントの最後に完了した段階から再開する")
+    parser.add_argument("--run-id", help="チェックポイントの実行ID（既定: 今日の投稿の冪等キー）")
+    args = parser.parse_args()
+    
     # 環境変数から設定を取得
     chatwork_api_token = os.getenv('CHATWORK_API_TOKEN')
     chatwork_room_id = os.getenv('CHATWORK_ROOM_ID')
@@ -913,11 +1662,26 @@ def main():
     production_poster = ProductionChatworkAutoPost(
         chatwork_api_token, 
         chatwork_room_id, 
-        youtube_api_key
+        youtube_api_key,
+        hedge_requests=os.getenv('YOUTUBE_HEDGE_REQUESTS', '0') == '1',
+        run_budget=float(os.getenv('RUN_BUDGET_SECONDS', '20')) or None
     )
+    production_poster.similar_search_threshold = float(os.getenv('SIMILAR_SEARCH_THRESHOLD', '0')) or None
+    production_poster.similar_search_max_age = float(os.getenv('SIMILAR_SEARCH_MAX_AGE_HOURS', '72')) * 3600
+    production_poster.skip_holidays = os.getenv('SKIP_HOLIDAYS', '1') != '0'
+    production_poster.serve_from_pools = os.getenv('SERVE_FROM_POOLS', '1') != '0'
+    pushdown = SearchPushdown()
+    if os.getenv('SEARCH_PUSHDOWN', '0') == '1':
+        pushdown = pushdown_from_scoring(production_poster.scoring)
+    pushdown = pushdown._replace(video_definition=os.getenv('SEARCH_VIDEO_DEFINITION') or None,
+                                 video_caption=os.getenv('SEARCH_VIDEO_CAPTION') or None)
+    production_poster.pushdown = pushdown if any(pushdown) else None
     
     # 本番用自動投稿実行
-    production_poster.run_production_auto_post()
+    production_poster.run_production_auto_post(resume=args.resume, run_id=args.run_id)
+    # 投稿できなかった実行は失敗として終了する（GitHub Actions の --resume による再実行のため）
+    if production_poster.run_outcome.get("status") in FAILED_RUN_STATUSES:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日本の祝日カレンダー（オフライン）
+「国民の祝日に関する法律」の規則（固定日・ハッピーマンデー・春分/秋分の日の近似式・振替休日・
+国民の休日）と、2019〜2021年の特例（即位関連の休日、東京オリンピックに伴う移動）から
+2000〜2099年の祝日を計算します。外部APIやファイルは使いません。
+
+使い方:
+    python jp_holidays.py [年]   # その年の祝日一覧（既定: 今年）
+"""
+
+import sys
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+FIRST_YEAR = 2000
+LAST_YEAR = 2099
+
+# 年ごとの特例: 月日 → 名前。規則による同じ名前の祝日はこの日に移動する
+SPECIAL_HOLIDAYS: Dict[int, Dict[Tuple[int, int], str]] = {
+    2019: {(5, 1): "天皇の即位の日", (10, 22): "即位礼正殿の儀の行われる日"},
+    2020: {(7, 23): "海の日", (7, 24): "スポーツの日", (8, 10): "山の日"},
+    2021: {(7, 22): "海の日", (7, 23): "スポーツの日", (8, 8): "山の日"},
+}
+
+
+def nth_monday(year: int, month: int, n: int) -> date:
+    first = date(year, month, 1)
+    return first + timedelta(days=(7 - first.weekday()) % 7 + 7 * (n - 1))
+
+
+def equinox_day(year: int, base: float) -> int:
+    """春分（base=20.8431）・秋分（base=23.2488）の日。1980〜2099年で有効な近似式"""
+    return int(base + 0.242194 * (year - 1980) - (year - 1980) // 4)
+
+
+def statutory_holidays(year: int) -> Dict[date, str]:
+    """振替休日・国民の休日を除く、その年の祝日"""
+    days = {
+        date(year, 1, 1): "元日",
+        nth_monday(year, 1, 2): "成人の日",
+        date(year, 2, 11): "建国記念の日",
+        date(year, 3, equinox_day(year, 20.8431)): "春分の日",
+        date(year, 5, 3): "憲法記念日",
+        date(year, 5, 5): "こどもの日",
+        date(year, 9, equinox_day(year, 23.2488)): "秋分の日",
+        date(year, 11, 3): "文化の日",
+        date(year, 11, 23): "勤労感謝の日",
+    }
+    if year >= 2020:
+        days[date(year, 2, 23)] = "天皇誕生日"
+    elif year <= 2018:
+        days[date(year, 12, 23)] = "天皇誕生日"
+    if year >= 2007:
+        days[date(year, 4, 29)] = "昭和の日"
+        days[date(year, 5, 4)] = "みどりの日"
+    else:
+        days[date(year, 4, 29)] = "みどりの日"
+    days[nth_monday(year, 7, 3) if year >= 2003 else date(year, 7, 20)] = "海の日"
+    if year >= 2016:
+        days[date(year, 8, 11)] = "山の日"
+    days[nth_monday(year, 9, 3) if year >= 2003 else date(year, 9, 15)] = "敬老の日"
+    days[nth_monday(year, 10, 2)] = "スポーツの日" if year >= 2020 else "体育の日"
+
+    special = SPECIAL_HOLIDAYS.get(year, {})
+    moved = set(special.values())
+    days = {d: name for d, name in days.items() if name not in moved}
+    days.update({date(year, month, day): name for (month, day), name in special.items()})
+    return days
+
+
+@lru_cache(maxsize=256)
+def holidays_in_year(year: int) -> Dict[date, str]:
+    """その年の祝日（振替休日・国民の休日を含む）。日付 → 名前"""
+    days = statutory_holidays(year)
+    result = dict(days)
+    for d in sorted(days):
+        if d.weekday() == 6:
+            # 日曜日の祝日は、その後の最初の祝日でない日が振替休日
+            substitute = d + timedelta(days=1)
+            while substitute in result:
+                substitute += timedelta(days=1)
+            result[substitute] = "休日（振替休日）"
+    # 前日と翌日が祝日の平日は国民の休日（2019年の4/30・5/2 もこの規則による）
+    for d in sorted(days):
+        between = d + timedelta(days=1)
+        if between not in result and between.weekday() != 6 and (between + timedelta(days=1)) in days:
+            result[between] = "休日（国民の休日）"
+    return dict(sorted(result.items()))
+
+
+def holiday_name(day) -> Optional[str]:
+    """祝日ならその名前、そうでなければ None（datetime も受け付ける）"""
+    if isinstance(day, datetime):
+        day = day.date()
+    return holidays_in_year(day.year).get(day)
+
+
+def holidays_between(start: date, end: date) -> List[Tuple[date, str]]:
+    """start 以上 end 未満の祝日（日付順）"""
+    result = []
+    for year in range(start.year, end.year + 1):
+        result.extend((d, name) for d, name in holidays_in_year(year).items() if start <= d < end)
+    return result
+
+
+def main():
+    year = int(sys.argv[1]) if len(sys.argv) > 1 else date.today().year
+    if not FIRST_YEAR <= year <= LAST_YEAR:
+        print(f"⚠️ {FIRST_YEAR}〜{LAST_YEAR}年以外は規則どおりとは限りません")
+    weekdays = "月火水木金土日"
+    for d, name in holidays_in_year(year).items():
+        print(f"{d.isoformat()}（{weekdays[d.weekday()]}）{name}")
+
+
+if __name__ == "__main__":
+    main()
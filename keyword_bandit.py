@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+検索キーワードの適応的な選択（バンディット）
+キーワードごとに「品質スコア50点以上の動画が、消費クォータ1 unitあたり何本得られたか」を学習し、
+トンプソン・サンプリングで期待値の高いキーワードを選びます。一定の割合（探索の下限）では
+学習結果によらず均等に選び、動画の入れ替わりでよくなったキーワードも見逃さないようにします。
+
+使い方:
+    python keyword_bandit.py report   # 学習したキーワードごとの成績
+"""
+
+import os
+import sys
+import json
+import random
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from single_flight import normalize_query
+
+BANDIT_FILE = Path(__file__).parent / "state" / "keyword_bandit.json"
+
+# 試していないキーワードは「1回の検索（約100 units）で高品質動画10本」相当と楽観的に見積もる
+PRIOR_HITS = 1.0
+PRIOR_QUOTA = 10.0
+
+
+class KeywordBandit:
+    """
+    キーワードごとの高品質動画数 hits と消費クォータ quota を保存する。
+    1 unit あたりの収穫率をガンマ事後分布 Gamma(PRIOR_HITS + hits, PRIOR_QUOTA + quota) からサンプリングし、
+    最大のキーワードを選ぶ。確率 explore では均等に選ぶ。
+    """
+
+    def __init__(self, path: Path = BANDIT_FILE, explore: float = 0.1, rng: Optional[random.Random] = None):
+        self.path = Path(path)
+        self.explore = explore
+        self.rng = rng or random
+        self.arms: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.arms = json.load(f).get("arms", {})
+        except FileNotFoundError:
+            self.arms = {}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ キーワード学習データ読み込みエラー: {e}")
+            self.arms = {}
+
+    def save(self):
+        with self._lock:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=".keyword_bandit-", suffix=".json")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(json.dumps({"arms": self.arms}, ensure_ascii=False, indent=2))
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"⚠️ キーワード学習データ保存エラー: {e}")
+
+    def arm(self, keyword: str) -> Dict:
+        return self.arms.get(normalize_query(keyword)) or {"pulls": 0, "hits": 0, "videos": 0, "quota": 0}
+
+    def sample(self, keyword: str) -> float:
+        """1 unit あたりの高品質動画数を事後分布から1つ引く"""
+        a = self.arm(keyword)
+        return self.rng.gammavariate(PRIOR_HITS + a["hits"], 1.0 / (PRIOR_QUOTA + a["quota"]))
+
+    def choose(self, keywords: List[str]) -> str:
+        if len(keywords) == 1 or self.rng.random() < self.explore:
+            return self.rng.choice(keywords)
+        return max(keywords, key=self.sample)
+
+    def update(self, keyword: str, hits: int, videos: int, quota: int, now: Optional[datetime] = None):
+        """1回の検索の結果（高品質動画数・動画数・消費クォータ）を記録して保存する。now は検索した日時（既定は現在）"""
+        with self._lock:
+            a = self.arms.setdefault(normalize_query(keyword), {"pulls": 0, "hits": 0, "videos": 0, "quota": 0})
+            a["pulls"] += 1
+            a["hits"] += hits
+            a["videos"] += videos
+            a["quota"] += quota
+            a["last_used"] = (now or datetime.now().astimezone()).isoformat(timespec="seconds")
+        self.save()
+
+    def report(self) -> List[Dict]:
+        """収穫率（100 unitsあたりの高品質動画数）の事後平均が高い順"""
+        rows = []
+        for keyword, a in self.arms.items():
+            mean = (PRIOR_HITS + a["hits"]) / (PRIOR_QUOTA + a["quota"])
+            rows.append({"keyword": keyword, **a, "per_100_units": mean * 100,
+                         "hit_rate": a["hits"] / a["videos"] if a["videos"] else 0.0})
+        rows.sort(key=lambda r: -r["per_100_units"])
+        return rows
+
+
+def print_report(bandit: KeywordBandit):
+    rows = bandit.report()
+    if not rows:
+        print("📭 学習データがありません")
+        return
+    print(f"{'100u当たり':>9} {'回数':>4} {'高品質/動画':>10} {'クォータ':>8}  キーワード")
+    for r in rows:
+        print(f"{r['per_100_units']:9.2f} {r['pulls']:4d} {r['hits']:5d}/{r['videos']:<4d} {r['quota']:8d}  "
+              f"{r['keyword']}")
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    if command == "report":
+        print_report(KeywordBandit())
+    else:
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    main()
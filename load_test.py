@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配信スケジュール管理UIの負荷テスト
+複数のクライアントから画面（/）と一覧API（/api/schedules）を並行して取得し、
+1秒あたりのリクエスト数とレイテンシを表示します。
+
+使い方:
+    python load_test.py --url http://127.0.0.1:5000       # 起動中のサーバーを計測
+    python load_test.py --before http://127.0.0.1:5000 --after http://127.0.0.1:5001
+                                                            # 変更前後の2つのサーバーを比較
+    python load_test.py --modes                             # 開発モードと本番モードを起動して比較
+    python load_test.py --mixed --sizes 10,1000,10000,100000 --clients 16
+                                                            # 読み書き混在の負荷（更新の消失・破損も検査）
+    python load_test.py --mixed --servers 2 --mix get=50,post=20,put=20,delete=10 --json result.json
+
+--mixed は一時ディレクトリに指定件数のスケジュールを用意し、環境変数 SCHEDULES_FILE でそれを使う
+本番モードのサーバーを起動して、GET・POST・PUT・DELETE を混ぜた負荷をかけます（既存の schedules.json には
+触れません）。各クライアントは自分の作ったスケジュールだけを更新・削除し、成功した書き込みを覚えておくため、
+終了後のファイルと照合して更新の消失を数えられます。書き込みの応答のバージョンの重複（同じ版を元にした
+書き込みが2つ成功した）、壊れた応答、ファイルの破損（JSONとして読めない・id の重複・一時ファイルの残り）も数えます。
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import signal
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+
+SCRIPT_DIR = Path(__file__).parent
+READ_PATHS = ["/", "/api/schedules"]
+
+
+def percentile(samples: List[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def run_load(base_url: str, clients: int, duration: float, paths: List[str] = READ_PATHS) -> Dict:
+    """clients 本のスレッドで duration 秒間 paths を順に取得し続ける"""
+    latencies: List[float] = []
+    errors = 0
+    transferred = 0
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(n: int):
+        nonlocal errors, transferred
+        session = requests.Session()
+        local, local_errors, local_bytes = [], 0, 0
+        i = n
+        while time.monotonic() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                response = session.get(base_url + path, timeout=10, stream=True)
+                response.content
+                local_bytes += response.raw.tell()
+                if response.status_code >= 400:
+                    local_errors += 1
+            except requests.RequestException:
+                local_errors += 1
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+            errors += local_errors
+            transferred += local_bytes
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "kb_per_request": transferred / max(1, len(latencies)) / 1024,
+    }
+
+
+def print_result(label: str, r: Dict):
+    print(f"{label:<12} {r['rps']:8.1f} req/s  p50 {r['p50'] * 1000:6.1f}ms  p95 {r['p95'] * 1000:6.1f}ms  "
+          f"p99 {r['p99'] * 1000:6.1f}ms  {r['kb_per_request']:6.1f} KB/req  "
+          f"({r['requests']}件, エラー {r['errors']}件)")
+
+
+def wait_until_up(base_url: str, timeout: float = 20.0, path: str = "/api/schedules") -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(base_url + path, timeout=1)
+            return True
+        except requests.RequestException:
+            time.sleep(0.2)
+    return False
+
+
+def start_server(port: int, production: bool, env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    cmd = [sys.executable, str(SCRIPT_DIR / "schedule_manager.py"), "--host", "127.0.0.1", "--port", str(port)]
+    if production:
+        cmd.append("--production")
+    # 開発モードはリローダーが子プロセスを起動するため、プロセスグループごと停止できるようにする
+    return subprocess.Popen(cmd, cwd=SCRIPT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True, env={**os.environ, **(env or {})})
+
+
+def stop_server(proc: subprocess.Popen):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except (AttributeError, ProcessLookupError):
+        proc.terminate()
+    proc.wait()
+
+
+def print_comparison(clients: int, duration: float, results: Dict[str, Dict]):
+    print(f"📊 {clients}クライアント × {duration:.0f}秒（{', '.join(READ_PATHS)}）")
+    for label, r in results.items():
+        print_result(label, r)
+    before, after = list(results.values())
+    print(f"➡️ スループット {after['rps'] / max(0.001, before['rps']):.2f}倍、転送量 "
+          f"{after['kb_per_request'] / max(0.001, before['kb_per_request']) * 100:.0f}%")
+
+
+def compare_urls(before_url: str, after_url: str, clients: int, duration: float):
+    """変更前・変更後のサーバーに順に同じ負荷をかける"""
+    results = {}
+    for label, url in (("変更前", before_url), ("変更後", after_url)):
+        run_load(url, clients, 1.0)  # ウォームアップ
+        results[label] = run_load(url, clients, duration)
+    print_comparison(clients, duration, results)
+
+
+def compare_modes(clients: int, duration: float):
+    """開発モードと本番モードを順に起動して同じ負荷をかける"""
+    results = {}
+    for label, production, port in (("開発モード", False, 5101), ("本番モード", True, 5102)):
+        proc = start_server(port, production)
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            if not wait_until_up(base_url):
+                print(f"❌ {label} のサーバーが起動しませんでした")
+                return
+            run_load(base_url, clients, 1.0)  # ウォームアップ
+            results[label] = run_load(base_url, clients, duration)
+        finally:
+            stop_server(proc)
+    print_comparison(clients, duration, results)
+
+
+OPERATIONS = ("get", "post", "put", "delete")
+DEFAULT_MIX = "get=70,post=10,put=15,delete=5"
+SEED_ID_PREFIX = "seed-"
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """get=70,post=10,... を操作ごとの重みに"""
+    mix = {op: 0.0 for op in OPERATIONS}
+    for part in text.split(","):
+        op, _, weight = part.partition("=")
+        if op.strip() not in mix:
+            raise ValueError(f"未知の操作: {op}")
+        mix[op.strip()] = float(weight)
+    if sum(mix.values()) <= 0:
+        raise ValueError("重みの合計が0です")
+    return mix
+
+
+def seed_schedules(path: Path, size: int, seed: int = 1):
+    """size 件のスケジュールを書き込む（id は seed-0, seed-1, ...）"""
+    rng = random.Random(seed)
+    schedules = [{"id": f"{SEED_ID_PREFIX}{i}", "weekday": i % 7, "time": f"{rng.randrange(24):02d}:{rng.randrange(60):02d}",
+                  "name": f"負荷テスト {i}", "keywords": [f"キーワード{rng.randrange(1000)}"], "description": ""}
+                 for i in range(size)]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"schedules": schedules, "version": 0}, f, ensure_ascii=False, indent=2)
+
+
+class MixedClient:
+    """
+    GET・POST・PUT・DELETE を重みどおりに混ぜて送る1クライアント。
+    POST で作るスケジュールの id はクライアントごとに別で、PUT・DELETE は自分が作ったものだけに行う。
+    成功した書き込みの結果（id → 名前、削除なら None）を expected に、応答のバージョンを versions に記録する。
+    タイムアウトなどで反映されたか分からない書き込みの id は uncertain に入れて照合から外す。
+    """
+
+    def __init__(self, n: int, base_urls: List[str], mix: Dict[str, float], seed_size: int, timeout: float):
+        self.n = n
+        self.base_urls = base_urls
+        self.ops = list(mix)
+        self.weights = [mix[op] for op in self.ops]
+        self.seed_size = seed_size
+        self.timeout = timeout
+        self.rng = random.Random(n)
+        self.session = requests.Session()
+        self.latencies: Dict[str, List[float]] = {op: [] for op in OPERATIONS}
+        self.errors: Counter = Counter()
+        self.expected: Dict[str, Optional[str]] = {}
+        self.uncertain: set = set()
+        self.versions: List[int] = []
+        self.bad_responses = 0
+        self.vanished = 0
+        self.created = 0
+        self.updates = 0
+
+    def live_ids(self) -> List[str]:
+        return [i for i, name in self.expected.items() if name is not None and i not in self.uncertain]
+
+    def request(self, op: str, method: str, path: str, body: Optional[Dict] = None):
+        """送信して (HTTPステータス, JSON) を返す。通信エラーは (None, None)"""
+        url = self.base_urls[self.rng.randrange(len(self.base_urls))] + path
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, json=body, timeout=self.timeout)
+            try:
+                data = response.json()
+            except ValueError:
+                data = None
+                self.bad_responses += 1
+        except requests.RequestException:
+            self.latencies[op].append(time.perf_counter() - start)
+            self.errors[op] += 1
+            return None, None
+        self.latencies[op].append(time.perf_counter() - start)
+        if response.status_code >= 500:
+            self.errors[op] += 1
+        return response.status_code, data
+
+    def step(self):
+        op = self.rng.choices(self.ops, self.weights)[0]
+        live = self.live_ids()
+        if op in ("put", "delete") and not live:
+            op = "post"
+        if op == "get":
+            if self.seed_size and self.rng.random() < 0.5:
+                self.request(op, "GET", f"/api/schedules/{SEED_ID_PREFIX}{self.rng.randrange(self.seed_size)}")
+            else:
+                self.request(op, "GET", f"/api/schedules?limit=100&weekday={self.rng.randrange(7)}")
+        elif op == "post":
+            schedule_id = f"lt{self.n}-{self.created}"
+            self.created += 1
+            name = f"{schedule_id} v0"
+            status, data = self.request(op, "POST", "/api/schedules", {
+                "id": schedule_id, "weekday": self.rng.randrange(7), "time": "09:00", "name": name,
+                "keywords": ["負荷テスト"], "description": ""})
+            self.record_write(schedule_id, name, status, data, (200, 201))
+        elif op == "put":
+            schedule_id = self.rng.choice(live)
+            self.updates += 1
+            name = f"{schedule_id} v{self.updates}"
+            status, data = self.request(op, "PUT", f"/api/schedules/{schedule_id}", {"name": name})
+            self.record_write(schedule_id, name, status, data, (200,))
+        else:
+            schedule_id = self.rng.choice(live)
+            status, data = self.request(op, "DELETE", f"/api/schedules/{schedule_id}")
+            self.record_write(schedule_id, None, status, data, (200,))
+
+    def record_write(self, schedule_id: str, name: Optional[str], status: Optional[int], data: Optional[Dict],
+                     ok: tuple):
+        if status in ok and isinstance(data, dict):
+            self.expected[schedule_id] = name
+            if isinstance(data.get("version"), int):
+                self.versions.append(data["version"])
+        elif status == 404:
+            # 自分が作って消していないスケジュールが見つからない = 先の書き込みが失われた
+            self.vanished += 1
+            self.uncertain.add(schedule_id)
+        elif status is None or status >= 500:
+            self.uncertain.add(schedule_id)
+
+    def run(self, deadline: float):
+        while time.monotonic() < deadline:
+            self.step()
+
+
+def check_schedules_file(path: Path, clients: List[MixedClient]) -> Dict:
+    """終了後のファイルを読み、破損と、成功した書き込みが反映されていない件数（更新の消失）を数える"""
+    result = {"file_ok": True, "duplicate_ids": 0, "temp_files": len(list(path.parent.glob(".schedules-*.json"))),
+              "lost_updates": 0, "checked": 0}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            schedules = json.load(f)["schedules"]
+        if not all(isinstance(s, dict) and "id" in s and "weekday" in s for s in schedules):
+            raise ValueError("項目の欠けたスケジュールがあります")
+    except (OSError, ValueError, KeyError, TypeError):
+        result["file_ok"] = False
+        return result
+    ids = Counter(s["id"] for s in schedules)
+    result["duplicate_ids"] = sum(count - 1 for count in ids.values() if count > 1)
+    names = {s["id"]: s.get("name") for s in schedules}
+    for client in clients:
+        for schedule_id, name in client.expected.items():
+            if schedule_id in client.uncertain:
+                continue
+            result["checked"] += 1
+            if names.get(schedule_id) != name:
+                result["lost_updates"] += 1
+    return result
+
+
+def run_mixed(size: int, clients: int, duration: float, servers: int, mix: Dict[str, float],
+              timeout: float = 60.0, base_port: int = 5201) -> Optional[Dict]:
+    """size 件のスケジュールを用意したサーバーに clients 本の読み書き混在の負荷を duration 秒かける"""
+    work_dir = Path(tempfile.mkdtemp(prefix="load-test-"))
+    path = work_dir / "schedules.json"
+    seed_schedules(path, size)
+    procs = [start_server(base_port + i, True, {"SCHEDULES_FILE": str(path)}) for i in range(servers)]
+    try:
+        base_urls = [f"http://127.0.0.1:{base_port + i}" for i in range(servers)]
+        for url in base_urls:
+            if not wait_until_up(url, timeout=60.0, path="/api/schedules?limit=1"):
+                print(f"❌ サーバーが起動しませんでした: {url}")
+                return None
+        workers = [MixedClient(n, base_urls, mix, size, timeout) for n in range(clients)]
+        deadline = time.monotonic() + duration
+        threads = [threading.Thread(target=w.run, args=(deadline,)) for w in workers]
+        started = time.monotonic()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.monotonic() - started
+    finally:
+        for proc in procs:
+            stop_server(proc)
+    try:
+        check = check_schedules_file(path, workers)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    by_op = {}
+    for op in OPERATIONS:
+        samples = [x for w in workers for x in w.latencies[op]]
+        by_op[op] = {"requests": len(samples), "errors": sum(w.errors[op] for w in workers),
+                     "p50": percentile(samples, 50), "p95": percentile(samples, 95), "p99": percentile(samples, 99)}
+    all_samples = [x for w in workers for op in OPERATIONS for x in w.latencies[op]]
+    versions = Counter(v for w in workers for v in w.versions)
+    return {
+        "size": size, "clients": clients, "servers": servers, "duration": elapsed,
+        "requests": len(all_samples), "rps": len(all_samples) / elapsed,
+        "p50": percentile(all_samples, 50), "p95": percentile(all_samples, 95), "p99": percentile(all_samples, 99),
+        "operations": by_op,
+        "duplicate_versions": sum(count - 1 for count in versions.values() if count > 1),
+        "vanished": sum(w.vanished for w in workers),
+        "bad_responses": sum(w.bad_responses for w in workers),
+        **check,
+    }
+
+
+def print_mixed(r: Dict):
+    print(f"📦 {r['size']:,}件  {r['clients']}クライアント × {r['duration']:.1f}秒  サーバー {r['servers']}プロセス")
+    print(f"   {'全体':<6} {r['rps']:8.1f} req/s  p50 {r['p50'] * 1000:7.1f}ms  p95 {r['p95'] * 1000:7.1f}ms  "
+          f"p99 {r['p99'] * 1000:7.1f}ms  ({r['requests']}件)")
+    for op, o in r["operations"].items():
+        if o["requests"]:
+            print(f"   {op.upper():<6} {o['requests'] / r['duration']:8.1f} req/s  p50 {o['p50'] * 1000:7.1f}ms  "
+                  f"p95 {o['p95'] * 1000:7.1f}ms  p99 {o['p99'] * 1000:7.1f}ms  ({o['requests']}件, エラー {o['errors']}件)")
+    problems = r["lost_updates"] + r["vanished"] + r["duplicate_versions"] + r["bad_responses"] + r["duplicate_ids"] \
+        + r["temp_files"] + (0 if r["file_ok"] else 1)
+    file_state = "正常" if r["file_ok"] else "破損（JSONとして読めない）"
+    print(f"   {'✅' if not problems else '⚠️'} 更新の消失 {r['lost_updates']}件（照合 {r['checked']}件）、"
+          f"消えたスケジュール {r['vanished']}件、バージョン重複 {r['duplicate_versions']}件、壊れた応答 {r['bad_responses']}件、"
+          f"ファイル {file_state}（id 重複 {r['duplicate_ids']}件、一時ファイル {r['temp_files']}件）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="配信スケジュール管理UIの負荷テスト")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--before", help="比較する変更前サーバーのURL（--after と併用）")
+    parser.add_argument("--after", help="比較する変更後サーバーのURL")
+    parser.add_argument("--modes", action="store_true", help="開発モードと本番モードを起動して比較する")
+    parser.add_argument("--mixed", action="store_true", help="一時ファイルで起動したサーバーに読み書き混在の負荷をかける")
+    parser.add_argument("--sizes", default="10,1000,10000,100000", help="--mixed で用意するスケジュール件数（カンマ区切り）")
+    parser.add_argument("--servers", type=int, default=1, help="--mixed で同じファイルを使うサーバーのプロセス数")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"--mixed の操作の重み（既定: {DEFAULT_MIX}）")
+    parser.add_argument("--json", help="--mixed の結果をJSONで保存するファイル")
+    args = parser.parse_args()
+
+    if args.mixed:
+        try:
+            mix = parse_mix(args.mix)
+            sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        results = []
+        for size in sizes:
+            result = run_mixed(size, args.clients, args.duration, args.servers, mix)
+            if result is None:
+                sys.exit(1)
+            print_mixed(result)
+            results.append(result)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"mix": mix, "results": results}, f, ensure_ascii=False, indent=2)
+            print(f"💾 結果を保存しました: {args.json}")
+    elif args.before and args.after:
+        compare_urls(args.before.rstrip("/"), args.after.rstrip("/"), args.clients, args.duration)
+    elif args.modes:
+        compare_modes(args.clients, args.duration)
+    else:
+        print_result(args.url, run_load(args.url.rstrip("/"), args.clients, args.duration))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+投稿候補プールの補充
+カテゴリ（ContentCategory）ごと・スケジュールのキーワードごとに、検索・スコアリング済みの未投稿の高品質動画の
+プール（state/candidate_pools.json）を保ちます。未投稿の高品質動画が LOW_WATER 本を下回ったプールを
+検索して補充し、1日の補充のクォータは --daily-quota までに抑えます。常駐（daemon）では補充を1日に
+分散させ、時刻に比例した分までしかクォータを使いません。当日の自動投稿はプールに十分な動画があれば
+検索せずにそこから選ぶため、朝の実行は YouTube API を待ちません。
+
+補充するのは次の DEMAND_RUNS 回の投稿日に使うプールだけです。スケジュールのある日は、そのキーワードの
+プールを合わせて LOW_WATER 本あれば足ります（当日はそれらを合わせて選ぶため）。スケジュールのない日は
+カテゴリが当日ランダムに決まるため、4つのカテゴリのプールそれぞれを LOW_WATER 本に保ちます。
+
+使い方:
+    python pool_replenisher.py refill [--daily-quota 2000] [--pace]   # 1回だけ補充する（cron などから）
+    python pool_replenisher.py daemon [--interval 30]                  # 常駐して1日に分散して補充する
+    python pool_replenisher.py status                                  # プールの状態
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from candidate_pool import LOW_WATER, CandidatePools, category_pool_key, keyword_pool_key
+from enhanced_auto_post_production import JST, POOLED_CATEGORIES, YOUTUBE_QUOTA_COST, ProductionChatworkAutoPost
+
+# 1日に補充に使うクォータ（YouTube Data API の既定の上限は 10,000 units/日。朝の実行・週間計画の分を残す）
+DAILY_QUOTA = 2000
+# 常駐時に補充が必要かを確認する間隔（分）
+TICK_MINUTES = 30
+# 1回の補充で検索するキーワード数の上限（LOW_WATER 本に達すればそこで止める）
+REFILL_SEARCHES = 2
+# 何回先の投稿日までのプールを補充するか
+DEMAND_RUNS = 2
+# スケジュールに時刻がない場合の投稿時刻（これを過ぎた日の投稿は済んだものとして補充しない）
+RUN_TIME = "09:00"
+# 1キーワードの補充にかかるクォータ（検索1回と、動画・チャンネル詳細の一括取得）
+REFILL_COST = YOUTUBE_QUOTA_COST['search'] + YOUTUBE_QUOTA_COST['videos'] + YOUTUBE_QUOTA_COST['channels']
+
+
+class PoolReplenisher:
+    """投稿処理（ProductionChatworkAutoPost）の検索・スコアリングを使って候補プールを補充する"""
+
+    def __init__(self, poster: ProductionChatworkAutoPost, pools: CandidatePools, daily_quota: int = DAILY_QUOTA):
+        self.poster = poster
+        self.pools = pools
+        self.daily_quota = daily_quota
+
+    def active_schedules(self) -> Dict[int, Dict]:
+        """曜日（平日）→ その日に使われるスケジュール（最初のキーワード付きのもの）"""
+        active: Dict[int, Dict] = {}
+        try:
+            if self.poster.schedules_path.exists():
+                with open(self.poster.schedules_path, "r", encoding="utf-8") as f:
+                    for s in json.load(f).get("schedules", []):
+                        keywords = s.get("keywords", [])
+                        if s.get("weekday") in range(5) and isinstance(keywords, list) and keywords:
+                            active.setdefault(s["weekday"], s)
+        except Exception as e:
+            print(f"⚠️ schedules.json 読み込みエラー: {e}")
+        return active
+
+    def wanted_pools(self, active: Dict[int, Dict]) -> Dict[str, Dict]:
+        """残しておくプール（キー → {label, keywords}）。スケジュールのキーワードと、スケジュールのない平日があればカテゴリ"""
+        poster = self.poster
+        wanted = {}
+        for s in active.values():
+            for keyword in s["keywords"]:
+                wanted[keyword_pool_key(keyword)] = {"label": f"{s.get('name', 'カスタム')} / {keyword}",
+                                                     "keywords": [keyword]}
+        if len(active) < 5:
+            for category in POOLED_CATEGORIES:
+                keywords, _, name = poster.category_content(category)
+                wanted[category_pool_key(category.value)] = {"label": name, "keywords": list(keywords)}
+        return wanted
+
+    def demand(self, active: Dict[int, Dict], now: datetime) -> List[Tuple[List[str], bool]]:
+        """次の DEMAND_RUNS 回の投稿日に使うプール（キーと、すべてのプールが必要か）"""
+        groups = []
+        for offset in range(14):
+            when = now + timedelta(days=offset)
+            if self.poster.day_off(when):
+                continue
+            schedule = active.get(when.weekday())
+            if offset == 0 and now.strftime("%H:%M") >= (schedule or {}).get("time", RUN_TIME):
+                continue
+            if schedule:
+                groups.append(([keyword_pool_key(k) for k in schedule["keywords"]], False))
+            else:
+                groups.append(([category_pool_key(c.value) for c in POOLED_CATEGORIES], True))
+            if len(groups) == DEMAND_RUNS:
+                break
+        return groups
+
+    def allowance(self, now: datetime, pace: bool, interval: float) -> int:
+        """今使ってよい残りのクォータ。pace=True なら1日のうち次の確認時刻までの割合の分だけ"""
+        budget = self.daily_quota
+        if pace:
+            elapsed = now.hour * 3600 + now.minute * 60 + now.second + interval
+            budget = int(budget * min(1.0, elapsed / 86400))
+        return budget - self.pools.spent(now.strftime("%Y-%m-%d"))
+
+    def tick(self, pace: bool = False, interval: float = TICK_MINUTES * 60) -> int:
+        """次の投稿日に使うプールのうち LOW_WATER 本を下回ったものを、予算の範囲で補充する。検索した回数を返す"""
+        poster = self.poster
+        poster.start_budget()
+        now = poster.now()
+        posted = poster.history.posted_video_ids()
+        active = self.active_schedules()
+        self.pools.sync(self.wanted_pools(active), posted, now)
+
+        searches = 0
+        short = 0
+        for keys, need_all in self.demand(active, now):
+            # カテゴリはどれが選ばれるか分からないため1つずつ、スケジュールのキーワードは合わせて LOW_WATER 本
+            for group in ([key] for key in keys) if need_all else [keys]:
+                if self.pools.fill(group, posted, now, poster.scoring.cutoff) >= LOW_WATER:
+                    continue
+                short += 1
+                if self.allowance(now, pace, interval) < REFILL_COST:
+                    print(f"⏳ 今使える補充の予算がありません（今日 {self.pools.spent(now.strftime('%Y-%m-%d'))}"
+                          f"/{self.daily_quota} units 使用済み）")
+                    break
+                searches += self.refill(group, posted, now, pace, interval)
+        self.pools.save()
+        poster.stats_store.flush()
+        print(f"🧺 補充: 検索 {searches}回（不足していたプール {short}件）")
+        return searches
+
+    def refill(self, keys: List[str], posted: Set[str], now: datetime, pace: bool, interval: float) -> int:
+        """
+        プール（複数なら合わせて）が LOW_WATER 本になるまで、検索し直す間隔の過ぎたキーワードを
+        REFILL_SEARCHES 回まで検索して補充し、検索した回数を返す
+        """
+        poster = self.poster
+        cutoff = poster.scoring.cutoff
+        due = {keyword: key for key in keys for keyword in self.pools.keywords_due(key, now)}
+        searches = 0
+        while due and searches < REFILL_SEARCHES and self.allowance(now, pace, interval) >= REFILL_COST:
+            keyword = poster.bandit.choose(list(due))
+            key = due.pop(keyword)
+            quota_before = poster.quota_used
+            videos, searched = self.search(keyword)
+            poster.learn_keyword_yield(keyword, videos[:10], poster.quota_used - quota_before, searched)
+            added = self.pools.add(key, keyword, videos, posted, now, cutoff)
+            self.pools.spend(now.strftime("%Y-%m-%d"), poster.quota_used - quota_before)
+            searches += 1
+            fill = self.pools.fill(keys, posted, now, cutoff)
+            print(f"🧺 {self.pools.pools[key].get('label', key)}: {keyword} で {added}本追加（{fill}本）")
+            if fill >= LOW_WATER:
+                break
+        return searches
+
+    def search(self, keyword: str) -> Tuple[List[Dict], bool]:
+        """検索して詳細を付け、スコア順に並べた動画と、実際に検索APIから結果を得たか"""
+        poster = self.poster
+        data, searched = poster.search_or_reuse(keyword)
+        items = (data or {}).get("items", [])
+        if not items:
+            return [], searched
+        video_details = poster.get_video_details([item["id"]["videoId"] for item in items])
+        channel_details = poster.get_channel_details(list({item["snippet"]["channelId"] for item in items}))
+        videos = poster.rank_videos(poster.collect_video_infos(items, video_details, channel_details))
+        poster.note_search_candidates(videos)
+        return videos, searched
+
+
+def run_daemon(make: Callable[[], PoolReplenisher], interval: float = TICK_MINUTES * 60):
+    """
+    interval 秒ごとに補充が必要か確認し、1日に分散して補充する。キャッシュ・キーワード学習・投稿履歴は
+    自動投稿も書き換えるため、毎回 make() で読み直した投稿処理を使う
+    """
+    print(f"🧺 候補プールの補充を開始します（{interval / 60:.0f}分ごと）")
+    try:
+        while True:
+            try:
+                make().tick(pace=True, interval=interval)
+            except Exception as e:
+                print(f"❌ 補充エラー: {e}")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("🛑 補充を停止しました")
+
+
+def print_status(pools: CandidatePools, posted: Set[str], cutoff: float, now: Optional[datetime] = None):
+    now = now or datetime.now(JST)
+    if not pools.pools:
+        print("📭 候補プールがありません")
+        return
+    # スケジュールのキーワードのプールは同じ日のものを合わせて LOW_WATER 本あればよい
+    for key, pool in sorted(pools.pools.items(), key=lambda kv: kv[1].get("label", kv[0])):
+        print(f"🧺 {pools.fill([key], posted, now, cutoff):3d}本  {pool.get('label', key)}")
+    for day, units in sorted(pools.quota.items()):
+        print(f"💰 {day}: {units} units")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="投稿候補プールの補充")
+    parser.add_argument("command", nargs="?", default="refill", choices=["refill", "daemon", "status"])
+    parser.add_argument("--daily-quota", type=int, default=int(os.getenv("POOL_DAILY_QUOTA", DAILY_QUOTA)))
+    parser.add_argument("--pace", action="store_true", help="refill でも時刻に比例した分までしかクォータを使わない")
+    parser.add_argument("--interval", type=float, default=TICK_MINUTES, help="daemon の確認間隔（分）")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        poster = ProductionChatworkAutoPost("", "", "")
+        print_status(CandidatePools(poster.pool_path), poster.history.posted_video_ids(), poster.scoring.cutoff)
+        return
+
+    youtube_api_key = os.getenv('YOUTUBE_API_KEY')
+    if not youtube_api_key:
+        print("❌ YOUTUBE_API_KEY が設定されていません")
+        sys.exit(1)
+
+    def make() -> PoolReplenisher:
+        # 投稿は当日の自動投稿が行うため、チャットワークの設定は補充には不要
+        poster = ProductionChatworkAutoPost(os.getenv('CHATWORK_API_TOKEN', ''), os.getenv('CHATWORK_ROOM_ID', ''),
+                                            youtube_api_key)
+        return PoolReplenisher(poster, CandidatePools(poster.pool_path), args.daily_quota)
+
+    if args.command == "daemon":
+        run_daemon(make, args.interval * 60)
+    else:
+        make().tick(pace=args.pace)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+投稿履歴と集計
+実行ごとの結果（カテゴリ・キーワード・紹介した動画・品質スコア・消費クォータ）を追記専用の表に記録し、
+同じトランザクションで日・週・曜日・カテゴリ・キーワード・チャンネルごとの集計を加算更新します。
+集計は履歴を読み直さずに引けるため、何年分の履歴があっても一瞬で表示できます。
+
+使い方:
+    python post_history.py report [件数]   # 集計の表示（各項目の上位件数、既定10）
+    python post_history.py recent [件数]   # 直近の実行履歴
+    python post_history.py rebuild         # 履歴から集計を作り直す
+"""
+
+import sys
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+STATE_DIR = Path(__file__).parent / "state"
+HISTORY_FILE = STATE_DIR / "post_history.sqlite3"
+
+WEEKDAY_NAMES = ["月曜日", "火曜日", "水曜日", "木曜日", "金曜日", "土曜日", "日曜日"]
+# 投稿できた（または作成済みの投稿を再送できた）実行
+POSTED_STATUSES = ("posted", "resent")
+# 集計の軸。day・week は新しい順、それ以外は投稿数の多い順に表示する
+DIMENSIONS = ("all", "day", "week", "weekday", "category", "keyword", "channel", "status")
+
+
+def week_key(day: datetime) -> str:
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+class PostHistory:
+    """
+    runs は追記のみ。rollups は (軸, キー) ごとの実行数・投稿数・クォータ・動画数・品質スコア合計で、
+    record() のたびに加算される（平均は score_sum / videos、1投稿あたりのクォータは quota / posts）。
+    """
+
+    def __init__(self, path: Path = HISTORY_FILE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_at TEXT NOT NULL,
+                source TEXT NOT NULL,
+                status TEXT NOT NULL,
+                schedule_id TEXT,
+                category TEXT,
+                keyword TEXT,
+                quota INTEGER NOT NULL DEFAULT 0,
+                elapsed REAL,
+                videos TEXT NOT NULL DEFAULT '[]'
+            );
+            CREATE TABLE IF NOT EXISTS rollups (
+                dim TEXT NOT NULL,
+                key TEXT NOT NULL,
+                runs INTEGER NOT NULL DEFAULT 0,
+                posts INTEGER NOT NULL DEFAULT 0,
+                quota INTEGER NOT NULL DEFAULT 0,
+                videos INTEGER NOT NULL DEFAULT 0,
+                score_sum REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (dim, key)
+            );
+            """
+        )
+
+    @staticmethod
+    def rollup_rows(run: Dict) -> List[Tuple]:
+        """1回の実行が各集計に加える (軸, キー, 実行数, 投稿数, クォータ, 動画数, スコア合計)"""
+        at = datetime.fromisoformat(run["run_at"])
+        videos = run.get("videos") or []
+        posts = 1 if run["status"] in POSTED_STATUSES else 0
+        score_sum = sum(v.get("quality_score", 0) for v in videos)
+        total = (1, posts, run.get("quota", 0), len(videos), score_sum)
+        rows = [("all", "all", *total), ("day", at.date().isoformat(), *total), ("week", week_key(at), *total),
+                ("weekday", WEEKDAY_NAMES[at.weekday()], *total), ("status", run["status"], *total)]
+        for dim in ("category", "keyword"):
+            if run.get(dim):
+                rows.append((dim, run[dim], *total))
+        channels: Dict[str, List[float]] = {}
+        for v in videos:
+            channels.setdefault(v.get("channel_name") or "不明", []).append(v.get("quality_score", 0))
+        for channel, scores in channels.items():
+            rows.append(("channel", channel, 0, posts, 0, len(scores), sum(scores)))
+        return rows
+
+    def _apply(self, rows: List[Tuple]):
+        self._conn.executemany(
+            "INSERT INTO rollups (dim, key, runs, posts, quota, videos, score_sum) VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (dim, key) DO UPDATE SET runs = runs + excluded.runs, posts = posts + excluded.posts, "
+            "quota = quota + excluded.quota, videos = videos + excluded.videos, "
+            "score_sum = score_sum + excluded.score_sum",
+            rows,
+        )
+
+    def record(self, run: Dict) -> int:
+        """
+        実行結果を追記し、集計を加算する。run は run_at（ISO形式）・source・status と、
+        任意で schedule_id・category・keyword・quota・elapsed・videos（channel_name, quality_score を含む dict）。
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = self._conn.execute(
+                    "INSERT INTO runs (run_at, source, status, schedule_id, category, keyword, quota, elapsed, videos) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (run["run_at"], run["source"], run["status"], run.get("schedule_id"), run.get("category"),
+                     run.get("keyword"), run.get("quota", 0), run.get("elapsed"),
+                     json.dumps(run.get("videos") or [], ensure_ascii=False)),
+                )
+                self._apply(self.rollup_rows(run))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return cur.lastrowid
+
+    def rebuild(self) -> int:
+        """履歴をすべて読み直して集計を作り直す（集計方法を変えたときなど）。読んだ件数を返す"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM rollups")
+                count = 0
+                for row in self._conn.execute("SELECT * FROM runs ORDER BY id").fetchall():
+                    run = dict(row)
+                    run["videos"] = json.loads(run["videos"])
+                    self._apply(self.rollup_rows(run))
+                    count += 1
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return count
+
+    def rollups(self, dim: str, limit: Optional[int] = None) -> List[Dict]:
+        if dim in ("day", "week"):
+            order = "key DESC"
+        else:
+            order = "posts DESC, runs DESC, key"
+        sql = f"SELECT * FROM rollups WHERE dim = ? ORDER BY {order}"
+        params: tuple = (dim,)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params += (limit,)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        result = []
+        for row in rows:
+            r = dict(row)
+            del r["dim"]
+            r["avg_score"] = round(r["score_sum"] / r["videos"], 1) if r["videos"] else None
+            # チャンネルは1回の投稿に複数並ぶため、クォータは割り当てない
+            r["quota_per_post"] = round(r["quota"] / r["posts"], 1) if r["posts"] and dim != "channel" else None
+            result.append(r)
+        if dim == "weekday":
+            result.sort(key=lambda r: WEEKDAY_NAMES.index(r["key"]))
+        return result
+
+    def summary(self, limit: int = 10) -> Dict:
+        """全軸の集計（各軸 limit 件まで）"""
+        return {dim: self.rollups(dim, None if dim in ("all", "weekday", "status") else limit) for dim in DIMENSIONS}
+
+    def recent(self, limit: int = 20) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM runs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        runs = []
+        for row in rows:
+            run = dict(row)
+            run["videos"] = json.loads(run["videos"])
+            runs.append(run)
+        return runs
+
+    def posted_video_ids(self, since: Optional[str] = None) -> Set[str]:
+        """投稿できた実行で紹介した動画ID（since（ISO 8601）を指定するとその日時以降の実行だけ）"""
+        marks = ", ".join("?" for _ in POSTED_STATUSES)
+        sql, params = f"SELECT videos FROM runs WHERE status IN ({marks})", list(POSTED_STATUSES)
+        if since is not None:
+            sql += " AND run_at >= ?"
+            params.append(since)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return {v["video_id"] for row in rows for v in json.loads(row["videos"]) if v.get("video_id")}
+
+
+def format_rollup(r: Dict) -> str:
+    score = f"{r['avg_score']:5.1f}" if r["avg_score"] is not None else "    -"
+    per_post = f"{r['quota_per_post']:7.1f}" if r["quota_per_post"] is not None else "      -"
+    return f"{r['runs']:5d} {r['posts']:5d} {score} {per_post}  {r['key']}"
+
+
+def print_report(history: PostHistory, limit: int = 10):
+    labels = {"all": "全体", "week": "週", "weekday": "曜日", "category": "カテゴリ", "keyword": "キーワード",
+              "channel": "チャンネル", "status": "結果", "day": "日"}
+    summary = history.summary(limit)
+    if not summary["all"]:
+        print("📭 履歴がありません")
+        return
+    for dim in ("all", "weekday", "category", "keyword", "channel", "week", "day", "status"):
+        print(f"📊 {labels[dim]}（実行 / 投稿 / 平均スコア / 1投稿あたりクォータ）")
+        for r in summary[dim]:
+            print("   " + format_rollup(r))
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    if command == "report":
+        print_report(PostHistory(), limit or 10)
+    elif command == "recent":
+        for run in reversed(PostHistory().recent(limit or 20)):
+            scores = [v.get("quality_score", 0) for v in run["videos"]]
+            avg = f"平均 {sum(scores) / len(scores):.1f}点" if scores else ""
+            print(f"{run['run_at']}  {run['source']:9} {run['status']:12} {run['quota']:4d} units  "
+                  f"{run['category'] or '-'} / {run['keyword'] or '-'}  {avg}")
+    elif command == "rebuild":
+        print(f"✅ {PostHistory().rebuild()}件の履歴から集計を作り直しました")
+    else:
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    main()
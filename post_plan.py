@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+事前に作成した投稿（週間計画）の保存
+weekly_planner.py が作成した日ごとの投稿メッセージを投稿の冪等キー単位で保存し、
+当日の自動投稿は検索をせずにそのメッセージを送信します。
+計画後にその日のスケジュール（名前・キーワード）が変更された場合、計画は使われません。
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+PLAN_FILE = Path(__file__).parent / "state" / "weekly_plan.json"
+
+
+def schedule_fingerprint(schedule: Optional[Dict]) -> str:
+    """計画に使ったスケジュールの内容（変更されていないかの確認用）"""
+    if not schedule:
+        return "default"
+    key = json.dumps([schedule.get("id"), schedule.get("name"), schedule.get("keywords")], ensure_ascii=False)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+
+
+class PostPlan:
+    """投稿の冪等キー → 事前に作成した投稿（message, keyword, category_name, videos, date, fingerprint）"""
+
+    def __init__(self, path: Path = PLAN_FILE):
+        self.path = Path(path)
+        self.posts: Dict[str, Dict] = {}
+        self.created_at: Optional[str] = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.posts = data.get("posts", {})
+            self.created_at = data.get("created_at")
+        except FileNotFoundError:
+            self.posts = {}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 週間計画の読み込みエラー: {e}")
+            self.posts = {}
+
+    def get(self, post_key: str, schedule: Optional[Dict]) -> Optional[Dict]:
+        """計画済みで、計画時からスケジュールが変わっていなければ投稿を返す"""
+        entry = self.posts.get(post_key)
+        if entry is None or entry.get("fingerprint") != schedule_fingerprint(schedule):
+            return None
+        return {k: entry[k] for k in ("message", "keyword", "category_name", "videos")}
+
+    def replace(self, posts: Dict[str, Dict], created_at: str, keep_from: str):
+        """計画を入れ替えて保存する。keep_from（YYYY-MM-DD）より前の日の計画は捨てる"""
+        with self._lock:
+            kept = {k: v for k, v in self.posts.items() if v.get("date", "") >= keep_from and k not in posts}
+            self.posts = {**kept, **posts}
+            self.created_at = created_at
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=".weekly_plan-", suffix=".json")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(json.dumps({"created_at": created_at, "posts": self.posts}, ensure_ascii=False, indent=2))
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"⚠️ 週間計画の保存エラー: {e}")
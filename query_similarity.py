@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+過去の検索語の類似度インデックス
+検索語を文字バイグラムに分解した転置インデックスを持ち、新しい検索語に近い（コサイン類似度が
+閾値以上の）過去の検索を探します。キャッシュ済みの検索結果を流用・混合することで、
+表記が少し違うだけの検索（「働き方」と「生産性働き方」など）に 100 units の検索を使わずに済みます。
+"""
+
+import json
+import math
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from single_flight import normalize_query
+
+# 文字が共通しない同義語は同じ表記に寄せてから比較する
+QUERY_SYNONYMS = {
+    "人工知能": "ai",
+    "機械学習": "machinelearning",
+    "ml": "machinelearning",
+}
+
+
+def query_grams(query: str) -> Counter:
+    """正規化した検索語の語ごとの文字バイグラム（1文字の語はその文字）"""
+    grams = Counter()
+    for token in normalize_query(query).split():
+        token = QUERY_SYNONYMS.get(token, token)
+        if len(token) == 1:
+            grams[token] += 1
+        for i in range(len(token) - 1):
+            grams[token[i:i + 2]] += 1
+    return grams
+
+
+def split_search_key(cache_key: str) -> Optional[Tuple[str, str]]:
+    """検索のキャッシュキーを (検索語, 検索語以外のパラメータ) に分ける。検索以外なら None"""
+    endpoint, _, raw = cache_key.partition("?")
+    if endpoint != "search":
+        return None
+    try:
+        params = json.loads(raw)
+    except ValueError:
+        return None
+    query = params.pop("q", None)
+    if query is None:
+        return None
+    return query, json.dumps(params, sort_keys=True)
+
+
+class SearchQueryIndex:
+    """
+    検索のキャッシュキーを検索語の文字バイグラムで引ける転置インデックス。
+    検索語以外のパラメータ（件数・地域など）が同じ検索だけを比較対象にする。
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, Tuple[str, str, Counter, float]] = {}  # cache_key -> (検索語, パラメータ, grams, ノルム)
+        self.postings: Dict[str, set] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_cache(cls, cache) -> "SearchQueryIndex":
+        index = cls()
+        with cache._lock:
+            keys = list(cache.entries)
+        for key in keys:
+            index.add(key)
+        return index
+
+    def add(self, cache_key: str):
+        parsed = split_search_key(cache_key)
+        if parsed is None:
+            return
+        query, signature = parsed
+        grams = query_grams(query)
+        if not grams:
+            return
+        norm = math.sqrt(sum(v * v for v in grams.values()))
+        with self._lock:
+            self.entries[cache_key] = (query, signature, grams, norm)
+            for gram in grams:
+                self.postings.setdefault(gram, set()).add(cache_key)
+
+    def similar(self, cache_key: str, threshold: float, limit: int = 3) -> List[Tuple[str, str, float]]:
+        """cache_key の検索に類似度 threshold 以上で近い過去の検索（cache_key 自身を除く）を (キー, 検索語, 類似度) の降順で返す"""
+        parsed = split_search_key(cache_key)
+        if parsed is None:
+            return []
+        query, signature = parsed
+        grams = query_grams(query)
+        if not grams:
+            return []
+        norm = math.sqrt(sum(v * v for v in grams.values()))
+        with self._lock:
+            candidates = set()
+            for gram in grams:
+                candidates |= self.postings.get(gram, set())
+            scored = []
+            for key in candidates - {cache_key}:
+                other_query, other_signature, other_grams, other_norm = self.entries[key]
+                if other_signature != signature:
+                    continue
+                dot = sum(count * other_grams.get(gram, 0) for gram, count in grams.items())
+                score = dot / (norm * other_norm)
+                if score >= threshold:
+                    scored.append((key, other_query, score))
+        scored.sort(key=lambda s: (-s[2], s[1]))
+        return scored[:limit]
+
+
+def blend_search_results(bodies: List[Dict], max_results: int) -> Dict:
+    """複数の検索結果を順位ごとに交互に並べて混ぜる（同じ動画は1回だけ）"""
+    items, seen = [], set()
+    for rank in range(max((len(b.get("items", [])) for b in bodies), default=0)):
+        for body in bodies:
+            body_items = body.get("items", [])
+            if rank >= len(body_items):
+                continue
+            video_id = body_items[rank].get("id", {}).get("videoId")
+            if video_id in seen:
+                continue
+            seen.add(video_id)
+            items.append(body_items[rank])
+    return {"items": items[:max_results]}
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+投稿処理全体の実行時間予算
+処理開始からの期限（例: 20秒）を各段階（検索・詳細取得・スコアリング・メッセージ作成・投稿）に配分し、
+残り時間が少なくなったら API 呼び出しを諦めてキャッシュで代替するなど、処理を段階的に省略します。
+どの段階にどれだけ時間を使ったかの記録を残します。
+"""
+
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+BUDGET_LOG = Path(__file__).parent / "state" / "run_budget.jsonl"
+
+
+class RunBudget:
+    """
+    total 秒の予算。total が None なら無制限。
+    API呼び出しのタイムアウトは「残り時間 − 投稿用に残しておく reserve 秒」を上限とし、
+    それが min_timeout 秒未満なら呼び出し自体を行わない（timeout_for() が None を返す）。
+    wall_clock は記録する開始日時（タイムゾーン付き datetime）を返す関数。シミュレーションで差し替える
+    """
+
+    def __init__(self, total: Optional[float] = None, reserve: float = 5.0, min_timeout: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 wall_clock: Callable[[], datetime] = lambda: datetime.now().astimezone()):
+        self.total = total
+        # 短い予算でも検索に時間が残るよう、投稿用の確保分は予算の1/4までにする
+        self.reserve = reserve if total is None else min(reserve, total / 4)
+        self.min_timeout = min_timeout
+        self.clock = clock
+        self.started = clock()
+        self.started_at = wall_clock().isoformat(timespec="seconds")
+        self.stages: List[Dict] = []
+        self.degraded: List[str] = []
+
+    def elapsed(self) -> float:
+        return self.clock() - self.started
+
+    def remaining(self) -> float:
+        return float("inf") if self.total is None else self.total - self.elapsed()
+
+    def deadline(self) -> Optional[float]:
+        """期限の時刻（clock と同じ基準）。無制限なら None"""
+        return None if self.total is None else self.started + self.total
+
+    def timeout_for(self, cap: float, reserve: Optional[float] = None) -> Optional[float]:
+        """この段階で使ってよいタイムアウト（秒）。予算が足りなければ None"""
+        available = self.remaining() - (self.reserve if reserve is None else reserve)
+        if available < self.min_timeout:
+            return None
+        return min(cap, available)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Dict]:
+        """段階の所要時間を記録する。yield した dict に status・timeout などを書き込める"""
+        entry = {"stage": name, "status": "ok"}
+        start = self.clock()
+        try:
+            yield entry
+        except BaseException:
+            entry["status"] = "error"
+            raise
+        finally:
+            entry["seconds"] = round(self.clock() - start, 3)
+            self.stages.append(entry)
+
+    def degrade(self, note: str):
+        """予算不足で処理を省略・代替したことを記録する"""
+        self.degraded.append(note)
+        print(f"⏱️ {note}")
+
+    def record(self) -> Dict:
+        return {
+            "started_at": self.started_at,
+            "budget": self.total,
+            "elapsed": round(self.elapsed(), 3),
+            "degraded": self.degraded,
+            "stages": self.stages,
+        }
+
+    def print_summary(self):
+        budget = f" / 予算 {self.total:.0f}秒" if self.total is not None else ""
+        print(f"⏱️ 実行時間 {self.elapsed():.2f}秒{budget}")
+        for s in self.stages:
+            timeout = f"（タイムアウト {s['timeout']:.1f}秒）" if s.get("timeout") else ""
+            status = "" if s["status"] == "ok" else f" [{s['status']}]"
+            print(f"   - {s['stage']}: {s['seconds']:.2f}秒{timeout}{status}")
+
+    def append_to(self, path: Path = BUDGET_LOG):
+        """記録を JSON Lines で追記する"""
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(self.record(), ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"⚠️ 実行時間の記録エラー: {e}")
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+投稿処理のチェックポイント
+1回の実行の各段階（キーワード選択・検索結果・動画/チャンネル詳細・スコア順の動画・投稿メッセージ）の結果を
+実行IDごとの小さな状態ファイルに保存します。チャットワークの障害・クラッシュ・CIのタイムアウトで
+実行が途中で止まっても、--resume で最後に完了した段階から再開するため、検索のクォータを払い直したり
+別の動画が選ばれたりしません。投稿が送信済みになるとファイルは削除されます。
+
+使い方:
+    python run_checkpoint.py list            # 再開できる実行の一覧
+    python run_checkpoint.py show <実行ID>   # 保存済みの段階
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+CHECKPOINT_DIR = Path(__file__).parent / "state" / "checkpoints"
+
+# 段階の順序。ある段階をやり直したら、それより後の段階の保存済みの結果は使わない。
+# 検索ごとの段階は "search:<検索語>" のように検索語を付けて保存する（障害時の代替検索で別の検索語を使うため）
+STAGES = ("keyword", "search", "details", "scored", "message")
+STAGE_LABELS = {"keyword": "キーワード選択", "search": "検索結果", "details": "動画・チャンネル詳細",
+                "scored": "スコア順の動画", "message": "投稿メッセージ"}
+
+# これより古いチェックポイントは再開しないため削除する
+MAX_AGE_DAYS = 7
+
+
+def split_stage(stage: str) -> Tuple[str, str]:
+    """段階名を検索語を除いた名前と検索語に分ける（検索語のない段階の検索語は空文字列）"""
+    base, _, qualifier = stage.partition(":")
+    return base, qualifier
+
+
+def completed_stages(stages: Dict[str, Any]) -> List[str]:
+    """保存済みの段階（検索語を除いた名前、STAGES の順）"""
+    bases = {split_stage(stage)[0] for stage in stages}
+    return [stage for stage in STAGES if stage in bases]
+
+
+def checkpoint_path(directory: Path, run_id: str) -> Path:
+    """実行ID（ルーム:日付:スケジュールID など）をファイル名に使える形にする"""
+    safe = re.sub(r"[^\w.-]", "_", run_id)[:80]
+    return Path(directory) / f"{safe}-{hashlib.sha1(run_id.encode('utf-8')).hexdigest()[:8]}.json"
+
+
+class RunCheckpoint:
+    """
+    1回の実行の段階ごとの結果（JSONにできる値）。resume=False なら保存済みの結果を読まずに最初から記録し直す。
+    """
+
+    def __init__(self, run_id: str, directory: Path = CHECKPOINT_DIR, resume: bool = False):
+        self.run_id = run_id
+        self.path = checkpoint_path(directory, run_id)
+        self.stages: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        prune(Path(directory))
+        if resume:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("run_id") == self.run_id:
+                self.stages = data.get("stages", {})
+        except FileNotFoundError:
+            self.stages = {}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ チェックポイントの読み込みエラー: {e}")
+            self.stages = {}
+
+    def has(self, stage: str) -> bool:
+        return stage in self.stages
+
+    def get(self, stage: str) -> Any:
+        return self.stages.get(stage)
+
+    def last_completed(self) -> Optional[str]:
+        done = completed_stages(self.stages)
+        return done[-1] if done else None
+
+    def save(self, stage: str, result: Any):
+        """
+        段階の結果を保存し、それより後の段階の保存済みの結果を捨てる。検索語付きの段階なら同じ検索語と
+        検索語のない後の段階だけ、検索語のない段階（キーワード選択など）なら後の段階すべて
+        """
+        base, qualifier = split_stage(stage)
+        later = STAGES[STAGES.index(base) + 1:]
+
+        def stale(key: str) -> bool:
+            other_base, other_qualifier = split_stage(key)
+            return other_base in later and (not qualifier or other_qualifier in ("", qualifier))
+
+        with self._lock:
+            self.stages = {k: v for k, v in self.stages.items() if not stale(k)}
+            self.stages[stage] = result
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=".checkpoint-", suffix=".json")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(json.dumps({"run_id": self.run_id, "updated_at": time.time(), "stages": self.stages},
+                                       ensure_ascii=False))
+                os.replace(tmp_path, self.path)
+            except (OSError, TypeError, ValueError) as e:
+                print(f"⚠️ チェックポイントの保存エラー: {e}")
+
+    def finish(self):
+        """実行が完了したのでチェックポイントを削除する"""
+        with self._lock:
+            self.stages = {}
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"⚠️ チェックポイントの削除エラー: {e}")
+
+
+def prune(directory: Path, max_age_days: float = MAX_AGE_DAYS):
+    """古いチェックポイントを削除する"""
+    cutoff = time.time() - max_age_days * 86400
+    try:
+        for path in directory.glob("*.json"):
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+    except OSError:
+        pass
+
+
+def list_runs(directory: Path = CHECKPOINT_DIR) -> List[Dict]:
+    runs = []
+    for path in sorted(Path(directory).glob("*.json")):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        done = completed_stages(data.get("stages", {}))
+        runs.append({"run_id": data.get("run_id"), "updated_at": data.get("updated_at"), "stages": done})
+    return runs
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if command == "list":
+        runs = list_runs()
+        if not runs:
+            print("📭 再開できる実行はありません")
+        for run in runs:
+            updated = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run["updated_at"] or 0))
+            last = STAGE_LABELS[run["stages"][-1]] if run["stages"] else "-"
+            print(f"{updated}  {run['run_id']}  完了済み: {last}（{len(run['stages'])}/{len(STAGES)}段階）")
+    elif command == "show" and len(sys.argv) > 2:
+        checkpoint = RunCheckpoint(sys.argv[2], resume=True)
+        if not checkpoint.stages:
+            print(f"📭 チェックポイントがありません: {sys.argv[2]}")
+        for key in sorted(checkpoint.stages, key=lambda k: STAGES.index(split_stage(k)[0])):
+            base, qualifier = split_stage(key)
+            print(f"✅ {STAGE_LABELS[base]}" + (f"（{qualifier}）" if qualifier else ""))
+        done = completed_stages(checkpoint.stages)
+        for stage in STAGES:
+            if stage not in done:
+                print(f"⬜ {STAGE_LABELS[stage]}")
+    else:
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,13 +6,38 @@
 """
 
 import os
+import re
+import gzip
 import json
 import uuid
+import base64
+import heapq
+import hashlib
+import itertools
+import argparse
+import unicodedata
+import time
+import queue
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from flask import Flask, render_template_string, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
+
+from chatwork_outbox import ChatworkOutbox, make_idempotency_key
+from enhanced_auto_post_production import JST, ProductionChatworkAutoPost, is_youtube_failure
+from jp_holidays import holiday_name, holidays_between
+from post_history import DIMENSIONS, PostHistory
+from video_stats_store import VideoStatsStore
+from work_lease import WorkLeases
+from youtube_cache import YouTubeResponseCache
+from youtube_resilience import RESILIENCE_FILE, ResilientCaller
 
 app = Flask(__name__)
-SCHEDULES_FILE = Path(__file__).parent / "schedules.json"
+# 負荷テストなどで別のファイルを使う場合は環境変数 SCHEDULES_FILE で指定する
+SCHEDULES_FILE = Path(os.getenv("SCHEDULES_FILE") or Path(__file__).parent / "schedules.json")
 
 WEEKDAY_NAMES = ["月曜日", "火曜日", "水曜日", "木曜日", "金曜日", "土曜日", "日曜日"]
 
@@ -36,9 +61,448 @@ def load_schedules():
 
 
 def save_schedules(data):
-    """schedules.json に保存"""
-    with open(SCHEDULES_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    """schedules.json に保存（一時ファイルへ書き出してから置き換えるアトミック書き込み）"""
+    fd, tmp_path = tempfile.mkstemp(dir=SCHEDULES_FILE.parent, prefix=".schedules-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, SCHEDULES_FILE)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+# 書き込み（読み込み〜保存）を一体で行う処理の排他用
+_write_lock = threading.Lock()
+
+
+def commit_schedules(data):
+    """バージョンを1つ進めて保存し、新しいバージョンを返す（_write_lock を取得した状態で呼ぶ）"""
+    data["version"] = int(data.get("version", 0)) + 1
+    save_schedules(data)
+    return data["version"]
+
+
+TIME_PATTERN = re.compile(r"^([01]\d|2[0-3]):[0-5]\d$")
+SCHEDULE_FIELDS = ("weekday", "time", "name", "keywords", "description")
+
+
+def normalize_schedule(body):
+    """リクエストボディからスケジュールエントリを組み立てる（未指定項目は既定値）"""
+    schedule_id = body.get("id") or f"{body.get('weekday', 0)}-{str(body.get('time', '09:00')).replace(':', '')}"
+    return {
+        "id": schedule_id,
+        "weekday": body.get("weekday", 0),
+        "time": body.get("time", "09:00"),
+        "name": body.get("name", "未設定"),
+        "keywords": body.get("keywords", []),
+        "description": body.get("description", ""),
+    }
+
+
+def validate_schedule(entry):
+    """スケジュールエントリを検証し、エラーメッセージのリストを返す（空なら妥当）"""
+    errors = []
+    try:
+        weekday = int(entry["weekday"])
+        if not 0 <= weekday <= 6:
+            errors.append("weekday は 0〜6 で指定してください")
+        else:
+            entry["weekday"] = weekday
+    except (TypeError, ValueError):
+        errors.append("weekday が数値ではありません")
+    if not isinstance(entry["time"], str) or not TIME_PATTERN.match(entry["time"]):
+        errors.append("time は HH:MM 形式で指定してください")
+    if not isinstance(entry["name"], str) or not entry["name"].strip():
+        errors.append("name が空です")
+    keywords = entry["keywords"]
+    if not isinstance(keywords, list) or not keywords or not all(isinstance(k, str) and k.strip() for k in keywords):
+        errors.append("keywords は空でない文字列のリストで指定してください")
+    if not isinstance(entry["description"], str):
+        errors.append("description は文字列で指定してください")
+    return errors
+
+
+def normalize_text(text):
+    """検索用の正規化（全角半角の統一・小文字化・空白除去）"""
+    return re.sub(r"\s+", "", unicodedata.normalize("NFKC", str(text)).lower())
+
+
+def text_bigrams(text):
+    """正規化済み文字列の文字バイグラム集合（1文字の場合はその文字）"""
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def schedule_sort_key(s):
+    return (s.get("weekday", 0), s.get("time", ""), s.get("id", ""))
+
+
+class ScheduleIndex:
+    """
+    スケジュール検索用のインデックス。
+    キーワード完全一致用の転置インデックスと、名前・キーワードの部分一致用の
+    文字バイグラム（と1文字）転置インデックスを持つ。schedules.json の更新時のみ再構築する。
+    """
+
+    def __init__(self, schedules, version=0):
+        self.schedules = sorted(schedules, key=schedule_sort_key)
+        self.version = version
+        self.timeline = WeeklyTimeline(schedules, self.schedules)
+        self.by_id = {}
+        self.keyword_index = {}
+        self.bigram_index = {}
+        self.search_text = []
+        for pos, s in enumerate(self.schedules):
+            self.by_id[s["id"]] = pos
+            keywords = s.get("keywords") or []
+            if not isinstance(keywords, list):
+                keywords = [keywords]
+            for kw in keywords:
+                self.keyword_index.setdefault(normalize_text(kw), set()).add(pos)
+            fields = [normalize_text(s.get("name", ""))] + [normalize_text(kw) for kw in keywords]
+            self.search_text.append(fields)
+            for field in fields:
+                for gram in text_bigrams(field) | set(field):
+                    self.bigram_index.setdefault(gram, set()).add(pos)
+
+    def get(self, schedule_id):
+        pos = self.by_id.get(schedule_id)
+        return None if pos is None else self.schedules[pos]
+
+    def match_keyword(self, keyword):
+        return self.keyword_index.get(normalize_text(keyword), set())
+
+    def match_text(self, query):
+        """名前・キーワードの部分一致検索（バイグラムで候補を絞ってから照合）"""
+        q = normalize_text(query)
+        if not q:
+            return set(range(len(self.schedules)))
+        grams = text_bigrams(q)  # 1文字の検索は文字単位のポスティングを使う
+        candidates = None
+        for gram in sorted(grams, key=lambda g: len(self.bigram_index.get(g, ()))):
+            postings = self.bigram_index.get(gram, set())
+            candidates = postings if candidates is None else candidates & postings
+            if not candidates:
+                return set()
+        return {pos for pos in candidates if any(q in f for f in self.search_text[pos])}
+
+
+class WeeklyTimeline:
+    """
+    配信予定の計算用に、曜日ごとのスケジュール（時刻順）と、その曜日に実際に配信されるスケジュールを持つ。
+    自動投稿はファイル順で最初に一致したキーワードのあるスケジュールだけを配信し、週末と祝日は配信しない。
+    """
+
+    def __init__(self, schedules, ordered):
+        self.slots = [[] for _ in range(7)]
+        for s in ordered:
+            if s.get("weekday") in range(7):
+                self.slots[s["weekday"]].append(s)
+        self.active = {}
+        for s in schedules:
+            keywords = s.get("keywords")
+            if s.get("weekday") in range(5) and isinstance(keywords, list) and keywords:
+                self.active.setdefault(s["weekday"], s["id"])
+
+    def collisions(self):
+        """同じ平日に複数あるスケジュール（配信されるのは active の1件だけ）"""
+        return [{"weekday": wd, "weekday_name": WEEKDAY_NAMES[wd], "active": self.active.get(wd),
+                 "shadowed": [s["id"] for s in self.slots[wd] if s["id"] != self.active.get(wd)]}
+                for wd in range(5) if len(self.slots[wd]) > 1]
+
+    def never_fires(self):
+        """週末のスケジュールなど、一度も配信されないもの"""
+        return [{"id": s["id"], "reason": "weekend"} for wd in (5, 6) for s in self.slots[wd]]
+
+    def weekday_stream(self, weekday, start, end, firing_only=False):
+        """start 以上 end 未満のその曜日の日（祝日を除く）ごとに、スケジュールを時刻順に出す"""
+        slots = self.slots[weekday]
+        if firing_only:
+            slots = [s for s in slots if s["id"] == self.active.get(weekday)]
+        day = start + timedelta(days=(weekday - start.weekday()) % 7)
+        while day < end:
+            if not holiday_name(day):
+                for s in slots:
+                    yield (day, s.get("time", ""), s["id"], s)
+            day += timedelta(days=7)
+
+    def occurrences(self, start, end, firing_only=False):
+        """start 以上 end 未満の配信予定を日時順に返す（曜日ごとの列を k-way マージ。必要な分だけ計算する）"""
+        streams = [self.weekday_stream(wd, start, end, firing_only) for wd in range(5) if self.slots[wd]]
+        return heapq.merge(*streams, key=lambda o: o[:3])
+
+    def count(self, start, end, firing_only=False):
+        """start 以上 end 未満の配信予定の件数（列を展開せずに数える）"""
+        days = [0] * 7
+        for offset in range((end - start).days):
+            day = start + timedelta(days=offset)
+            if day.weekday() < 5 and not holiday_name(day):
+                days[day.weekday()] += 1
+        if firing_only:
+            return sum(days[wd] for wd in self.active)
+        return sum(days[wd] * len(self.slots[wd]) for wd in range(5))
+
+
+_index_lock = threading.Lock()
+_index_cache = {"key": None, "index": None}
+
+
+def get_schedule_index():
+    """schedules.json の更新（mtime・サイズ）を検知した場合のみインデックスを作り直す"""
+    try:
+        st = SCHEDULES_FILE.stat()
+        key = (st.st_mtime_ns, st.st_size)
+    except FileNotFoundError:
+        key = None
+    with _index_lock:
+        if _index_cache["index"] is None or _index_cache["key"] != key:
+            data = load_schedules()
+            _index_cache["index"] = ScheduleIndex(data["schedules"], data.get("version", 0))
+            _index_cache["key"] = key
+        return _index_cache["index"]
+
+
+def encode_cursor(schedule):
+    raw = json.dumps(list(schedule_sort_key(schedule)), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    weekday, time_str, schedule_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+    return (int(weekday), str(time_str), str(schedule_id))
+
+
+class _Subscriber(queue.Queue):
+    lagged = False
+
+
+class ChangeBroadcaster:
+    """
+    スケジュール変更イベント（add / update / delete / reset）のプロセス内配信。
+    購読者ごとに上限付きのキューを持ち、受信が追いつかずあふれた購読者は切断する
+    （クライアントは Last-Event-ID 付きで再接続し、履歴から続きを受け取る）。
+    直近のイベントはリングバッファに残し、指定バージョンより後のものを再送する。
+    """
+
+    def __init__(self, history=1000, client_buffer=256):
+        self.history = deque(maxlen=history)
+        self.client_buffer = client_buffer
+        self.stats = {"published": 0, "dropped_clients": 0}
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, event):
+        """イベントを履歴に追加し、全購読者のキューに入れる（ブロックしない）"""
+        with self._lock:
+            self.history.append(event)
+            self.stats["published"] += 1
+            for sub in list(self._subscribers):
+                try:
+                    sub.put_nowait(event)
+                except queue.Full:
+                    sub.lagged = True
+                    self._subscribers.discard(sub)
+                    self.stats["dropped_clients"] += 1
+
+    def subscribe(self, since, current_version):
+        """
+        (購読キュー, 再送するイベントのリスト) を返す。
+        since より後のイベントが履歴から欠けていて再送できない場合、リストの代わりに None を返す。
+        """
+        sub = _Subscriber(self.client_buffer)
+        with self._lock:
+            self._subscribers.add(sub)
+            if since is None:
+                return sub, []
+            missed = [e for e in self.history if e["version"] > since]
+        if missed and missed[0]["version"] != since + 1:
+            return sub, None
+        if not missed and current_version != since:
+            return sub, None
+        return sub, missed
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+changes = ChangeBroadcaster()
+SSE_KEEPALIVE = 15.0
+
+
+def format_sse(event):
+    return f"id: {event['version']}\nevent: {event['op']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+class JobExecutor:
+    """
+    プレビュー・即時配信をバックグラウンドで実行するジョブキュー。
+    ワーカー数と待ち行列の長さに上限を設け、完了済みジョブは古いものから破棄する。
+    """
+
+    def __init__(self, max_workers=2, max_pending=20, max_jobs=200):
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="schedule-job")
+        self._lock = threading.Lock()
+
+    def submit(self, kind, schedule_id, fn):
+        """ジョブを登録して返す。待ち行列が一杯なら None"""
+        with self._lock:
+            active = sum(1 for j in self.jobs.values() if j["status"] in ("queued", "running"))
+            if active >= self.max_pending:
+                return None
+            job = {
+                "id": uuid.uuid4().hex,
+                "kind": kind,
+                "schedule_id": schedule_id,
+                "status": "queued",
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None,
+            }
+            self.jobs[job["id"]] = job
+            self._prune()
+        self._executor.submit(self._run, job, fn)
+        return dict(job)
+
+    def _prune(self):
+        while len(self.jobs) > self.max_jobs:
+            oldest = next((jid for jid, j in self.jobs.items() if j["status"] in ("done", "error")), None)
+            if oldest is None:
+                break
+            del self.jobs[oldest]
+
+    def _run(self, job, fn):
+        job["status"] = "running"
+        job["started_at"] = time.time()
+        try:
+            job["result"] = fn()
+            job["status"] = "done"
+        except Exception as e:
+            job["error"] = str(e)
+            job["status"] = "error"
+        job["finished_at"] = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+
+jobs = JobExecutor()
+_shared_lock = threading.Lock()
+_shared_cache = None
+_shared_outbox = None
+_shared_stats = None
+_shared_resilience = None
+_shared_history = None
+
+
+def get_history():
+    global _shared_history
+    with _shared_lock:
+        if _shared_history is None:
+            _shared_history = PostHistory()
+    return _shared_history
+
+
+def make_poster(prefer_cache, leases=None):
+    """
+    ジョブ用の投稿システム。キャッシュ・アウトボックス・統計ストア・ブレーカー・投稿履歴はジョブ間で共有する。
+    リース表（leases）はジョブごとに別の担当として作る
+    """
+    global _shared_cache, _shared_outbox, _shared_stats, _shared_resilience
+    history = get_history()
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = YouTubeResponseCache()
+            _shared_outbox = ChatworkOutbox()
+            _shared_stats = VideoStatsStore()
+            _shared_resilience = ResilientCaller(is_failure=is_youtube_failure, path=RESILIENCE_FILE)
+    return ProductionChatworkAutoPost(
+        os.getenv("CHATWORK_API_TOKEN", ""),
+        os.getenv("CHATWORK_ROOM_ID", ""),
+        os.getenv("YOUTUBE_API_KEY", ""),
+        response_cache=_shared_cache,
+        outbox=_shared_outbox,
+        prefer_cache=prefer_cache,
+        stats_store=_shared_stats,
+        history=history,
+        resilience=_shared_resilience,
+        leases=leases,
+    )
+
+
+def summarize_post(post, poster):
+    return {
+        "message": post["message"],
+        "keyword": post["keyword"],
+        "category_name": post["category_name"],
+        "videos": [{"title": v["title"], "url": v["url"], "quality_score": v.get("quality_score", 0)}
+                   for v in post["videos"][:3]],
+        "quota_used": poster.quota_used,
+    }
+
+
+def preview_job(schedule):
+    """キャッシュ済みデータを優先して投稿内容を作成する（投稿はしない）"""
+    poster = make_poster(prefer_cache=True)
+    post = poster.build_post(schedule)
+    poster.stats_store.flush()
+    if post is None:
+        raise RuntimeError("動画が見つかりませんでした")
+    return summarize_post(post, poster)
+
+
+def today_post_key(schedule_id):
+    """cron の自動投稿（get_post_key）と同じ、今日のこのスケジュールの冪等キー"""
+    return make_idempotency_key(os.getenv("CHATWORK_ROOM_ID", ""), datetime.now(JST).strftime("%Y-%m-%d"), schedule_id)
+
+
+def send_job(schedule, leases, post_key):
+    """
+    投稿内容を作成して今すぐ配信する（同じ日・同じスケジュールの再投稿はしない）。
+    post_key のリースは呼び出し側で取得済み。配信できたら完了にし、それ以外は手放す
+    """
+    done = False
+    try:
+        if not os.getenv("CHATWORK_API_TOKEN") or not os.getenv("CHATWORK_ROOM_ID"):
+            raise RuntimeError("CHATWORK_API_TOKEN / CHATWORK_ROOM_ID が設定されていません")
+        poster = make_poster(prefer_cache=False, leases=leases)
+        with leases.hold(post_key) as lost:
+            post = poster.build_post(schedule)
+            poster.stats_store.flush()
+            if post is None:
+                raise RuntimeError("動画が見つかりませんでした")
+            if lost.is_set():
+                raise RuntimeError("作業が他のインスタンスに引き継がれたため配信しません")
+            sent = poster.post_to_chatwork(post["message"], idempotency_key=post_key)
+        poster.record_run("manual", "posted" if sent else "failed", schedule=schedule, post=post,
+                          quota=poster.quota_used)
+        if not sent:
+            raise RuntimeError("チャットワークへの投稿に失敗しました（アウトボックスに保存済み）")
+        done = True
+    finally:
+        if done:
+            leases.complete(post_key)
+        else:
+            leases.release(post_key)
+    result = summarize_post(post, poster)
+    result["post_key"] = post_key
+    return result
 
 
 HTML_TEMPLATE = """
@@ -90,6 +554,8 @@ HTML_TEMPLATE = """
         .modal-content { background: var(--card); padding: 24px; border-radius: 8px; max-width: 400px; width: 90%; }
         .modal-content h3 { margin-top: 0; }
         .modal-content p { color: var(--muted); font-size: 0.9rem; }
+        .modal-content.wide { max-width: 760px; }
+        .modal-content pre { white-space: pre-wrap; word-break: break-word; max-height: 60vh; overflow: auto; background: var(--bg); padding: 12px; border-radius: 6px; font-size: 0.8rem; }
     </style>
 </head>
 <body>
@@ -139,11 +605,34 @@ HTML_TEMPLATE = """
             </form>
             <div class="default-section">
                 <button type="button" class="btn btn-secondary" id="reset-default">デフォルトの紐付けに戻す</button>
+                <a class="btn btn-secondary" href="/api/schedules/export" download="schedules.ndjson" style="text-decoration:none;">エクスポート (NDJSON)</a>
+                <button type="button" class="btn btn-secondary" id="import-btn">インポート (NDJSON)</button>
+                <input type="file" id="import-file" accept=".ndjson,.jsonl,application/x-ndjson" style="display:none;">
                 <p>デフォルトは各曜日3キーワード (月: リーダーシップ・マネジメント・コミュニケーションなど)</p>
             </div>
         </div>
         
         <div class="card">
+            <div class="form-row">
+                <div class="form-group" style="flex: 1; min-width: 200px;">
+                    <label>検索（名前・キーワード）</label>
+                    <input type="text" id="search-q" placeholder="例: セキュリティ">
+                </div>
+                <div class="form-group">
+                    <label>曜日</label>
+                    <select id="search-weekday">
+                        <option value="">すべて</option>
+                        <option value="0">月曜日</option>
+                        <option value="1">火曜日</option>
+                        <option value="2">水曜日</option>
+                        <option value="3">木曜日</option>
+                        <option value="4">金曜日</option>
+                        <option value="5">土曜日</option>
+                        <option value="6">日曜日</option>
+                    </select>
+                </div>
+                <span id="result-count" style="color: var(--muted); font-size: 0.875rem;"></span>
+            </div>
             <table>
                 <thead>
                     <tr>
@@ -156,6 +645,17 @@ HTML_TEMPLATE = """
                 </thead>
                 <tbody id="schedule-list"></tbody>
             </table>
+            <div style="text-align: center; margin-top: 16px;">
+                <button type="button" class="btn btn-secondary" id="load-more" style="display:none;">さらに読み込む</button>
+            </div>
+        </div>
+        
+        <div class="card">
+            <h3 style="margin-top: 0;">今後の配信予定（2週間・祝日を除く）</h3>
+            <table>
+                <tbody id="upcoming-list"></tbody>
+            </table>
+            <p id="upcoming-notes" style="color: var(--muted); font-size: 0.875rem;"></p>
         </div>
     </div>
     
@@ -167,47 +667,183 @@ HTML_TEMPLATE = """
         </div>
     </div>
     
+    <div class="modal" id="job-modal">
+        <div class="modal-content wide">
+            <h3 id="job-title"></h3>
+            <pre id="job-body"></pre>
+            <button class="btn btn-secondary" onclick="document.getElementById('job-modal').classList.remove('show')">閉じる</button>
+        </div>
+    </div>
+    
     <script>
         const WEEKDAYS = ['月曜日','火曜日','水曜日','木曜日','金曜日','土曜日','日曜日'];
         
-        async function loadSchedules() {
-            const res = await fetch('/api/schedules');
+        const PAGE_SIZE = 100;
+        let nextCursor = null;
+        let totalCount = 0;
+        let currentVersion = 0;
+        
+        async function loadSchedules(append = false) {
+            const params = new URLSearchParams({ limit: PAGE_SIZE });
+            const q = document.getElementById('search-q').value.trim();
+            const weekday = document.getElementById('search-weekday').value;
+            if (q) params.set('q', q);
+            if (weekday) params.set('weekday', weekday);
+            if (append && nextCursor) params.set('cursor', nextCursor);
+            const res = await fetch('/api/schedules?' + params);
             const data = await res.json();
-            renderTable(data.schedules);
+            nextCursor = data.next_cursor;
+            currentVersion = data.version || 0;
+            renderTable(data.schedules, append);
+            document.getElementById('load-more').style.display = nextCursor ? 'inline-block' : 'none';
+            setCount(data.total);
         }
         
-        function renderTable(schedules) {
+        async function loadUpcoming() {
+            const data = await (await fetch('/api/schedules/upcoming?days=14')).json();
+            document.getElementById('upcoming-list').innerHTML = data.upcoming.map(o => `<tr${o.fires ? '' : ' style="color: var(--muted);"'}>
+                <td>${o.date}（${WEEKDAYS[o.weekday][0]}）</td>
+                <td>${escapeHtml(o.time)}</td>
+                <td>${escapeHtml(o.name)}</td>
+                <td>${o.fires ? '' : '配信されません（同じ曜日の別のスケジュールが優先）'}</td>
+            </tr>`).join('');
+            const notes = data.holidays.map(h => `${h.date} は${h.name}のため配信しません`);
+            if (data.never_fires.length) notes.push(`週末のスケジュール ${data.never_fires.length}件は配信されません`);
+            document.getElementById('upcoming-notes').textContent = notes.join(' / ');
+        }
+        
+        let upcomingTimer = null;
+        function refreshUpcoming() {
+            clearTimeout(upcomingTimer);
+            upcomingTimer = setTimeout(loadUpcoming, 300);
+        }
+        
+        function setCount(n) {
+            totalCount = n;
+            document.getElementById('result-count').textContent = `${n}件`;
+        }
+        
+        function renderTable(schedules, append = false) {
             const tbody = document.getElementById('schedule-list');
-            tbody.innerHTML = schedules.map(s => {
-                const time = s.time || '09:00';
-                const kw = Array.isArray(s.keywords) ? s.keywords.join('、') : s.keywords || '';
-                const desc = (s.description || '説明はありません').replace(/"/g, '&quot;');
-                const name = (s.name || '').replace(/"/g, '&quot;');
-                return `<tr data-name="${name}" data-desc="${desc}" data-id="${s.id}">
-                    <td>${WEEKDAYS[s.weekday]}</td>
-                    <td>${time}</td>
-                    <td>${escapeHtml(s.name)}</td>
-                    <td class="keyword-cell">${escapeHtml(kw)}</td>
-                    <td>
-                        <div class="actions">
-                            <button class="btn btn-secondary btn-sm btn-desc">説明</button>
-                            <button class="btn btn-secondary btn-sm btn-edit">編集</button>
-                            <button class="btn btn-danger btn-sm btn-delete">削除</button>
-                        </div>
-                    </td>
-                </tr>`;
-            }).join('');
-            tbody.querySelectorAll('.btn-desc').forEach(btn => {
-                btn.onclick = () => { const tr = btn.closest('tr'); showDesc(tr.dataset.name, tr.dataset.desc); };
-            });
-            tbody.querySelectorAll('.btn-delete').forEach(btn => {
-                btn.onclick = () => deleteSchedule(btn.closest('tr').dataset.id);
-            });
-            tbody.querySelectorAll('.btn-edit').forEach(btn => {
-                btn.onclick = () => editSchedule(btn.closest('tr').dataset.id);
-            });
+            const html = schedules.map(rowHtml).join('');
+            if (append) tbody.insertAdjacentHTML('beforeend', html);
+            else tbody.innerHTML = html;
+        }
+        
+        function rowHtml(s) {
+            const time = s.time || '09:00';
+            const kw = Array.isArray(s.keywords) ? s.keywords.join('、') : s.keywords || '';
+            const desc = escapeHtml(s.description || '説明はありません');
+            const name = escapeHtml(s.name || '');
+            return `<tr data-name="${name}" data-desc="${desc}" data-id="${escapeHtml(s.id)}" data-weekday="${s.weekday}" data-time="${time}">
+                <td>${WEEKDAYS[s.weekday]}</td>
+                <td>${time}</td>
+                <td>${escapeHtml(s.name)}</td>
+                <td class="keyword-cell">${escapeHtml(kw)}</td>
+                <td>
+                    <div class="actions">
+                        <button class="btn btn-secondary btn-sm btn-desc">説明</button>
+                        <button class="btn btn-secondary btn-sm btn-edit">編集</button>
+                        <button class="btn btn-secondary btn-sm btn-preview">プレビュー</button>
+                        <button class="btn btn-primary btn-sm btn-send">今すぐ配信</button>
+                        <button class="btn btn-danger btn-sm btn-delete">削除</button>
+                    </div>
+                </td>
+            </tr>`;
         }
         
+        function normalizeText(t) { return String(t).normalize('NFKC').toLowerCase().split(/\\s+/).join(''); }
+        
+        function matchesFilter(s) {
+            const weekday = document.getElementById('search-weekday').value;
+            if (weekday && String(s.weekday) !== weekday) return false;
+            const q = normalizeText(document.getElementById('search-q').value);
+            if (!q) return true;
+            return [s.name || ''].concat(s.keywords || []).some(f => normalizeText(f).includes(q));
+        }
+        
+        function sortKey(weekday, time, id) { return [Number(weekday), time, id]; }
+        function keyLess(a, b) {
+            for (let i = 0; i < a.length; i++) { if (a[i] !== b[i]) return a[i] < b[i]; }
+            return false;
+        }
+        
+        // 書き込みAPIが返す差分（add / update / delete / reset）を一覧にその場で反映する。
+        // 件数は変更前（previous）と変更後のエントリが絞り込み条件に合うかで増減する
+        // （まだ読み込んでいないページの行の更新・削除でも正しく数える）
+        function applyDelta(delta) {
+            if (!delta || !delta.op) return;
+            refreshUpcoming();
+            if (delta.op === 'reset') { loadSchedules(); return; }
+            currentVersion = Math.max(currentVersion, delta.version || 0);
+            const tbody = document.getElementById('schedule-list');
+            const id = delta.op === 'delete' ? delta.id : delta.schedule.id;
+            const s = delta.op === 'delete' ? null : delta.schedule;
+            const wasCounted = !!delta.previous && matchesFilter(delta.previous);
+            const counted = !!s && matchesFilter(s);
+            setCount(totalCount + (counted ? 1 : 0) - (wasCounted ? 1 : 0));
+            const old = Array.from(tbody.rows).find(tr => tr.dataset.id === id);
+            if (old) old.remove();
+            if (!counted) return;
+            const key = sortKey(s.weekday, s.time, s.id);
+            const before = Array.from(tbody.rows).find(tr => keyLess(key, sortKey(tr.dataset.weekday, tr.dataset.time, tr.dataset.id)));
+            // 読み込み済みの範囲より後ろに並ぶ行は「さらに読み込む」で取得する
+            if (!before && nextCursor) return;
+            if (before) before.insertAdjacentHTML('beforebegin', rowHtml(s));
+            else tbody.insertAdjacentHTML('beforeend', rowHtml(s));
+        }
+        
+        async function sendWrite(url, options) {
+            const res = await fetch(url, options);
+            const body = await res.json();
+            if (!res.ok) { alert((body.errors || [body.error || res.status]).join('\\n')); return null; }
+            applyDelta(body);
+            return body;
+        }
+        
+        document.getElementById('schedule-list').addEventListener('click', (e) => {
+            const btn = e.target.closest('button');
+            if (!btn) return;
+            const tr = btn.closest('tr');
+            if (btn.classList.contains('btn-desc')) showDesc(tr.dataset.name, tr.dataset.desc);
+            else if (btn.classList.contains('btn-delete')) deleteSchedule(tr.dataset.id);
+            else if (btn.classList.contains('btn-edit')) editSchedule(tr.dataset.id);
+            else if (btn.classList.contains('btn-preview')) runJob(tr.dataset.id, 'preview');
+            else if (btn.classList.contains('btn-send')) runJob(tr.dataset.id, 'send');
+        });
+        
+        async function runJob(id, kind) {
+            if (kind === 'send' && !confirm('このスケジュールの内容を今すぐ配信しますか？')) return;
+            showJob(kind === 'send' ? '配信中...' : 'プレビュー作成中...', '');
+            const res = await fetch(`/api/schedules/${encodeURIComponent(id)}/${kind}`, { method: 'POST' });
+            const job = await res.json();
+            if (!res.ok) { showJob('エラー', job.error || res.status); return; }
+            while (true) {
+                await new Promise(r => setTimeout(r, 500));
+                const s = await (await fetch(job.status_url)).json();
+                if (s.status === 'done') {
+                    const title = kind === 'send' ? '配信しました' : 'プレビュー';
+                    showJob(`${title}（キーワード: ${s.result.keyword}）`, s.result.message);
+                    return;
+                }
+                if (s.status === 'error') { showJob('エラー', s.error); return; }
+            }
+        }
+        
+        function showJob(title, body) {
+            document.getElementById('job-title').textContent = title;
+            document.getElementById('job-body').textContent = body;
+            document.getElementById('job-modal').classList.add('show');
+        }
+        
+        let searchTimer = null;
+        document.getElementById('search-q').addEventListener('input', () => {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => loadSchedules(), 250);
+        });
+        document.getElementById('search-weekday').addEventListener('change', () => loadSchedules());
+        document.getElementById('load-more').addEventListener('click', () => loadSchedules(true));
+        
         function escapeHtml(s) { return String(s).replace(/[&<>"']/g, c => ({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;',"'":'&#39;'}[c])); }
         
         document.getElementById('add-form').addEventListener('submit', async (e) => {
@@ -225,14 +861,13 @@ HTML_TEMPLATE = """
             };
             const editingId = document.getElementById('editing-id').value;
             if (editingId) {
-                await fetch(`/api/schedules/${editingId}`, { method: 'PUT', headers: {'Content-Type':'application/json'}, body: JSON.stringify(data) });
+                if (!await sendWrite(`/api/schedules/${encodeURIComponent(editingId)}`, { method: 'PATCH', headers: {'Content-Type':'application/json'}, body: JSON.stringify(data) })) return;
                 document.getElementById('editing-id').value = '';
                 document.getElementById('submit-btn').textContent = '追加';
                 document.getElementById('cancel-edit').style.display = 'none';
             } else {
-                await fetch('/api/schedules', { method: 'POST', headers: {'Content-Type':'application/json'}, body: JSON.stringify(data) });
+                if (!await sendWrite('/api/schedules', { method: 'POST', headers: {'Content-Type':'application/json'}, body: JSON.stringify(data) })) return;
             }
-            await loadSchedules();
             e.target.reset();
             document.querySelector('[name="hour"]').value = '9';
             document.querySelector('[name="minute"]').value = '0';
@@ -240,14 +875,26 @@ HTML_TEMPLATE = """
         
         document.getElementById('reset-default').addEventListener('click', async () => {
             if (!confirm('デフォルトのスケジュールに戻しますか？')) return;
-            await fetch('/api/schedules/reset', { method: 'POST' });
+            await sendWrite('/api/schedules/reset', { method: 'POST' });
+        });
+        
+        document.getElementById('import-btn').addEventListener('click', () => document.getElementById('import-file').click());
+        
+        document.getElementById('import-file').addEventListener('change', async (e) => {
+            const file = e.target.files[0];
+            if (!file) return;
+            const res = await fetch('/api/schedules/bulk', { method: 'POST', headers: {'Content-Type':'application/x-ndjson'}, body: file });
+            const lines = (await res.text()).split('\\n').filter(Boolean).map(l => JSON.parse(l));
+            const summary = (lines.pop() || {}).summary || {};
+            const errors = lines.filter(r => r.status === 'error').map(r => `${r.line}行目: ${r.errors.join(' / ')}`);
+            alert(`インポート: ${summary.applied || 0}件反映、エラー ${summary.errors || 0}件` + (errors.length ? '\\n' + errors.join('\\n') : ''));
+            e.target.value = '';
             await loadSchedules();
         });
         
         async function deleteSchedule(id) {
             if (!confirm('このスケジュールを削除しますか？')) return;
-            await fetch(`/api/schedules/${id}`, { method: 'DELETE' });
-            await loadSchedules();
+            await sendWrite(`/api/schedules/${encodeURIComponent(id)}`, { method: 'DELETE' });
         }
         
         function showDesc(title, body) {
@@ -261,10 +908,9 @@ HTML_TEMPLATE = """
         }
         
         async function editSchedule(id) {
-            const res = await fetch('/api/schedules');
-            const data = await res.json();
-            const s = data.schedules.find(x => x.id === id);
-            if (!s) return;
+            const res = await fetch(`/api/schedules/${encodeURIComponent(id)}`);
+            if (!res.ok) return;
+            const s = await res.json();
             document.getElementById('editing-id').value = id;
             document.querySelector('[name="weekday"]').value = String(s.weekday);
             const [h, m] = (s.time || '09:00').split(':');
@@ -285,73 +931,483 @@ HTML_TEMPLATE = """
             document.querySelector('[name="minute"]').value = '0';
         });
         
-        loadSchedules();
+        // 他のタブ・利用者による変更を受け取って一覧に反映する（自分の書き込みは適用済みなので飛ばす）
+        function subscribeChanges() {
+            const source = new EventSource(`/api/schedules/stream?since=${currentVersion}`);
+            const onDelta = e => {
+                const delta = JSON.parse(e.data);
+                if (delta.version > currentVersion) applyDelta(delta);
+            };
+            ['add', 'update', 'delete', 'reset'].forEach(op => source.addEventListener(op, onDelta));
+            source.addEventListener('resync', () => loadSchedules());
+        }
+        
+        loadSchedules().then(subscribeChanges);
+        loadUpcoming();
     </script>
 </body>
 </html>
 """
 
 
+class StaticAsset:
+    """起動時に一度だけ作る静的アセット（gzip 圧縮済み本文と内容ハッシュの ETag）"""
+
+    def __init__(self, content, mimetype):
+        self.body = content.encode("utf-8")
+        self.gzipped = gzip.compress(self.body, compresslevel=9)
+        self.etag = hashlib.sha256(self.body).hexdigest()[:16]
+        self.mimetype = mimetype
+
+
+# 画面はテンプレート変数を持たない静的HTMLなので、リクエストごとに描画せず事前に圧縮しておく
+UI_ASSET = StaticAsset(HTML_TEMPLATE, "text/html; charset=utf-8")
+
+# UI は内容ハッシュの ETag で検証できるので長めにキャッシュさせる
+UI_CACHE_CONTROL = "public, max-age=86400, stale-while-revalidate=604800"
+GZIP_MIN_SIZE = 1024
+
+
+def accepts_gzip():
+    return "gzip" in request.headers.get("Accept-Encoding", "").lower()
+
+
 @app.route("/")
 def index():
-    return render_template_string(HTML_TEMPLATE)
+    asset = UI_ASSET
+    if request.if_none_match.contains(asset.etag):
+        response = Response(status=304)
+    elif accepts_gzip():
+        response = Response(asset.gzipped, mimetype=asset.mimetype)
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response = Response(asset.body, mimetype=asset.mimetype)
+    response.set_etag(asset.etag)
+    response.headers["Cache-Control"] = UI_CACHE_CONTROL
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+@app.after_request
+def compress_json_response(response):
+    """一定サイズ以上の JSON 応答を gzip 圧縮する（ストリーミング応答は対象外）"""
+    if (response.mimetype != "application/json" or response.is_streamed or response.direct_passthrough
+            or "Content-Encoding" in response.headers or response.status_code < 200 or response.status_code >= 300):
+        return response
+    response.vary.add("Accept-Encoding")
+    if not accepts_gzip():
+        return response
+    body = response.get_data()
+    if len(body) < GZIP_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(body, compresslevel=5))
+    response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+SCHEDULE_QUERY_PARAMS = ("weekday", "time_from", "time_to", "keyword", "q", "limit", "cursor")
 
 
 @app.route("/api/schedules", methods=["GET"])
 def get_schedules():
-    return jsonify(load_schedules())
+    """
+    スケジュール一覧。クエリパラメータなしの場合は従来どおり全件を返す。
+    weekday（カンマ区切り可）, time_from / time_to（HH:MM）, keyword（キーワード完全一致）,
+    q（名前・キーワードの部分一致）で絞り込み、limit / cursor でページングする。
+    """
+    if not any(p in request.args for p in SCHEDULE_QUERY_PARAMS):
+        return jsonify(load_schedules())
+
+    index = get_schedule_index()
+    try:
+        limit = int(request.args.get("limit", 100))
+        if not 1 <= limit <= 1000:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "limit は 1〜1000 で指定してください"}), 400
+
+    positions = None
+    keyword = request.args.get("keyword")
+    if keyword:
+        positions = set(index.match_keyword(keyword))
+    q = request.args.get("q", "").strip()
+    if q:
+        matched = index.match_text(q)
+        positions = matched if positions is None else positions & matched
+    if positions is None:
+        positions = range(len(index.schedules))
+
+    weekdays = None
+    if request.args.get("weekday"):
+        try:
+            weekdays = {int(w) for w in request.args["weekday"].split(",") if w.strip()}
+        except ValueError:
+            return jsonify({"error": "weekday が数値ではありません"}), 400
+    time_from = request.args.get("time_from")
+    time_to = request.args.get("time_to")
+    for t in (time_from, time_to):
+        if t and not TIME_PATTERN.match(t):
+            return jsonify({"error": "time_from / time_to は HH:MM 形式で指定してください"}), 400
+
+    after = None
+    if request.args.get("cursor"):
+        try:
+            after = decode_cursor(request.args["cursor"])
+        except (ValueError, TypeError):
+            return jsonify({"error": "cursor が不正です"}), 400
+
+    matches = []
+    for pos in sorted(positions):
+        s = index.schedules[pos]
+        if weekdays is not None and s.get("weekday") not in weekdays:
+            continue
+        if time_from and s.get("time", "") < time_from:
+            continue
+        if time_to and s.get("time", "") > time_to:
+            continue
+        matches.append(s)
+
+    page = [s for s in matches if after is None or schedule_sort_key(s) > after][:limit + 1]
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return jsonify({"schedules": page[:limit], "total": len(matches), "next_cursor": next_cursor,
+                    "version": index.version})
+
+
+UPCOMING_MAX_DAYS = 3660
+UPCOMING_MAX_LIMIT = 5000
+
+
+@app.route("/api/schedules/upcoming", methods=["GET"])
+def get_upcoming():
+    """
+    今後の配信予定。days（既定14、最大3660）日分の平日の配信予定を日時順に返し、祝日は除く。
+    from（YYYY-MM-DD、既定は今日）から数え、limit（既定500）件まで返す。firing=1 なら実際に配信される予定だけ。
+    同じ曜日に複数のスケジュールがある場合、自動投稿はファイル順で最初のものだけを配信するため
+    collision と collisions で知らせる。
+    """
+    try:
+        days = int(request.args.get("days", 14))
+        limit = int(request.args.get("limit", 500))
+        if not 1 <= days <= UPCOMING_MAX_DAYS or not 1 <= limit <= UPCOMING_MAX_LIMIT:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": f"days は 1〜{UPCOMING_MAX_DAYS}、limit は 1〜{UPCOMING_MAX_LIMIT} で指定してください"}), 400
+    try:
+        start = date.fromisoformat(request.args["from"]) if request.args.get("from") else datetime.now(JST).date()
+    except ValueError:
+        return jsonify({"error": "from は YYYY-MM-DD 形式で指定してください"}), 400
+    firing_only = request.args.get("firing", "0") in ("1", "true")
+    end = start + timedelta(days=days)
+
+    index = get_schedule_index()
+    timeline = index.timeline
+    page = []
+    for day, time_str, schedule_id, s in itertools.islice(timeline.occurrences(start, end, firing_only), limit):
+        weekday = day.weekday()
+        page.append({"date": day.isoformat(), "weekday": weekday, "time": time_str, "id": schedule_id,
+                     "name": s.get("name", ""), "fires": timeline.active.get(weekday) == schedule_id,
+                     "collision": len(timeline.slots[weekday]) > 1})
+    total = timeline.count(start, end, firing_only)
+    return jsonify({
+        "from": start.isoformat(),
+        "days": days,
+        "upcoming": page,
+        "total": total,
+        "truncated": total > len(page),
+        "holidays": [{"date": d.isoformat(), "name": name} for d, name in holidays_between(start, end)
+                     if d.weekday() < 5],
+        "collisions": timeline.collisions(),
+        "never_fires": timeline.never_fires(),
+        "version": index.version,
+    })
+
+
+@app.route("/api/schedules/<schedule_id>", methods=["GET"])
+def get_schedule(schedule_id):
+    schedule = get_schedule_index().get(schedule_id)
+    if schedule is None:
+        return jsonify({"error": "スケジュールが見つかりません"}), 404
+    return jsonify(schedule)
 
 
 @app.route("/api/schedules", methods=["POST"])
 def add_schedule():
-    data = load_schedules()
-    body = request.get_json() or {}
-    schedule_id = body.get("id") or f"{body.get('weekday', 0)}-{body.get('time', '09:00').replace(':', '')}"
-    entry = {
-        "id": schedule_id,
-        "weekday": int(body.get("weekday", 0)),
-        "time": body.get("time", "09:00"),
-        "name": body.get("name", "未設定"),
-        "keywords": body.get("keywords", []),
-        "description": body.get("description", ""),
-    }
-    existing = [s for s in data["schedules"] if s["id"] != entry["id"]]
-    existing.append(entry)
-    data["schedules"] = existing
-    save_schedules(data)
-    return jsonify(data)
+    """スケジュールを追加（同じ id があれば置き換え）し、そのエントリと新しいバージョンを返す"""
+    entry = normalize_schedule(request.get_json(silent=True) or {})
+    errors = validate_schedule(entry)
+    if errors:
+        return jsonify({"error": "入力内容が不正です", "errors": errors}), 400
+    with _write_lock:
+        data = load_schedules()
+        previous = next((s for s in data["schedules"] if s["id"] == entry["id"]), None)
+        data["schedules"] = [s for s in data["schedules"] if s["id"] != entry["id"]] + [entry]
+        version = commit_schedules(data)
+        if previous is None:
+            delta = {"op": "add", "schedule": entry, "version": version}
+        else:
+            delta = {"op": "update", "schedule": entry, "previous": previous, "version": version}
+        changes.publish(delta)
+    return jsonify(delta), 201 if previous is None else 200
 
 
-@app.route("/api/schedules/<schedule_id>", methods=["PUT"])
+@app.route("/api/schedules/<schedule_id>", methods=["PUT", "PATCH"])
 def update_schedule(schedule_id):
-    data = load_schedules()
-    body = request.get_json() or {}
-    for s in data["schedules"]:
-        if s["id"] == schedule_id:
-            s["weekday"] = int(body.get("weekday", s["weekday"]))
-            s["time"] = body.get("time", s["time"])
-            s["name"] = body.get("name", s["name"])
-            s["keywords"] = body.get("keywords", s["keywords"])
-            s["description"] = body.get("description", s.get("description", ""))
-            break
-    save_schedules(data)
-    return jsonify(load_schedules())
+    """
+    指定された項目だけを更新し、更新後のエントリと新しいバージョンを返す。
+    PUT も従来どおり部分更新として扱う（id は変更しない）。
+    """
+    body = request.get_json(silent=True) or {}
+    with _write_lock:
+        data = load_schedules()
+        pos = next((i for i, s in enumerate(data["schedules"]) if s["id"] == schedule_id), None)
+        if pos is None:
+            return jsonify({"error": "スケジュールが見つかりません"}), 404
+        previous = data["schedules"][pos]
+        entry = dict(previous)
+        entry.setdefault("description", "")
+        entry.update({k: body[k] for k in SCHEDULE_FIELDS if k in body})
+        errors = validate_schedule(entry)
+        if errors:
+            return jsonify({"error": "入力内容が不正です", "errors": errors}), 400
+        data["schedules"][pos] = entry
+        version = commit_schedules(data)
+        delta = {"op": "update", "schedule": entry, "previous": previous, "version": version}
+        changes.publish(delta)
+    return jsonify(delta)
 
 
 @app.route("/api/schedules/<schedule_id>", methods=["DELETE"])
 def delete_schedule(schedule_id):
-    data = load_schedules()
-    data["schedules"] = [s for s in data["schedules"] if s["id"] != schedule_id]
-    save_schedules(data)
-    return jsonify(data)
+    """スケジュールを削除し、削除した id と新しいバージョンを返す"""
+    with _write_lock:
+        data = load_schedules()
+        previous = next((s for s in data["schedules"] if s["id"] == schedule_id), None)
+        if previous is None:
+            return jsonify({"error": "スケジュールが見つかりません"}), 404
+        data["schedules"] = [s for s in data["schedules"] if s["id"] != schedule_id]
+        version = commit_schedules(data)
+        delta = {"op": "delete", "id": schedule_id, "previous": previous, "version": version}
+        changes.publish(delta)
+    return jsonify(delta)
+
+
+@app.route("/api/schedules/bulk", methods=["POST"])
+def bulk_import_schedules():
+    """
+    NDJSON（1行1スケジュール）で一括インポートする。
+    全行を検証してから1回のアトミック書き込みで反映し、結果を行ごとにNDJSONで返す。
+    ?mode=replace で既存を置き換え（既定は merge: id単位で上書き）、
+    ?strict=1 なら1行でもエラーがあれば何も書き込まない。
+    replace で有効な行が1行もなければ、既存を消さずに 400 を返す。
+    """
+    mode = request.args.get("mode", "merge")
+    strict = request.args.get("strict", "0") in ("1", "true")
+    if mode not in ("merge", "replace"):
+        return jsonify({"error": "mode は merge または replace を指定してください"}), 400
+
+    results = []
+    entries = {}
+    for line_no, raw in enumerate(request.stream, 1):
+        try:
+            line = raw.decode("utf-8").strip() if isinstance(raw, bytes) else raw.strip()
+        except UnicodeDecodeError as e:
+            results.append({"line": line_no, "status": "error", "errors": [f"UTF-8として読めません: {e}"]})
+            continue
+        if not line:
+            continue
+        try:
+            body = json.loads(line)
+            if not isinstance(body, dict):
+                raise ValueError("JSONオブジェクトではありません")
+        except ValueError as e:
+            results.append({"line": line_no, "status": "error", "errors": [f"JSON解析エラー: {e}"]})
+            continue
+        entry = normalize_schedule(body)
+        errors = validate_schedule(entry)
+        if errors:
+            results.append({"line": line_no, "status": "error", "id": entry["id"], "errors": errors})
+            continue
+        entries[entry["id"]] = entry  # 同一id は後勝ち
+        results.append({"line": line_no, "status": "ok", "id": entry["id"]})
+
+    error_count = sum(1 for r in results if r["status"] == "error")
+    applied = 0
+    version = None
+    if entries and not (strict and error_count):
+        with _write_lock:
+            data = load_schedules()
+            kept = [] if mode == "replace" else [s for s in data["schedules"] if s["id"] not in entries]
+            data["schedules"] = kept + list(entries.values())
+            version = commit_schedules(data)
+            changes.publish({"op": "reset", "version": version})  # 件数が多いため購読者には再読み込みを促す
+        applied = len(entries)
+
+    summary = {"summary": {"mode": mode, "rows": len(results), "applied": applied, "errors": error_count,
+                           "committed": applied > 0, "version": version}}
+    if mode == "replace" and not entries:
+        summary["summary"]["error"] = "置き換える有効なスケジュールがないため、既存のスケジュールは変更していません"
+
+    def generate():
+        for r in results:
+            yield json.dumps(r, ensure_ascii=False) + "\n"
+        yield json.dumps(summary, ensure_ascii=False) + "\n"
+
+    status = 400 if (error_count or mode == "replace") and not applied else 200
+    return Response(generate(), status=status, mimetype="application/x-ndjson")
+
+
+@app.route("/api/schedules/export", methods=["GET"])
+def export_schedules():
+    """全スケジュールをNDJSON（1行1スケジュール）でストリーム出力する"""
+    schedules = load_schedules()["schedules"]
+
+    def generate():
+        for s in schedules:
+            yield json.dumps(s, ensure_ascii=False) + "\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=schedules.ndjson"},
+    )
+
+
+@app.route("/api/schedules/stream", methods=["GET"])
+def stream_schedule_changes():
+    """
+    スケジュールの変更を Server-Sent Events で配信する。
+    各イベントの id はバージョンで、再接続時は Last-Event-ID（または ?since=）より後の変更から再送する。
+    履歴から再送できない場合は resync イベントを送るので、クライアントは一覧を読み直す。
+    """
+    since = request.headers.get("Last-Event-ID") or request.args.get("since")
+    try:
+        since = int(since) if since else None
+    except ValueError:
+        return jsonify({"error": "Last-Event-ID / since はバージョン（整数）で指定してください"}), 400
+    # 書き込みはすべて _write_lock の中で保存と配信を行うため、同じロックの中でバージョンを読んで購読すると、
+    # その間に入った変更を取りこぼしたり、再送と購読キューで二重に受け取ったりしない
+    with _write_lock:
+        current_version = get_schedule_index().version
+        sub, backlog = changes.subscribe(since, current_version)
+
+    def generate():
+        try:
+            yield "retry: 2000\n\n"
+            if backlog is None:
+                yield format_sse({"op": "resync", "version": current_version})
+            else:
+                for event in backlog:
+                    yield format_sse(event)
+            while not sub.lagged:
+                try:
+                    event = sub.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            changes.unsubscribe(sub)
+
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def submit_schedule_job(schedule_id, kind, fn):
+    schedule = get_schedule_index().get(schedule_id)
+    if schedule is None:
+        return jsonify({"error": "スケジュールが見つかりません"}), 404
+    job = jobs.submit(kind, schedule_id, lambda: fn(schedule))
+    if job is None:
+        return jsonify({"error": "実行待ちのジョブが多すぎます。しばらくしてから再実行してください"}), 429
+    return jsonify({"job_id": job["id"], "status": job["status"], "status_url": f"/api/jobs/{job['id']}"}), 202
+
+
+@app.route("/api/schedules/<schedule_id>/preview", methods=["POST"])
+def preview_schedule(schedule_id):
+    return submit_schedule_job(schedule_id, "preview", preview_job)
+
+
+@app.route("/api/schedules/<schedule_id>/send", methods=["POST"])
+def send_schedule(schedule_id):
+    """
+    cron の自動投稿・他の即時配信と同じ日・同じスケジュールを取り合わないよう、
+    (スケジュールID, 日付, ルーム) のリースを取ってからジョブにする。取れなければ 409
+    """
+    if get_schedule_index().get(schedule_id) is None:
+        return jsonify({"error": "スケジュールが見つかりません"}), 404
+    post_key = today_post_key(schedule_id)
+    leases = WorkLeases()
+    if not leases.claim(post_key):
+        return jsonify({"error": "今日のこのスケジュールは配信中または配信済みです"}), 409
+    response, status = submit_schedule_job(schedule_id, "send", lambda schedule: send_job(schedule, leases, post_key))
+    if status != 202:
+        leases.release(post_key)
+    return response, status
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "ジョブが見つかりません"}), 404
+    return jsonify(job)
+
+
+@app.route("/api/analytics", methods=["GET"])
+def get_analytics():
+    """
+    投稿履歴の集計。?dim= で軸（day/week/weekday/category/keyword/channel/status/all）を1つに絞れる。
+    ?limit= は日・週・カテゴリ・キーワード・チャンネルの件数（既定10）、?recent= で直近の実行履歴も返す。
+    """
+    try:
+        limit = int(request.args.get("limit", 10))
+        recent = int(request.args.get("recent", 0))
+    except ValueError:
+        return jsonify({"error": "limit / recent は整数で指定してください"}), 400
+    dim = request.args.get("dim")
+    history = get_history()
+    if dim is not None:
+        if dim not in DIMENSIONS:
+            return jsonify({"error": f"dim は {', '.join(DIMENSIONS)} のいずれかです"}), 400
+        result = {dim: history.rollups(dim, limit)}
+    else:
+        result = history.summary(limit)
+    if recent > 0:
+        result["recent"] = history.recent(recent)
+    return jsonify(result)
 
 
 @app.route("/api/schedules/reset", methods=["POST"])
 def reset_schedules():
-    save_schedules(DEFAULT_SCHEDULES)
-    return jsonify(DEFAULT_SCHEDULES)
+    """既定のスケジュールに戻す（差分ではなく全件と新しいバージョンを返す）"""
+    with _write_lock:
+        data = load_schedules()
+        data["schedules"] = [dict(s) for s in DEFAULT_SCHEDULES["schedules"]]
+        version = commit_schedules(data)
+        changes.publish({"op": "reset", "version": version})
+    return jsonify({"op": "reset", "schedules": data["schedules"], "version": version})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="配信スケジュール管理UI")
+    parser.add_argument("--production", action="store_true",
+                        help="デバッグなしのマルチスレッドサーバーで起動する")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "5000")))
+    args = parser.parse_args()
+
+    print(f"配信スケジュール管理UI: http://127.0.0.1:{args.port}")
+    if args.production:
+        from werkzeug.serving import make_server
+        server = make_server(args.host, args.port, app, threaded=True)
+        print("🚀 本番モード（マルチスレッド・デバッグ無効）で起動しました")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    else:
+        app.run(host=args.host, port=args.port, debug=True)
 
 
 if __name__ == "__main__":
-    print("配信スケジュール管理UI: http://127.0.0.1:5000")
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    main()
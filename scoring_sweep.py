@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+品質スコアの配点のオフライン比較（スイープ）
+保存済みの候補動画（YouTube キャッシュの検索結果、または合成カタログ）を、品質スコアの配点・
+高品質とみなす点数（cutoff）を変えた多数の設定で並行して採点し、設定ごとの合格率と
+順位の変化を表示します。候補の特徴量は共有メモリに1回だけ置き、各プロセスは読むだけです。
+
+使い方:
+    python scoring_sweep.py                               # state/youtube_cache.json の候補で既定の格子を比較
+    python scoring_sweep.py --synthetic 500               # 合成カタログの500検索分の候補で比較
+    python scoring_sweep.py --cutoff 40,50,60 --subscriber 0.5,1,2 --views 1 --duration 1
+    python scoring_sweep.py --configs configs.json --json result.json
+                                                          # 設定を JSON（ScoringWeights の項目の上書きのリスト）で指定
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import itertools
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import shared_memory
+from multiprocessing.util import Finalize
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from enhanced_auto_post_production import JST, TITLE_QUALITY_KEYWORDS, ScoringWeights, parse_duration, score_features
+from single_flight import normalize_query
+from video_stats_store import DATA_FILE, VideoStatsStore
+from youtube_cache import CACHE_FILE
+
+# 共有メモリに置く列（すべて float64、不明な値は NaN）
+COLUMNS = ("subscribers", "views", "duration", "title_hits", "days_ago", "views_per_day", "base_rank")
+# 1つの投稿で紹介する本数
+POST_VIDEOS = 3
+METRICS = ("pass_rate", "full_posts", "empty_posts", "top3_kept", "rank_shift", "mean_score")
+
+
+def title_hits(title: str) -> int:
+    title = title.lower()
+    return sum(1 for keyword in TITLE_QUALITY_KEYWORDS if keyword in title)
+
+
+def days_since(published_at: str, now: datetime) -> float:
+    try:
+        return float((now.replace(tzinfo=None) - datetime.strptime(published_at[:10], "%Y-%m-%d")).days)
+    except ValueError:
+        return math.nan
+
+
+def cached_candidates(cache_path: Path, now: datetime, stats: Optional[VideoStatsStore]) -> List[List[Dict]]:
+    """YouTube キャッシュの検索結果ごとに、詳細情報を付けた候補動画の特徴量を返す"""
+    with open(cache_path, "r", encoding="utf-8") as f:
+        entries = json.load(f).get("entries", {})
+    videos, channels = {}, {}
+    for key, entry in entries.items():
+        items = (entry.get("body") or {}).get("items", [])
+        if key.startswith("videos?"):
+            for item in items:
+                videos[item["id"]] = item
+        elif key.startswith("channels?"):
+            for item in items:
+                channels[item["id"]] = item
+    groups = []
+    for key, entry in entries.items():
+        if not key.startswith("search?"):
+            continue
+        group = []
+        for item in (entry.get("body") or {}).get("items", []):
+            video_id, snippet = item["id"]["videoId"], item["snippet"]
+            video = videos.get(video_id, {})
+            vpd = stats.views_per_day(video_id, now=now.timestamp()) if stats is not None else None
+            group.append({
+                "subscribers": float(channels.get(snippet["channelId"], {}).get("statistics", {}).get("subscriberCount", 0)),
+                "views": float(video.get("statistics", {}).get("viewCount", 0)),
+                "duration": float(parse_duration(video.get("contentDetails", {}).get("duration", "PT0S"))),
+                "title_hits": float(title_hits(snippet["title"])),
+                "days_ago": days_since(snippet["publishedAt"], now),
+                "views_per_day": math.nan if vpd is None else vpd,
+            })
+        if group:
+            groups.append(group)
+    return groups
+
+
+def synthetic_candidates(searches: int, now: datetime, seed: int) -> List[List[Dict]]:
+    """合成カタログ（simulate_calendar.py）に searches 回検索した結果の候補動画"""
+    from simulate_calendar import TITLE_WORDS, SyntheticCatalog
+
+    catalog = SyntheticCatalog(now, seed=seed)
+    rng = random.Random(seed)
+    groups = []
+    for _ in range(searches):
+        query = normalize_query(" ".join(rng.sample(TITLE_WORDS, 2)))
+        group = []
+        for item in catalog.search(query, 20, now):
+            v = catalog.videos[item["id"]["videoId"]]
+            age = max(0.0, (now - v["published"]).total_seconds() / 86400)
+            group.append({
+                "subscribers": float(catalog.channels[v["channel_id"]]["subscribers"]),
+                "views": float(int(v["views"] + v["views_per_day"] * age)),
+                "duration": float(parse_duration(v["duration"])),
+                "title_hits": float(title_hits(v["title"])),
+                "days_ago": days_since(item["snippet"]["publishedAt"], now),
+                "views_per_day": v["views_per_day"],
+            })
+        groups.append(group)
+    return groups
+
+
+def score_row(weights: ScoringWeights, cols: Dict, i: int) -> float:
+    days_ago, vpd = cols["days_ago"][i], cols["views_per_day"][i]
+    return score_features(weights, cols["subscribers"][i], cols["views"][i], cols["duration"][i],
+                          int(cols["title_hits"][i]), None if math.isnan(days_ago) else days_ago,
+                          None if math.isnan(vpd) else vpd)
+
+
+def rank_group(scores: List[float], start: int, end: int) -> List[int]:
+    """検索結果の中での順位（スコアの高い順、同点は検索結果の順。投稿処理の並べ替えと同じ）"""
+    order = sorted(range(start, end), key=lambda i: -scores[i])
+    ranks = [0] * (end - start)
+    for rank, i in enumerate(order):
+        ranks[i - start] = rank
+    return ranks
+
+
+# ワーカープロセスが参照する共有メモリ上の列
+_shm: Optional[shared_memory.SharedMemory] = None
+_view: Optional[memoryview] = None
+_cols: Dict[str, memoryview] = {}
+_groups: List[Tuple[int, int]] = []
+
+
+def attach(name: str, rows: int, groups: List[Tuple[int, int]]):
+    """ワーカーの初期化: 共有メモリの列を読み取り専用のビューとして開く"""
+    global _shm, _view, _cols, _groups
+    _shm = shared_memory.SharedMemory(name=name)
+    _view = _shm.buf.cast("d")
+    _cols = {}
+    for n, column in enumerate(COLUMNS):
+        part = _view[n * rows:(n + 1) * rows]
+        _cols[column] = part.toreadonly()
+        part.release()
+    _groups = groups
+    # ワーカーの終了時に閉じる（atexit はワーカープロセスでは呼ばれない）
+    Finalize(None, detach, exitpriority=10)
+
+
+def detach():
+    """列のビューを解放してから共有メモリを閉じる（ビューが残っていると close() が BufferError になる）"""
+    global _shm, _view, _cols
+    for view in _cols.values():
+        view.release()
+    _cols = {}
+    if _view is not None:
+        _view.release()
+        _view = None
+    if _shm is not None:
+        _shm.close()
+        _shm = None
+
+
+def evaluate(weights: ScoringWeights) -> Dict:
+    """1つの設定で全候補を採点し、合格率と基準の設定からの順位の変化を集計する"""
+    rows = len(_cols["subscribers"])
+    scores = [score_row(weights, _cols, i) for i in range(rows)]
+    base_rank = _cols["base_rank"]
+    passed = sum(1 for s in scores if s >= weights.cutoff)
+    full = empty = 0
+    kept = shift = 0.0
+    for start, end in _groups:
+        group_passed = sum(1 for i in range(start, end) if scores[i] >= weights.cutoff)
+        full += group_passed >= POST_VIDEOS
+        empty += group_passed == 0
+        ranks = rank_group(scores, start, end)
+        top = min(POST_VIDEOS, end - start)
+        kept += sum(1 for r, i in zip(ranks, range(start, end)) if r < top and base_rank[i] < top) / top
+        shift += sum(abs(r - base_rank[i]) for r, i in zip(ranks, range(start, end))) / (end - start)
+    groups = max(1, len(_groups))
+    return {
+        "pass_rate": passed / max(1, rows) * 100,
+        "full_posts": full / groups * 100,
+        "empty_posts": empty / groups * 100,
+        "top3_kept": kept / groups * 100,
+        "rank_shift": shift / groups,
+        "mean_score": sum(scores) / max(1, rows),
+    }
+
+
+def scale(tiers: tuple, factor: float) -> tuple:
+    """各段階の点数（最後の要素）を factor 倍にする"""
+    return tuple(tier[:-1] + (tier[-1] * factor,) for tier in tiers)
+
+
+def grid_configs(args) -> List[Tuple[str, ScoringWeights]]:
+    """--cutoff と各項目の倍率の組み合わせ"""
+    def floats(text: str) -> List[float]:
+        return [float(x) for x in text.split(",") if x]
+
+    axes = [("cutoff", floats(args.cutoff))] + [(name, floats(getattr(args, name))) for name in
+                                                 ("subscriber", "views", "duration", "title", "recency", "velocity")]
+    base = ScoringWeights()
+    configs = []
+    for values in itertools.product(*(v for _, v in axes)):
+        cutoff, subscriber, views, duration, title, recency, velocity = values
+        weights = base._replace(
+            cutoff=cutoff,
+            subscriber_tiers=scale(base.subscriber_tiers, subscriber),
+            view_tiers=scale(base.view_tiers, views),
+            duration_tiers=scale(base.duration_tiers, duration),
+            title_points=base.title_points * title, title_max=base.title_max * title,
+            recency_tiers=scale(base.recency_tiers, recency),
+            velocity_tiers=scale(base.velocity_tiers, velocity),
+        )
+        label = " ".join([f"cutoff={cutoff:g}"] + [f"{name}×{v:g}" for (name, _), v in zip(axes[1:], values[1:]) if v != 1])
+        configs.append((label, weights))
+    return configs
+
+
+def file_configs(path: Path) -> List[Tuple[str, ScoringWeights]]:
+    """JSON の設定（[{"label": ..., "cutoff": 45, "view_tiers": [[100000, 30], ...]}, ...]）"""
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    configs = []
+    for n, entry in enumerate(entries):
+        entry = dict(entry)
+        label = entry.pop("label", f"config{n + 1}")
+        overrides = {k: tuple(tuple(t) if isinstance(t, list) else t for t in v) if isinstance(v, list) else v
+                     for k, v in entry.items()}
+        configs.append((label, ScoringWeights()._replace(**overrides)))
+    return configs
+
+
+def sweep(groups: List[List[Dict]], configs: List[Tuple[str, ScoringWeights]], workers: int) -> List[Dict]:
+    """候補を共有メモリに置き、設定ごとの採点をプロセスプールで並行して行う"""
+    rows = sum(len(g) for g in groups)
+    bounds, start = [], 0
+    for g in groups:
+        bounds.append((start, start + len(g)))
+        start += len(g)
+    flat = [c for g in groups for c in g]
+    columns = {column: array("d", (c[column] for c in flat)) for column in COLUMNS[:-1]}
+    # 基準（現在の既定の配点）での検索結果内の順位
+    baseline = ScoringWeights()
+    base_scores = [score_row(baseline, columns, i) for i in range(rows)]
+    columns["base_rank"] = array("d", (r for s, e in bounds for r in rank_group(base_scores, s, e)))
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, rows * len(COLUMNS) * 8))
+    try:
+        view = shm.buf.cast("d")
+        for n, column in enumerate(COLUMNS):
+            view[n * rows:(n + 1) * rows] = columns[column]
+        view.release()
+        with ProcessPoolExecutor(max_workers=workers, initializer=attach, initargs=(shm.name, rows, bounds)) as pool:
+            results = list(pool.map(evaluate, [w for _, w in configs], chunksize=max(1, len(configs) // (workers * 4))))
+    finally:
+        shm.close()
+        shm.unlink()
+    return [{"label": label, **result} for (label, _), result in zip(configs, results)]
+
+
+def print_results(results: List[Dict], sort: str, top: int):
+    """先頭（現在の配点）に続けて、sort の指標で良い順に top 件"""
+    header = f"{'合格率':>6} {'3本揃う':>7} {'0本':>5} {'上位3維持':>8} {'順位変動':>6} {'平均点':>6}  設定"
+    print(header)
+
+    def row(r: Dict) -> str:
+        return (f"{r['pass_rate']:5.1f}% {r['full_posts']:6.1f}% {r['empty_posts']:4.1f}% {r['top3_kept']:8.1f}% "
+                f"{r['rank_shift']:7.2f} {r['mean_score']:6.1f}  {r['label']}")
+
+    print(row(results[0]))
+    # 小さいほど良い指標もある。同順位は上位3本を多く維持する設定を先に
+    sign = 1 if sort in ("empty_posts", "rank_shift") else -1
+    for r in sorted(results[1:], key=lambda r: (sign * r[sort], -r["top3_kept"]))[:top]:
+        print(row(r))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="品質スコアの配点のオフライン比較")
+    parser.add_argument("--cache", default=str(CACHE_FILE), help="候補を読む YouTube キャッシュ")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="合成カタログに N 回検索した結果を候補にする")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--cutoff", default="40,45,50,55,60", help="高品質とみなす点数（カンマ区切り）")
+    parser.add_argument("--subscriber", default="0.5,1,1.5", help="登録者数の配点の倍率")
+    parser.add_argument("--views", default="0.5,1,1.5", help="再生数の配点の倍率")
+    parser.add_argument("--duration", default="0.5,1,1.5", help="動画の長さの配点の倍率")
+    parser.add_argument("--title", default="1", help="タイトルの配点の倍率")
+    parser.add_argument("--recency", default="1", help="新しさの配点の倍率")
+    parser.add_argument("--velocity", default="1", help="再生速度の配点の倍率")
+    parser.add_argument("--configs", help="設定の JSON ファイル（指定すると格子の代わりに使う）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--sort", default="full_posts", choices=METRICS)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", help="全設定の結果を JSON で保存するパス")
+    args = parser.parse_args()
+
+    now = datetime.now(JST)
+    if args.synthetic:
+        groups = synthetic_candidates(args.synthetic, now, args.seed)
+    else:
+        if not Path(args.cache).exists():
+            print(f"❌ {args.cache} がありません（--synthetic N で合成カタログを使えます）")
+            sys.exit(1)
+        stats = VideoStatsStore() if DATA_FILE.exists() else None
+        groups = cached_candidates(Path(args.cache), now, stats)
+    if not groups:
+        print("📭 候補動画がありません")
+        return
+    configs = file_configs(Path(args.configs)) if args.configs else grid_configs(args)
+    # 先頭は比較の基準となる現在の配点
+    configs = [("現在の配点", ScoringWeights())] + [c for c in configs if c[1] != ScoringWeights()]
+
+    started = time.perf_counter()
+    results = sweep(groups, configs, args.workers)
+    elapsed = time.perf_counter() - started
+    rows = sum(len(g) for g in groups)
+    print(f"⚡ 候補 {rows}本（検索 {len(groups)}回分）× 設定 {len(configs)}通りを {elapsed:.2f}秒で採点"
+          f"（{args.workers}プロセス）")
+    print_results(results, args.sort, args.top)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 {args.json} に保存しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配信カレンダーのシミュレーション
+schedules.json に従った毎朝の自動投稿を N 日分、時計を進めながらオフラインで一気に再生し、
+処理速度・クォータ消費・キャッシュ（ETag再検証）の効き・選ばれた動画の偏りを集計します。
+YouTube API は合成カタログ（または記録済みの YouTube キャッシュ）、チャットワークへの投稿は
+メモリ上の送信に置き換えるため、APIキーは不要でクォータも消費しません。
+
+使い方:
+    python simulate_calendar.py                          # 今日から365日分を合成カタログで再生
+    python simulate_calendar.py --days 90 --start 2026-04-01 --seed 7
+    python simulate_calendar.py --schedules my_schedules.json
+    python simulate_calendar.py --catalog state/youtube_cache.json   # 記録済みの応答で再生
+    python simulate_calendar.py --weekly-plan             # 毎週日曜日に翌週分をまとめて作成する運用
+    python simulate_calendar.py --pushdown                # 検索で長さ・公開日を絞り込む場合と比べる
+    python simulate_calendar.py --pools                   # 毎晩候補プールを補充し、朝はプールから選ぶ運用
+"""
+
+import io
+import sys
+import json
+import gzip
+import time
+import zlib
+import random
+import shutil
+import heapq
+import hashlib
+import argparse
+import tempfile
+import contextlib
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from candidate_pool import CandidatePools
+from chatwork_outbox import SENT, ChatworkOutbox, ChatworkSender
+from enhanced_auto_post_production import (JST, TITLE_QUALITY_KEYWORDS, YOUTUBE_DURATION_BUCKETS,
+                                           ProductionChatworkAutoPost, YouTubeResponse, is_youtube_failure,
+                                           pushdown_from_scoring, score_features)
+from keyword_bandit import KeywordBandit
+from post_history import PostHistory
+from pool_replenisher import PoolReplenisher
+from post_plan import PostPlan
+from single_flight import SingleFlight, normalize_query
+from video_stats_store import VideoStatsStore
+from weekly_planner import WeeklyPlanner
+from work_lease import WorkLeases
+from youtube_cache import YouTubeResponseCache
+from youtube_resilience import ResilientCaller
+
+SCRIPT_DIR = Path(__file__).parent
+
+TITLE_WORDS = ["ITパスポート", "基本情報", "セキュリティ", "クラウド", "AWS", "Azure", "ネットワーク", "AI",
+               "機械学習", "ChatGPT", "リーダーシップ", "コミュニケーション", "マネジメント", "働き方",
+               "リモートワーク", "チーム", "ヘルプデスク", "Windows", "Excel", "資格", "試験対策"]
+QUALITY_WORDS = ["解説", "わかりやすい", "入門", "基礎", "実践", "初心者", "まとめ", "コツ"]
+DURATIONS = ["PT45S", "PT2M30S", "PT4M10S", "PT8M", "PT12M34S", "PT18M", "PT25M", "PT42M", "PT1H15M"]
+PUSHDOWN_PARAMS = ("videoDuration", "publishedAfter", "videoDefinition", "videoCaption")
+DURATION_SECONDS = {"PT45S": 45, "PT2M30S": 150, "PT4M10S": 250, "PT8M": 480, "PT12M34S": 754, "PT18M": 1080,
+                    "PT25M": 1500, "PT42M": 2520, "PT1H15M": 4500}
+
+
+def percentile(samples: List[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class SyntheticCatalog:
+    """
+    乱数で作った動画・チャンネルのカタログ。検索結果は検索語ごとに決定的で、
+    公開日を過ぎた動画だけが現れる。再生数は日ごと、登録者数は週ごとに増えるため、
+    ETag による再検証は videos ではほぼ毎回変更あり、channels では週内なら未変更になる。
+    検索の videoDuration・publishedAfter・videoDefinition・videoCaption は YouTube と同じく検索側で絞り込み、
+    low_score があれば、絞り込まなかった場合の検索結果と比べて省けた候補を pushdown に数える。
+    """
+
+    def __init__(self, start: datetime, videos: int = 5000, channels: int = 300, seed: int = 1):
+        rng = random.Random(seed)
+        self.start = start
+        self.channels = {}
+        for n in range(channels):
+            cid = f"UCsim{n:019d}"
+            self.channels[cid] = {"title": f"チャンネル{n}", "subscribers": int(10 ** rng.uniform(2, 6.3)),
+                                  "growth": rng.uniform(0.0, 0.01)}
+        channel_ids = list(self.channels)
+        self.videos = {}
+        for n in range(videos):
+            vid = f"sim{n:08d}"
+            words = rng.sample(TITLE_WORDS, 2) + ([rng.choice(QUALITY_WORDS)] if rng.random() < 0.5 else [])
+            # 3割は期間中に公開される新しい動画
+            offset_days = rng.uniform(-1000, 0) if rng.random() < 0.7 else rng.uniform(0, 400)
+            self.videos[vid] = {
+                "title": " ".join(words),
+                "channel_id": rng.choice(channel_ids),
+                "published": start + timedelta(days=offset_days),
+                "duration": rng.choice(DURATIONS),
+                "views": int(10 ** rng.uniform(1.5, 5)),
+                "views_per_day": 10 ** rng.uniform(-0.5, 3.5),
+            }
+        # 画質・字幕は後から加えた属性のため、既存の動画の並びが変わらないよう別の乱数で決める
+        extra = random.Random(seed + 1)
+        for v in self.videos.values():
+            v["definition"] = "high" if extra.random() < 0.8 else "standard"
+            v["caption"] = "closedCaption" if extra.random() < 0.3 else "none"
+        self.low_score: Optional[Callable[[str, datetime], bool]] = None
+        self.pushdown = {"searches": 0, "results": 0, "low_score": 0,
+                         "unfiltered_results": 0, "unfiltered_outside": 0, "unfiltered_low_score": 0}
+
+    def views_at(self, vid: str, now: datetime) -> int:
+        v = self.videos[vid]
+        age = max(0.0, (now - v["published"]).total_seconds() / 86400)
+        return int(v["views"] + v["views_per_day"] * age)
+
+    def subscribers_at(self, cid: str, now: datetime) -> int:
+        weeks = max(0, (now - self.start).days // 7)
+        return int(self.channels[cid]["subscribers"] * (1 + self.channels[cid]["growth"]) ** weeks)
+
+    @staticmethod
+    def predicate(params: Dict) -> Callable[[Dict], bool]:
+        """検索パラメータの絞り込み条件に合う動画かを判定する関数"""
+        checks = []
+        if params.get("videoDuration") in YOUTUBE_DURATION_BUCKETS:
+            shortest, longest = YOUTUBE_DURATION_BUCKETS[params["videoDuration"]]
+            checks.append(lambda v: shortest <= DURATION_SECONDS[v["duration"]] < (longest or float("inf")))
+        if params.get("publishedAfter"):
+            since = datetime.fromisoformat(params["publishedAfter"].replace("Z", "+00:00"))
+            checks.append(lambda v: v["published"] >= since)
+        if params.get("videoDefinition") in ("high", "standard"):
+            checks.append(lambda v: v["definition"] == params["videoDefinition"])
+        if params.get("videoCaption") in ("closedCaption", "none"):
+            checks.append(lambda v: v["caption"] == params["videoCaption"])
+        return lambda v: all(check(v) for check in checks)
+
+    def respond(self, endpoint: str, params: Dict, now: datetime) -> Dict:
+        ids = [i for i in str(params.get("id", "")).split(",") if i]
+        if endpoint == "search":
+            query, max_results = normalize_query(params.get("q", "")), int(params.get("maxResults", 20))
+            items = self.search(query, max_results, now, params)
+            if self.low_score is not None and any(k in params for k in PUSHDOWN_PARAMS):
+                self.count_pushdown(query, max_results, now, params, items)
+            return {"items": items}
+        if endpoint == "videos":
+            return {"items": [{"id": vid, "statistics": {"viewCount": str(self.views_at(vid, now))},
+                               "contentDetails": {"duration": self.videos[vid]["duration"]}}
+                              for vid in ids if vid in self.videos]}
+        if endpoint == "channels":
+            return {"items": [{"id": cid, "statistics": {"subscriberCount": str(self.subscribers_at(cid, now))}}
+                              for cid in ids if cid in self.channels]}
+        return {"items": []}
+
+    def count_pushdown(self, query: str, max_results: int, now: datetime, params: Dict, items: List[Dict]):
+        """絞り込まずに検索した場合の結果と比べ、条件外の候補（無駄になる詳細取得）と低スコアの候補を数える"""
+        unfiltered = [item["id"]["videoId"] for item in self.search(query, max_results, now)]
+        p = self.pushdown
+        p["searches"] += 1
+        p["results"] += len(items)
+        p["low_score"] += sum(1 for item in items if self.low_score(item["id"]["videoId"], now))
+        p["unfiltered_results"] += len(unfiltered)
+        matches = self.predicate(params)
+        p["unfiltered_outside"] += sum(1 for vid in unfiltered if not matches(self.videos[vid]))
+        p["unfiltered_low_score"] += sum(1 for vid in unfiltered if self.low_score(vid, now))
+
+    def search(self, query: str, max_results: int, now: datetime, params: Optional[Dict] = None) -> List[Dict]:
+        """検索語と動画IDのハッシュが小さい順に、公開済みで絞り込み条件に合う動画を max_results 本返す"""
+        salt = zlib.crc32(query.encode("utf-8"))
+        matches = self.predicate(params or {})
+        ranked = heapq.nsmallest(max_results, ((zlib.crc32(vid.encode("ascii"), salt), vid)
+                                               for vid, v in self.videos.items() if v["published"] <= now and matches(v)))
+        items = []
+        for _, vid in ranked:
+            v = self.videos[vid]
+            items.append({"id": {"videoId": vid}, "snippet": {
+                "publishedAt": v["published"].strftime("%Y-%m-%dT%H:%M:%SZ"), "channelId": v["channel_id"],
+                "title": v["title"], "description": f"{v['title']} を解説します。",
+                "channelTitle": self.channels[v["channel_id"]]["title"],
+                "thumbnails": {"high": {"url": f"https://i.ytimg.com/vi/{vid}/hqdefault.jpg"}}}})
+        return items
+
+
+class RecordedCatalog:
+    """記録済みの YouTube キャッシュ（state/youtube_cache.json）の応答をそのまま返す"""
+
+    def __init__(self, path: Path):
+        with open(path, "r", encoding="utf-8") as f:
+            self.entries = json.load(f).get("entries", {})
+        self.misses = 0
+
+    def respond(self, endpoint: str, params: Dict, now: datetime) -> Dict:
+        entry = self.entries.get(YouTubeResponseCache.make_key(endpoint, params))
+        if entry is None:
+            self.misses += 1
+            return {"items": []}
+        return entry["body"]
+
+
+class SimulatedChatworkSender(ChatworkSender):
+    """送信せずに送信済みとして記録する"""
+
+    def __init__(self, outbox: ChatworkOutbox):
+        super().__init__("simulated", outbox)
+        self.sent = 0
+
+    def send(self, item: Dict, deadline: Optional[float] = None) -> str:
+        self.sent += 1
+        self.outbox.mark(item["idempotency_key"], SENT, message_id=f"sim-{self.sent}")
+        return SENT
+
+
+class SimulatedPoster(ProductionChatworkAutoPost):
+    """YouTube API をカタログに、チャットワークをメモリ上の送信に置き換えた投稿処理"""
+
+    def __init__(self, catalog, clock: Callable[[], datetime], state_dir: Path):
+        cache = YouTubeResponseCache(state_dir / "youtube_cache.json", clock=lambda: clock().timestamp())
+        stats = VideoStatsStore(state_dir / "video_stats.bin", state_dir / "video_stats.idx.json")
+        super().__init__("simulated", "simulated", "simulated", response_cache=cache,
+                         outbox=ChatworkOutbox(state_dir / "chatwork_outbox.sqlite3"), stats_store=stats, clock=clock,
+                         leases=WorkLeases(state_dir / "work_leases.sqlite3"),
+                         bandit=KeywordBandit(state_dir / "keyword_bandit.json"),
+                         history=PostHistory(state_dir / "post_history.sqlite3"),
+                         resilience=ResilientCaller(is_failure=is_youtube_failure,
+                                                    path=state_dir / "youtube_resilience.json"))
+        self.plan_path = state_dir / "weekly_plan.json"
+        self.checkpoint_dir = state_dir / "checkpoints"
+        self.pool_path = state_dir / "candidate_pools.json"
+        self.catalog = catalog
+        self.search_flight = SingleFlight()  # 実時間の合流枠を日をまたいで使わない
+        self.chatwork_sender = SimulatedChatworkSender(self.outbox)
+        self.posts: List[Dict] = []
+        if isinstance(catalog, SyntheticCatalog):
+            catalog.low_score = self.catalog_low_score
+
+    def catalog_low_score(self, vid: str, now: datetime) -> bool:
+        """合成カタログの実際の値（再生速度は真の値）で採点し、高品質とみなす点数に届かないか"""
+        c = self.catalog
+        v = c.videos[vid]
+        score = score_features(self.scoring, c.subscribers_at(v["channel_id"], now), c.views_at(vid, now),
+                               DURATION_SECONDS[v["duration"]],
+                               sum(1 for k in TITLE_QUALITY_KEYWORDS if k in v["title"].lower()),
+                               (now - v["published"]).days, v["views_per_day"])
+        return score < self.scoring.cutoff
+
+    def _send_youtube_request(self, url: str, params: Dict, timeout: float,
+                              headers: Optional[Dict] = None) -> YouTubeResponse:
+        body = self.catalog.respond(url.rsplit("/", 1)[-1], params, self.now())
+        raw = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        etag = '"' + hashlib.md5(raw).hexdigest() + '"'
+        if headers and headers.get("If-None-Match") == etag:
+            return YouTubeResponse(304, None, etag, 0, 0)
+        start = time.perf_counter()
+        parsed = json.loads(raw)
+        return YouTubeResponse(200, parsed, etag, len(raw), len(gzip.compress(raw, 1)), time.perf_counter() - start)
+
+    def run_production_auto_post(self, *args, **kwargs):
+        super().run_production_auto_post(*args, **kwargs)
+        post, schedule = self.run_outcome.get("post"), self.run_outcome.get("schedule")
+        if self.run_outcome["status"] == "posted" and post is not None:
+            self.posts.append({"date": self.now().date(), "schedule": schedule.get("id") if schedule else None, **post})
+
+
+def simulate(days: int, start: datetime, catalog, schedules_path: Path, seed: int, verbose: bool = False,
+             weekly_plan: bool = False, pushdown: bool = False, pools: bool = False) -> Dict:
+    random.seed(seed)
+    state_dir = Path(tempfile.mkdtemp(prefix="simulate-calendar-"))
+    current = [start]
+    try:
+        poster = SimulatedPoster(catalog, lambda: current[0], state_dir)
+        poster.schedules_path = schedules_path
+        if pushdown:
+            poster.pushdown = pushdown_from_scoring(poster.scoring)
+        poster.serve_from_pools = pools
+        replenisher = PoolReplenisher(poster, CandidatePools(poster.pool_path)) if pools else None
+        runs = []
+        started = time.perf_counter()
+        for day in range(days):
+            current[0] = start + timedelta(days=day)
+            quota_before, posts_before = poster.quota_used, len(poster.posts)
+            t0 = time.perf_counter()
+            out = sys.stdout if verbose else io.StringIO()
+            with contextlib.redirect_stdout(out):
+                if weekly_plan and (day == 0 or current[0].weekday() == 6):
+                    # 初日と毎週日曜日に翌日からの1週間分を計画する（クォータはその日の分として数える）
+                    first = 1 if day else 0
+                    WeeklyPlanner(poster, PostPlan(poster.plan_path)).plan_days(current[0] + timedelta(days=first),
+                                                                               min(7, days - day - first))
+                if replenisher and day == 0:
+                    # 初日は実行前（0時）に補充しておく
+                    current[0] = current[0].replace(hour=0, minute=0)
+                    replenisher.tick()
+                    current[0] = start
+                morning_before = poster.quota_used
+                poster.run_production_auto_post()
+                morning = poster.quota_used - morning_before
+                if replenisher:
+                    # 毎日 21時に1回補充する（クォータはその日の分として数える）
+                    current[0] = current[0].replace(hour=21, minute=0)
+                    replenisher.tick()
+            runs.append({"date": current[0].date(), "seconds": time.perf_counter() - t0,
+                         "quota": poster.quota_used - quota_before, "morning_quota": morning,
+                         "posted": len(poster.posts) > posts_before})
+        elapsed = time.perf_counter() - started
+        return {"runs": runs, "elapsed": elapsed, "poster": poster}
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+
+def print_report(result: Dict, top: int = 5):
+    runs, poster = result["runs"], result["poster"]
+    posted = [r for r in runs if r["posted"]]
+    latencies = [r["seconds"] for r in runs if r["quota"] or r["posted"]]
+    print(f"📅 {runs[0]['date']} 〜 {runs[-1]['date']}（{len(runs)}日、投稿 {len(posted)}回、"
+          f"投稿なし {len(runs) - len(posted)}日）")
+    print(f"⚡ 実行時間 {result['elapsed']:.2f}秒（{len(runs) / max(result['elapsed'], 1e-9):.0f}日/秒、"
+          f"1回あたり p50 {percentile(latencies, 50) * 1000:.1f}ms / p95 {percentile(latencies, 95) * 1000:.1f}ms）")
+
+    quota = sum(r["quota"] for r in runs)
+    calls = ", ".join(f"{endpoint} {t['calls']}回" for endpoint, t in poster.transfer.items())
+    print(f"💰 クォータ 合計 {quota:,} units（1投稿あたり {quota / max(1, len(posted)):.1f}、"
+          f"最大 {max((r['quota'] for r in runs), default=0)}/日）  {calls}")
+
+    reval = poster.revalidation
+    ratio = reval["not_modified"] / reval["requests"] * 100 if reval["requests"] else 0.0
+    cache = poster.response_cache.stats
+    print(f"🗄️ ETag再検証 {reval['requests']}回中 {reval['not_modified']}回が未変更（{ratio:.0f}%、"
+          f"節約 {reval['bytes_saved'] / 1024:.1f} KB）、キャッシュ hits {cache['hits']} / misses {cache['misses']}、"
+          f"フォールバック {poster.cache_fallbacks}回")
+    if isinstance(poster.catalog, RecordedCatalog):
+        print(f"   記録にない応答: {poster.catalog.misses}回")
+    pushdown = getattr(poster.catalog, "pushdown", None)
+    if pushdown and pushdown["searches"]:
+        conditions = "、".join(f"{k}={v}" for k, v in poster.pushdown.search_params(poster.now()).items())
+        print(f"🔽 検索の絞り込み（{conditions}）: {pushdown['searches']}回、絞り込まない場合の候補 "
+              f"{pushdown['unfiltered_results']}本のうち条件外 {pushdown['unfiltered_outside']}本の詳細取得を省略。"
+              f"低スコアの候補 {pushdown['unfiltered_low_score']}本 → {pushdown['low_score']}本"
+              f"（候補 {pushdown['results']}本中）")
+
+    shown = [v for post in poster.posts for v in post["videos"][:3]]
+    seen, repeats = set(), 0
+    for v in shown:
+        repeats += v["video_id"] in seen
+        seen.add(v["video_id"])
+    scores = [v.get("quality_score", 0) for v in shown]
+    print(f"🎬 紹介した動画 延べ {len(shown)}本、ユニーク {len(seen)}本（再掲 {repeats / max(1, len(shown)) * 100:.0f}%）、"
+          f"平均品質スコア {sum(scores) / max(1, len(scores)):.1f}")
+    bands = Counter(min(int(s) // 10 * 10, 90) for s in scores)
+    print("   スコア分布: " + "  ".join(f"{b}点台 {bands[b]}" for b in sorted(bands)))
+    for label, counter in (("カテゴリ", Counter(p["category_name"] for p in poster.posts)),
+                           ("キーワード", Counter(p["keyword"] for p in poster.posts)),
+                           ("チャンネル", Counter(v["channel_name"] for v in shown)),
+                           ("動画", Counter(v["title"] for v in shown))):
+        print(f"   {label}上位: " + "、".join(f"{k}（{n}）" for k, n in counter.most_common(top)))
+    pool = poster.pool_stats
+    if pool["served"] or pool["missed"]:
+        morning = sum(r["morning_quota"] for r in runs)
+        print(f"🧺 候補プール: 朝の実行 {pool['served'] + pool['missed']}回中 {pool['served']}回をプールから選出、"
+              f"朝の実行のクォータ {morning:,} units（補充 {quota - morning:,} units）")
+    weekdays = [r for r in poster.history.rollups("weekday") if r["avg_score"] is not None]
+    if weekdays:
+        print("🗂️ 曜日別の平均品質スコア: " + "、".join(f"{r['key'][0]} {r['avg_score']:.1f}" for r in weekdays))
+    learned = poster.bandit.report()
+    if learned:
+        print("🎰 キーワードの収穫率（100 unitsあたりの高品質動画数）上位: " + "、".join(
+            f"{r['keyword']} {r['per_100_units']:.1f}（{r['pulls']}回）" for r in learned[:top]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="配信カレンダーのシミュレーション")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--start", help="開始日 YYYY-MM-DD（既定: 今日）")
+    parser.add_argument("--time", default="09:00", help="毎日の実行時刻 HH:MM（日本時間）")
+    parser.add_argument("--schedules", default=str(SCRIPT_DIR / "schedules.json"))
+    parser.add_argument("--catalog", help="記録済みの YouTube キャッシュ（指定しなければ合成カタログ）")
+    parser.add_argument("--videos", type=int, default=5000, help="合成カタログの動画数")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="各回の投稿処理のログを表示する")
+    parser.add_argument("--weekly-plan", action="store_true", help="毎週日曜日に翌週分を weekly_planner で事前に作成する")
+    parser.add_argument("--pools", action="store_true",
+                        help="毎日21時に pool_replenisher で候補プールを補充し、朝の実行はプールから選ぶ")
+    parser.add_argument("--pushdown", action="store_true",
+                        help="検索で配点から決めた長さ・公開日の条件で絞り込む（本番の SEARCH_PUSHDOWN=1）")
+    args = parser.parse_args()
+
+    hour, minute = (int(x) for x in args.time.split(":"))
+    day = datetime.strptime(args.start, "%Y-%m-%d") if args.start else datetime.now(JST)
+    start = datetime(day.year, day.month, day.day, hour, minute, tzinfo=JST)
+    if args.catalog:
+        catalog = RecordedCatalog(Path(args.catalog))
+    else:
+        catalog = SyntheticCatalog(start, videos=args.videos, seed=args.seed)
+    print_report(simulate(args.days, start, catalog, Path(args.schedules), args.seed, args.verbose, args.weekly_plan,
+                          pushdown=args.pushdown, pools=args.pools))
+
+
+if __name__ == "__main__":
+    main()
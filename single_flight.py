@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+同一リクエストの合流（single-flight）
+同じキーの呼び出しが同時に（または短い時間枠内に）複数来た場合、実際の処理は1回だけ行い、
+結果を全員で共有します。共有された結果は呼び出し元ごとのコピーなので、互いに影響しません。
+"""
+
+import copy
+import time
+import threading
+import unicodedata
+from typing import Any, Callable, Dict, Tuple
+
+
+def normalize_query(query: str) -> str:
+    """全角半角・大文字小文字・空白の違いを吸収した検索語"""
+    return " ".join(unicodedata.normalize("NFKC", query).lower().split())
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+        self.finished_at = 0.0
+
+
+class SingleFlight:
+    """
+    do(key, fn) で fn を実行する。同じキーの実行中に来た呼び出しは完了を待って結果のコピーを受け取る。
+    window 秒以内に完了した結果（空でないもの）も同様に共有する。
+    """
+
+    def __init__(self, window: float = 0.0):
+        self.window = window
+        self.stats = {"calls": 0, "executed": 0, "shared": 0}
+        self._calls: Dict[str, _Call] = {}
+        self._recent: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """(結果, 他の呼び出しの結果を共有したか) を返す"""
+        with self._lock:
+            self.stats["calls"] += 1
+            recent = self._recent.get(key)
+            if recent is not None:
+                if time.monotonic() - recent.finished_at <= self.window:
+                    self.stats["shared"] += 1
+                    return copy.deepcopy(recent.result), True
+                del self._recent[key]
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                self.stats["shared"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.stats["executed"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result), True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+        call.finished_at = time.monotonic()
+        with self._lock:
+            del self._calls[key]
+            retain = self.window > 0 and call.error is None and bool(call.result)
+            if retain:
+                expired = [k for k, c in self._recent.items() if call.finished_at - c.finished_at > self.window]
+                for k in expired:
+                    del self._recent[k]
+                self._recent[key] = call
+            share = retain or call.followers > 0
+        call.done.set()
+        if call.error is not None:
+            raise call.error
+        # 共有される結果の原本は保持したまま、呼び出し元にはコピーを返す
+        return (copy.deepcopy(call.result) if share else call.result), False
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""chatwork_outbox.py の状態遷移（pending → sending → sent / failed）と送信の取り合い"""
+
+import time
+
+import pytest
+import requests
+
+import chatwork_outbox
+from chatwork_outbox import FAILED, PENDING, SENDING, SENT, ChatworkOutbox, ChatworkSender
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.payload = payload
+        self.headers = {}
+        self.text = "" if payload is None else str(payload)
+
+    def json(self):
+        return self.payload
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    box = ChatworkOutbox(tmp_path / "outbox.sqlite3")
+    box.enqueue("room:2026-05-07:0-0900", "room", "body")
+    return box
+
+
+def respond(monkeypatch, *statuses, messages=None):
+    """requests.post が statuses を順に返すようにし、呼ばれた回数を記録するリストを返す"""
+    calls = []
+
+    def post(*args, **kwargs):
+        calls.append(kwargs.get("data"))
+        status = statuses[min(len(calls), len(statuses)) - 1]
+        return FakeResponse(status, {"message_id": "m1"} if status == 200 else "error")
+
+    monkeypatch.setattr(chatwork_outbox.requests, "post", post)
+    monkeypatch.setattr(chatwork_outbox.requests, "get",
+                        lambda *args, **kwargs: FakeResponse(200, messages or []))
+    return calls
+
+
+def sender(outbox, **kwargs):
+    return ChatworkSender("token", outbox, backoff=0.0, **kwargs)
+
+
+def test_enqueue_is_idempotent(outbox):
+    assert not outbox.enqueue("room:2026-05-07:0-0900", "room", "other body")
+    assert outbox.get("room:2026-05-07:0-0900")["body"] == "body"
+
+
+def test_sent_on_success(outbox, monkeypatch):
+    calls = respond(monkeypatch, 200)
+    assert sender(outbox).drain() == {"room:2026-05-07:0-0900": SENT}
+    item = outbox.get("room:2026-05-07:0-0900")
+    assert (item["status"], item["attempts"], item["message_id"]) == (SENT, 1, "m1")
+    assert len(calls) == 1
+    assert sender(outbox).drain() == {}
+
+
+def test_client_error_fails_until_requeued(outbox, monkeypatch):
+    respond(monkeypatch, 401)
+    assert sender(outbox).drain() == {"room:2026-05-07:0-0900": FAILED}
+    # 4xx は自動では再送しない
+    assert outbox.unsent() == []
+    assert outbox.requeue() == 1
+    item = outbox.get("room:2026-05-07:0-0900")
+    assert (item["status"], item["attempts"]) == (PENDING, 0)
+    respond(monkeypatch, 200)
+    assert sender(outbox).drain() == {"room:2026-05-07:0-0900": SENT}
+
+
+def test_server_errors_retry_up_to_max_attempts(outbox, monkeypatch):
+    calls = respond(monkeypatch, 503)
+    assert sender(outbox, max_attempts=3).drain() == {"room:2026-05-07:0-0900": PENDING}
+    assert len(calls) == 3
+    assert outbox.get("room:2026-05-07:0-0900")["attempts"] == 3
+    # 上限に達した行は requeue するまで送らない
+    assert sender(outbox, max_attempts=3).drain() == {"room:2026-05-07:0-0900": PENDING}
+    assert len(calls) == 3
+
+
+def test_retry_after_server_error_succeeds(outbox, monkeypatch):
+    calls = respond(monkeypatch, 500, 200)
+    assert sender(outbox).drain() == {"room:2026-05-07:0-0900": SENT}
+    assert len(calls) == 2
+
+
+def test_claim_requires_unchanged_attempts(outbox):
+    assert outbox.claim("room:2026-05-07:0-0900", 0)
+    # 同じ行を読んだ別の送信処理は取れない
+    assert not outbox.claim("room:2026-05-07:0-0900", 0)
+    outbox.mark("room:2026-05-07:0-0900", SENT)
+    assert not outbox.claim("room:2026-05-07:0-0900", 1)
+
+
+def test_sender_that_loses_the_claim_does_not_post(outbox, monkeypatch):
+    calls = respond(monkeypatch, 200)
+    item = outbox.get("room:2026-05-07:0-0900")
+    assert outbox.claim(item["idempotency_key"], item["attempts"])
+    assert sender(outbox).send(item) == SENDING
+    assert calls == []
+
+
+def test_recent_sending_row_is_left_to_its_sender(outbox, monkeypatch):
+    calls = respond(monkeypatch, 200)
+    outbox.mark("room:2026-05-07:0-0900", SENDING)
+    assert sender(outbox).drain() == {"room:2026-05-07:0-0900": SENDING}
+    assert calls == []
+
+
+def test_stale_sending_row_already_delivered_is_marked_sent(outbox, monkeypatch):
+    calls = respond(monkeypatch, 200, messages=[{"body": "body"}])
+    outbox.mark("room:2026-05-07:0-0900", SENDING)
+    stale = sender(outbox)
+    stale.stale_sending = 0.0
+    time.sleep(0.01)
+    assert stale.drain() == {"room:2026-05-07:0-0900": SENT}
+    assert calls == []
+
+
+def test_stale_sending_row_not_delivered_is_resent(outbox, monkeypatch):
+    calls = respond(monkeypatch, 200, messages=[{"body": "another message"}])
+    outbox.mark("room:2026-05-07:0-0900", SENDING)
+    stale = sender(outbox)
+    stale.stale_sending = 0.0
+    time.sleep(0.01)
+    assert stale.drain() == {"room:2026-05-07:0-0900": SENT}
+    assert len(calls) == 1
+
+
+def test_unknown_delivery_after_network_error_is_not_resent(outbox, monkeypatch):
+    def post(*args, **kwargs):
+        raise requests.ConnectionError("reset")
+
+    monkeypatch.setattr(chatwork_outbox.requests, "post", post)
+    monkeypatch.setattr(chatwork_outbox.requests, "get", lambda *args, **kwargs: FakeResponse(500))
+    assert sender(outbox).drain() == {"room:2026-05-07:0-0900": SENDING}
+    assert outbox.get("room:2026-05-07:0-0900")["status"] == SENDING
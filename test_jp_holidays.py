@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""jp_holidays.py の祝日・振替休日・国民の休日と特例"""
+
+from datetime import date, datetime
+
+import pytest
+
+from jp_holidays import holiday_name, holidays_between, holidays_in_year
+
+
+@pytest.mark.parametrize("day, name", [
+    # 振替休日: 日曜日の祝日の後の最初の祝日でない日
+    (date(2026, 5, 6), "休日（振替休日）"),
+    (date(2023, 1, 2), "休日（振替休日）"),
+    (date(2024, 2, 12), "休日（振替休日）"),
+    (date(2018, 12, 24), "休日（振替休日）"),
+    (date(2021, 8, 9), "休日（振替休日）"),
+    # 国民の休日: 前日と翌日が祝日の平日
+    (date(2015, 9, 22), "休日（国民の休日）"),
+    (date(2026, 9, 22), "休日（国民の休日）"),
+    (date(2019, 4, 30), "休日（国民の休日）"),
+    (date(2019, 5, 2), "休日（国民の休日）"),
+    # 2019〜2021年の特例
+    (date(2019, 5, 1), "天皇の即位の日"),
+    (date(2019, 10, 22), "即位礼正殿の儀の行われる日"),
+    (date(2020, 7, 24), "スポーツの日"),
+    (date(2021, 7, 22), "海の日"),
+    (date(2021, 8, 8), "山の日"),
+    # ハッピーマンデー・春分/秋分の日・天皇誕生日の変更
+    (date(2026, 1, 12), "成人の日"),
+    (date(2026, 9, 21), "敬老の日"),
+    (date(2026, 3, 20), "春分の日"),
+    (date(2025, 9, 23), "秋分の日"),
+    (date(2018, 12, 23), "天皇誕生日"),
+    (date(2020, 2, 23), "天皇誕生日"),
+])
+def test_holiday_name(day, name):
+    assert holiday_name(day) == name
+
+
+@pytest.mark.parametrize("day", [
+    date(2026, 5, 7),
+    date(2020, 7, 20),   # 2020年の海の日は7/23に移動
+    date(2020, 10, 12),  # 2020年のスポーツの日は7/24に移動
+    date(2019, 12, 23),  # 2019年は天皇誕生日がない
+    date(2015, 8, 11),   # 山の日は2016年から
+    date(2026, 5, 2),    # 土曜日は祝日に挟まれていない
+])
+def test_not_a_holiday(day):
+    assert holiday_name(day) is None
+
+
+def test_golden_week_2026():
+    days = holidays_between(date(2026, 4, 29), date(2026, 5, 7))
+    assert [d.day for d, _ in days] == [29, 3, 4, 5, 6]
+
+
+def test_accepts_datetime():
+    assert holiday_name(datetime(2026, 5, 6, 9, 0)) == "休日（振替休日）"
+
+
+def test_every_year_has_at_least_fifteen_holidays():
+    for year in range(2000, 2100):
+        assert len(holidays_in_year(year)) >= 15
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""run_checkpoint.py の保存・再開と、やり直した段階より後の結果の破棄"""
+
+from run_checkpoint import RunCheckpoint, checkpoint_path, completed_stages, list_runs, split_stage
+
+RUN_ID = "room:2026-05-07:0-0900"
+
+
+def test_resume_loads_saved_stages(tmp_path):
+    first = RunCheckpoint(RUN_ID, tmp_path)
+    first.save("keyword", ["ITパスポート", "勉強法"])
+    first.save("search:ITパスポート", {"items": [1, 2]})
+
+    resumed = RunCheckpoint(RUN_ID, tmp_path, resume=True)
+    assert resumed.get("search:ITパスポート") == {"items": [1, 2]}
+    assert resumed.last_completed() == "search"
+    # resume しなければ最初から記録し直す
+    assert RunCheckpoint(RUN_ID, tmp_path).stages == {}
+    # 別の実行IDの結果は読まない
+    assert RunCheckpoint("room:2026-05-08:0-0900", tmp_path, resume=True).stages == {}
+
+
+def test_redoing_a_stage_drops_later_stages_of_the_same_query(tmp_path):
+    checkpoint = RunCheckpoint(RUN_ID, tmp_path)
+    checkpoint.save("keyword", ["a"])
+    checkpoint.save("search:a", {"items": ["a1"]})
+    checkpoint.save("details:a", {"videos": {}})
+    checkpoint.save("scored:a", [{"video_id": "a1"}])
+    checkpoint.save("search:b", {"items": ["b1"]})
+    checkpoint.save("details:b", {"videos": {}})
+    checkpoint.save("message", {"message": "..."})
+
+    checkpoint.save("search:a", {"items": ["a2"]})
+    assert set(checkpoint.stages) == {"keyword", "search:a", "search:b", "details:b"}
+
+    # キーワード選択をやり直したら、検索以降はすべて使わない
+    checkpoint.save("keyword", ["c"])
+    assert set(checkpoint.stages) == {"keyword"}
+
+    resumed = RunCheckpoint(RUN_ID, tmp_path, resume=True)
+    assert resumed.stages == {"keyword": ["c"]}
+
+
+def test_finish_removes_the_file(tmp_path):
+    checkpoint = RunCheckpoint(RUN_ID, tmp_path)
+    checkpoint.save("keyword", ["a"])
+    assert checkpoint_path(tmp_path, RUN_ID).exists()
+    assert [run["run_id"] for run in list_runs(tmp_path)] == [RUN_ID]
+    checkpoint.finish()
+    assert not checkpoint_path(tmp_path, RUN_ID).exists()
+    assert RunCheckpoint(RUN_ID, tmp_path, resume=True).stages == {}
+
+
+def test_stage_names():
+    assert split_stage("search:働き方 改革") == ("search", "働き方 改革")
+    assert split_stage("message") == ("message", "")
+    assert completed_stages({"scored:a": 1, "keyword": 1, "search:b": 1}) == ["keyword", "search", "scored"]
+
+
+def test_checkpoint_path_is_safe_and_unique(tmp_path):
+    a = checkpoint_path(tmp_path, "room:2026-05-07:0/0900")
+    b = checkpoint_path(tmp_path, "room:2026-05-07:0_0900")
+    assert a.parent == tmp_path
+    assert a != b
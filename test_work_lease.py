@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""work_lease.py の取得・期限切れ後の引き継ぎと、ChatworkSender.drain() のリース"""
+
+import threading
+
+from chatwork_outbox import PENDING, SENT, ChatworkOutbox, ChatworkSender
+from work_lease import DONE, WorkLeases
+
+
+def test_only_one_instance_wins_a_race(tmp_path):
+    path = tmp_path / "leases.sqlite3"
+    instances = [WorkLeases(path, owner=f"node{i}") for i in range(2)]
+    start = threading.Barrier(len(instances))
+    won = []
+
+    def race(leases):
+        start.wait()
+        won.append(leases.claim("room:2026-05-07:0-0900"))
+
+    threads = [threading.Thread(target=race, args=(leases,)) for leases in instances]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(won) == [False, True]
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    now = [1000.0]
+    path = tmp_path / "leases.sqlite3"
+    a = WorkLeases(path, owner="a", ttl=60, clock=lambda: now[0])
+    b = WorkLeases(path, owner="b", ttl=60, clock=lambda: now[0])
+    assert a.claim("k")
+    assert not b.claim("k")
+    now[0] += 61
+    assert b.claim("k")
+    # 引き継がれた側は延長も完了もできない
+    assert not a.heartbeat("k")
+    assert not a.complete("k")
+    assert b.complete("k")
+    assert b.all()[0]["status"] == DONE
+    now[0] += 1000
+    assert not a.claim("k")
+
+
+class RecordingSender(ChatworkSender):
+    def __init__(self, outbox, leases):
+        super().__init__("token", outbox, leases=leases)
+        self.sent = []
+
+    def send(self, item, deadline=None):
+        self.sent.append(item["idempotency_key"])
+        self.outbox.mark(item["idempotency_key"], SENT)
+        return SENT
+
+
+def test_drain_skips_messages_leased_by_another_instance(tmp_path):
+    outbox = ChatworkOutbox(tmp_path / "outbox.sqlite3")
+    outbox.enqueue("k1", "room", "body1")
+    outbox.enqueue("k2", "room", "body2")
+    runner = WorkLeases(tmp_path / "leases.sqlite3", owner="cron")
+    assert runner.claim("k1")
+
+    sender = RecordingSender(outbox, WorkLeases(tmp_path / "leases.sqlite3", owner="drain"))
+    assert sender.drain() == {"k2": SENT}
+    assert outbox.get("k1")["status"] == PENDING
+    # 自分で取ったリースは送信済みで完了になる
+    assert not runner.claim("k2")
+
+
+def test_drain_keeps_a_lease_the_caller_already_holds(tmp_path):
+    outbox = ChatworkOutbox(tmp_path / "outbox.sqlite3")
+    outbox.enqueue("k", "room", "body")
+    leases = WorkLeases(tmp_path / "leases.sqlite3", owner="cron")
+    assert leases.claim("k")
+    assert RecordingSender(outbox, leases).drain(["k"]) == {"k": SENT}
+    assert leases.holds("k")
+
+
+def test_released_lease_can_be_claimed_at_once(tmp_path):
+    path = tmp_path / "leases.sqlite3"
+    a = WorkLeases(path, owner="a")
+    b = WorkLeases(path, owner="b")
+    assert a.claim("k")
+    assert a.claim("k")  # 自分が保持中なら取り直せる
+    assert a.release("k")
+    assert b.claim("k")
+    assert not a.release("k")
+
+
+def test_hold_reports_a_lost_lease(tmp_path):
+    now = [1000.0]
+    path = tmp_path / "leases.sqlite3"
+    a = WorkLeases(path, owner="a", ttl=0.3, clock=lambda: now[0])
+    b = WorkLeases(path, owner="b", ttl=0.3, clock=lambda: now[0])
+    assert a.claim("k")
+    with a.hold("k") as lost:
+        now[0] += 1
+        assert b.claim("k")
+        assert lost.wait(1.0)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+動画の再生数・チャンネル登録者数の時系列ストア
+固定長レコードを追記専用のバイナリファイルに書き込み、mmap で読み出します。
+各レコードは同じ動画（チャンネル）の1つ前のレコード位置を持つため、
+メモリ上の索引は動画・チャンネルごとに最新レコードの位置だけで済み、サンプル数が増えても一定です。
+
+使い方:
+    python video_stats_store.py <video_id>   # 再生数の履歴と1日あたりの再生数
+"""
+
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows ではプロセス間ロックなし
+    fcntl = None
+
+STATE_DIR = Path(__file__).parent / "state"
+DATA_FILE = STATE_DIR / "video_stats.bin"
+INDEX_FILE = STATE_DIR / "video_stats.idx.json"
+
+VIDEO = 1
+CHANNEL = 2
+
+# kind(1) + padding(7) + id(24) + timestamp(8) + value(8) + 前レコード位置(8) = 56 bytes
+RECORD = struct.Struct("<B7x24sqqq")
+
+
+class VideoStatsStore:
+    """
+    record_many() で取得時刻付きの値を追記し、history() で古い順の (時刻, 値) を返す。
+    同じ動画について前回と同じかそれより古い時刻の値（キャッシュ由来の再取得など）や、
+    min_interval 秒以内の値は記録しない。
+    """
+
+    def __init__(self, data_path: Path = DATA_FILE, index_path: Path = INDEX_FILE, min_interval: float = 3600.0):
+        self.data_path = Path(data_path)
+        self.index_path = Path(index_path)
+        self.min_interval = min_interval
+        # "kind:id" -> [最新レコード位置, 件数, 最新時刻]
+        self.index: Dict[str, List[int]] = {}
+        self.indexed_size = 0
+        self._mm: Optional[mmap.mmap] = None
+        self._mm_size = 0
+        self._lock = threading.Lock()
+        self.data_path.parent.mkdir(parents=True, exist_ok=True)
+        self.data_path.touch(exist_ok=True)
+        self._load_index()
+        with self._lock:
+            self._catch_up()
+
+    @staticmethod
+    def _key(kind: int, entity_id: str) -> str:
+        return f"{kind}:{entity_id}"
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("size", 0) <= self.data_path.stat().st_size:
+                self.index = saved["entries"]
+                self.indexed_size = saved["size"]
+        except (FileNotFoundError, ValueError, KeyError):
+            self.index, self.indexed_size = {}, 0
+
+    def _view(self) -> Optional[mmap.mmap]:
+        """データファイルの mmap（ファイルが伸びていれば張り直す）"""
+        size = self.data_path.stat().st_size
+        if size == 0:
+            return None
+        if self._mm is None or size != self._mm_size:
+            if self._mm is not None:
+                self._mm.close()
+            with open(self.data_path, "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mm_size = size
+        return self._mm
+
+    def _catch_up(self):
+        """索引作成後に（他プロセスが）追記したレコードを索引に反映する"""
+        size = self.data_path.stat().st_size
+        size -= size % RECORD.size  # 書き込み途中の端数は無視
+        if size <= self.indexed_size:
+            return
+        mm = self._view()
+        for offset in range(self.indexed_size, size, RECORD.size):
+            kind, raw_id, ts, _value, _prev = RECORD.unpack_from(mm, offset)
+            key = self._key(kind, raw_id.rstrip(b"\0").decode("utf-8"))
+            count = self.index[key][1] if key in self.index else 0
+            self.index[key] = [offset, count + 1, ts]
+        self.indexed_size = size
+
+    def record_many(self, kind: int, values: Dict[str, int], timestamp: Optional[float] = None) -> int:
+        """値をまとめて追記し、実際に記録した件数を返す"""
+        ts = int(timestamp if timestamp is not None else time.time())
+        with self._lock, open(self.data_path, "ab") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                self._catch_up()
+                offset = self.indexed_size
+                f.seek(0, os.SEEK_END)
+                if f.tell() != offset:
+                    f.truncate(offset)  # 書き込み途中で落ちた端数を切り捨てる
+                buf = bytearray()
+                for entity_id, value in values.items():
+                    key = self._key(kind, entity_id)
+                    last = self.index.get(key)
+                    if last is not None and ts - last[2] < self.min_interval:
+                        continue
+                    prev = last[0] if last is not None else -1
+                    buf += RECORD.pack(kind, entity_id.encode("utf-8")[:24], ts, int(value), prev)
+                    self.index[key] = [offset, (last[1] if last else 0) + 1, ts]
+                    offset += RECORD.size
+                f.write(buf)
+                f.flush()
+                self.indexed_size = offset
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return len(buf) // RECORD.size
+
+    def history(self, kind: int, entity_id: str, since: Optional[float] = None,
+                limit: Optional[int] = None) -> List[Tuple[int, int]]:
+        """(時刻, 値) を古い順に返す。since より前のサンプルは読まない"""
+        with self._lock:
+            entry = self.index.get(self._key(kind, entity_id))
+            if entry is None:
+                return []
+            mm = self._view()
+            samples = []
+            offset = entry[0]
+            while offset >= 0 and (limit is None or len(samples) < limit):
+                _kind, _id, ts, value, offset = RECORD.unpack_from(mm, offset)
+                if since is not None and ts < since:
+                    break
+                samples.append((ts, value))
+        samples.reverse()
+        return samples
+
+    def views_per_day(self, video_id: str, window_days: float = 30.0, min_span_days: float = 0.5,
+                      now: Optional[float] = None) -> Optional[float]:
+        """直近 window_days 日間の履歴から1日あたりの再生数増加を求める（履歴不足なら None）"""
+        now = now if now is not None else time.time()
+        samples = self.history(VIDEO, video_id, since=now - window_days * 86400)
+        if len(samples) < 2:
+            return None
+        (t0, v0), (t1, v1) = samples[0], samples[-1]
+        span_days = (t1 - t0) / 86400
+        if span_days < min_span_days:
+            return None
+        return max(0.0, (v1 - v0) / span_days)
+
+    def flush(self):
+        """索引を保存する（保存しなくてもデータファイルから再構築できる）"""
+        with self._lock:
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=self.index_path.parent, prefix=".video_stats-", suffix=".json")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"size": self.indexed_size, "entries": self.index}, f)
+                os.replace(tmp_path, self.index_path)
+            except OSError as e:
+                print(f"⚠️ 統計索引の保存エラー: {e}")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+    store = VideoStatsStore()
+    video_id = sys.argv[1]
+    for ts, views in store.history(VIDEO, video_id):
+        print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(ts))}  {views:,}")
+    velocity = store.views_per_day(video_id)
+    print(f"1日あたりの再生数: {velocity:,.0f}" if velocity is not None else "履歴が不足しています")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+週間投稿プランナー
+向こう1週間の平日（祝日を除く）の投稿をまとめて作成します。全日のキーワードの検索を重複なく1回ずつ行い、
+動画・チャンネル詳細の取得は全日分をまとめて50件ずつの一括取得にするため、日ごとに作成するより
+クォータが少なく済みます。作成した投稿は state/weekly_plan.json に保存され、当日の自動投稿は
+検索せずにそれを送信します（同じ動画は週の中で繰り返し紹介しません）。
+
+使い方:
+    python weekly_planner.py plan [--start YYYY-MM-DD] [--days 7] [--time 09:00]
+    python weekly_planner.py show      # 保存済みの計画
+"""
+
+import os
+import sys
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from enhanced_auto_post_production import JST, YOUTUBE_QUOTA_COST, ProductionChatworkAutoPost
+from post_plan import PostPlan, schedule_fingerprint
+
+# /videos・/channels の id は1回50件まで
+DETAILS_BATCH = 50
+# キーワードを他の日と共有しても、紹介する3本のうちこの本数以上が高品質（cutoff 点以上）になること
+MIN_HIGH_QUALITY = 3
+# 日ごとに実行した場合の1キーワードの検索にかかるクォータ（検索1回と、動画・チャンネル詳細の取得）。
+# キーワード選択の学習はまとめて取得した詳細の分を按分せず、日ごとの実行と同じこの値で記録する
+SEARCH_COST = YOUTUBE_QUOTA_COST['search'] + YOUTUBE_QUOTA_COST['videos'] + YOUTUBE_QUOTA_COST['channels']
+
+
+def chunked(ids: List[str], size: int = DETAILS_BATCH) -> Iterator[List[str]]:
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+class WeeklyPlanner:
+    """投稿処理（ProductionChatworkAutoPost）の検索・スコアリング・メッセージ作成を日をまたいで使う"""
+
+    def __init__(self, poster: ProductionChatworkAutoPost, plan: PostPlan):
+        self.poster = poster
+        self.plan = plan
+
+    def plan_days(self, start: datetime, days: int = 7) -> Dict[str, Dict]:
+        """start から days 日分の平日（祝日を除く）の投稿を作成して保存し、冪等キー → 投稿を返す"""
+        poster = self.poster
+        quota_before = poster.quota_used
+
+        # 1. 日ごとのスケジュールとキーワード
+        slots = []
+        for offset in range(days):
+            when = start + timedelta(days=offset)
+            if poster.day_off(when):
+                continue
+            with poster.as_of(when):
+                schedule = poster.get_today_schedule()
+                keywords, templates, category_name, keyword = poster.choose_keyword(schedule)
+                post_key = poster.get_post_key(schedule.get("id", "custom") if schedule else "default")
+            slot = {"when": when, "schedule": schedule, "templates": templates, "category_name": category_name,
+                    "keyword": keyword, "own_keyword": keyword, "post_key": post_key}
+            # 週の中で既に選んだキーワードがその日の候補にもあれば、それを使って検索を1回で済ませる
+            shared = [s["keyword"] for s in slots if s["keyword"] in keywords]
+            if shared and keyword not in shared:
+                slot["keyword"] = shared[0]
+                print(f"🤝 他の日と同じキーワードを使います: {shared[0]}")
+            slots.append(slot)
+        if not slots:
+            print("📭 計画する平日がありません")
+            return {}
+
+        # 2. キーワードの和集合を1回ずつ検索し、全日分の詳細をまとめて取得して、日ごとに作成
+        self.results: Dict[str, List[Dict]] = {}
+        self.details: Dict[str, Dict] = {"videos": {}, "channels": {}}
+        self.fetch([slot["keyword"] for slot in slots])
+        posts: Dict[str, Dict] = {}
+        shown: set = set()
+        retry = []
+        for slot in slots:
+            post = self.compose(slot, shown)
+            if slot["keyword"] != slot["own_keyword"] and self.high_quality_count(post) < MIN_HIGH_QUALITY:
+                # 共有したキーワードでは良い動画が残っていない日は、その日のキーワードで検索し直す
+                retry.append(slot)
+                continue
+            self.add_post(posts, slot, post, shown)
+        if retry:
+            self.fetch([slot["own_keyword"] for slot in retry])
+            for slot in retry:
+                slot["keyword"] = slot["own_keyword"]
+                self.add_post(posts, slot, self.compose(slot, shown), shown)
+        poster.stats_store.flush()
+
+        self.plan.replace(posts, created_at=poster.now().isoformat(timespec="seconds"),
+                          keep_from=start.strftime("%Y-%m-%d"))
+
+        used = poster.quota_used - quota_before
+        per_day = len(slots) * SEARCH_COST
+        print(f"🗓️ {len(posts)}/{len(slots)}日分の投稿を作成しました（検索 {len(self.results)}回、"
+              f"動画詳細 {len(self.details['videos'])}件、チャンネル詳細 {len(self.details['channels'])}件）")
+        print(f"💰 消費クォータ {used} units（日ごとに作成した場合の目安 {per_day} units）")
+        return posts
+
+    def fetch(self, keywords: List[str]):
+        """未検索のキーワードを1回ずつ検索し、新しく出てきた動画・チャンネルの詳細を50件ずつまとめて取得する"""
+        poster = self.poster
+        searched = []
+        for keyword in dict.fromkeys(keywords):
+            if keyword in self.results:
+                continue
+            data, from_api = poster.search_or_reuse(keyword)
+            self.results[keyword] = (data or {}).get("items", [])
+            if from_api:
+                searched.append(keyword)
+        self.prefetch([item for items in self.results.values() for item in items])
+        for keyword in searched:
+            ranked = poster.rank_videos(self.video_infos(self.results[keyword]))
+            poster.note_search_candidates(ranked)
+            # 検索1回分の成績としてキーワード選択の学習に使う
+            ranked = ranked[:10]
+            hits = sum(1 for v in ranked if v.get('quality_score', 0) >= poster.scoring.cutoff)
+            poster.bandit.update(keyword, hits, len(ranked), SEARCH_COST, now=poster.now())
+
+    def prefetch(self, items: List[Dict]):
+        """まだ詳細のない動画・チャンネルを50件ずつまとめて取得する"""
+        poster = self.poster
+        for endpoint, ids, get in (
+                ("videos", [item["id"]["videoId"] for item in items], poster.get_video_details),
+                ("channels", [item["snippet"]["channelId"] for item in items], poster.get_channel_details)):
+            missing = [i for i in dict.fromkeys(ids) if i not in self.details[endpoint]]
+            for chunk in chunked(missing):
+                self.details[endpoint].update(get(chunk))
+                # 取得できなかった id も再取得しない
+                self.details[endpoint].update({i: {} for i in chunk if i not in self.details[endpoint]})
+
+    def video_infos(self, items: List[Dict]) -> List[Dict]:
+        self.prefetch(items)
+        return self.poster.collect_video_infos(items, self.details["videos"], self.details["channels"])
+
+    def compose(self, slot: Dict, shown: set) -> Optional[Dict]:
+        """その日の日付でスコアリングし、前の日までに紹介した動画を除いてメッセージを作成する"""
+        with self.poster.as_of(slot["when"]):
+            ranked = self.poster.rank_videos(self.video_infos(self.results[slot["keyword"]]))
+            videos = [v for v in ranked if v["video_id"] not in shown][:10]
+            return self.poster.compose_post(videos, slot["keyword"], slot["templates"], slot["category_name"])
+
+    def high_quality_count(self, post: Optional[Dict]) -> int:
+        if post is None:
+            return 0
+        return sum(1 for v in post["videos"][:3] if v.get('quality_score', 0) >= self.poster.scoring.cutoff)
+
+    @staticmethod
+    def add_post(posts: Dict[str, Dict], slot: Dict, post: Optional[Dict], shown: set):
+        date = slot["when"].strftime("%Y-%m-%d")
+        if post is None:
+            print(f"⚠️ {date}: 動画が見つからないため計画しません（当日に検索します）")
+            return
+        shown.update(v["video_id"] for v in post["videos"][:3])
+        posts[slot["post_key"]] = {"date": date, "schedule_id": slot["schedule"].get("id") if slot["schedule"] else None,
+                                   "fingerprint": schedule_fingerprint(slot["schedule"]), **post}
+
+
+def print_plan(plan: PostPlan):
+    if not plan.posts:
+        print("📭 計画がありません")
+        return
+    print(f"🗓️ 作成日時: {plan.created_at}")
+    for key, post in sorted(plan.posts.items(), key=lambda kv: kv[1].get("date", "")):
+        scores = [v.get("quality_score", 0) for v in post["videos"][:3]]
+        print(f"{post['date']}  {post['category_name']} / {post['keyword']}  "
+              f"平均 {sum(scores) / max(1, len(scores)):.1f}点  {key}")
+        for v in post["videos"][:3]:
+            print(f"    - {v['title']}（{v['channel_name']}）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="週間投稿プランナー")
+    parser.add_argument("command", nargs="?", default="plan", choices=["plan", "show"])
+    parser.add_argument("--start", help="最初の日 YYYY-MM-DD（既定: 明日）")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--time", default="09:00", help="投稿時刻 HH:MM（日本時間）")
+    args = parser.parse_args()
+
+    if args.command == "show":
+        print_plan(PostPlan())
+        return
+
+    youtube_api_key = os.getenv('YOUTUBE_API_KEY')
+    if not youtube_api_key:
+        print("❌ YOUTUBE_API_KEY が設定されていません")
+        sys.exit(1)
+    hour, minute = (int(x) for x in args.time.split(":"))
+    day = datetime.strptime(args.start, "%Y-%m-%d") if args.start else datetime.now(JST) + timedelta(days=1)
+    start = datetime(day.year, day.month, day.day, hour, minute, tzinfo=JST)
+    # 投稿は当日の自動投稿が行うため、チャットワークの設定は計画には不要
+    poster = ProductionChatworkAutoPost(os.getenv('CHATWORK_API_TOKEN', ''), os.getenv('CHATWORK_ROOM_ID', ''),
+                                        youtube_api_key)
+    WeeklyPlanner(poster, PostPlan(poster.plan_path)).plan_days(start, args.days)
+
+
+if __name__ == "__main__":
+    main()
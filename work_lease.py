@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+複数インスタンスでの投稿作業の取り合い（リース）
+(スケジュールID, 日付, ルーム) の作業を SQLite のリース表で排他的に取得し、二重投稿を防ぎます。
+取得したインスタンスは処理中に有効期限を延長（ハートビート）し、落ちたインスタンスの作業は
+期限切れ後に他のインスタンスが引き継ぎます。同じホスト（または同じ state/ を共有する環境）で有効です。
+
+使い方:
+    python work_lease.py status   # リースの一覧
+"""
+
+import os
+import sys
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+STATE_DIR = Path(__file__).parent / "state"
+LEASE_FILE = STATE_DIR / "work_leases.sqlite3"
+
+CLAIMED = "claimed"
+DONE = "done"
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class WorkLeases:
+    """
+    claim() で作業を取得し、complete() で完了、release() で手放す。
+    取得済みでも expires_at を過ぎたリースは他のインスタンスが claim() で引き継げる。
+    """
+
+    def __init__(self, path: Path = LEASE_FILE, owner: Optional[str] = None, ttl: float = 120.0,
+                 clock: Callable[[], float] = time.time):
+        self.path = Path(path)
+        self.owner = owner or default_owner()
+        self.ttl = ttl
+        self.clock = clock
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS leases (
+                work_key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                status TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                claims INTEGER NOT NULL DEFAULT 1,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+
+    def claim(self, key: str) -> bool:
+        """
+        作業を取得できれば True。未取得・期限切れ・自分が保持中なら取得でき、
+        他のインスタンスが期限内で保持している、または完了済みなら False。
+        """
+        now = self.clock()
+        with self._lock:
+            # BEGIN IMMEDIATE で書き込みロックを取ってから判定するため、同時に取得できるのは1つだけ
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT * FROM leases WHERE work_key = ?", (key,)).fetchone()
+                if row is None:
+                    self._conn.execute(
+                        "INSERT INTO leases (work_key, owner, status, expires_at, created_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (key, self.owner, CLAIMED, now + self.ttl, now, now),
+                    )
+                    claimed = True
+                elif row["status"] == CLAIMED and (row["owner"] == self.owner or row["expires_at"] < now):
+                    if row["owner"] != self.owner:
+                        print(f"🔁 期限切れのリースを引き継ぎます: {key}（前の担当: {row['owner']}）")
+                    self._conn.execute(
+                        "UPDATE leases SET owner = ?, expires_at = ?, claims = claims + 1, updated_at = ? "
+                        "WHERE work_key = ?",
+                        (self.owner, now + self.ttl, now, key),
+                    )
+                    claimed = True
+                else:
+                    claimed = False
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return claimed
+
+    def holds(self, key: str) -> bool:
+        """自分が期限内のリースを保持しているか"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM leases WHERE work_key = ? AND owner = ? AND status = ? AND expires_at >= ?",
+                (key, self.owner, CLAIMED, self.clock()),
+            ).fetchone()
+        return row is not None
+
+    def _update_own(self, sql: str, params: tuple) -> bool:
+        with self._lock:
+            cur = self._conn.execute(sql, params)
+        return cur.rowcount == 1
+
+    def heartbeat(self, key: str) -> bool:
+        """保持中のリースの期限を延長する。既に他のインスタンスに引き継がれていれば False"""
+        now = self.clock()
+        return self._update_own(
+            "UPDATE leases SET expires_at = ?, updated_at = ? WHERE work_key = ? AND owner = ? AND status = ?",
+            (now + self.ttl, now, key, self.owner, CLAIMED),
+        )
+
+    def complete(self, key: str) -> bool:
+        return self._update_own(
+            "UPDATE leases SET status = ?, updated_at = ? WHERE work_key = ? AND owner = ? AND status = ?",
+            (DONE, self.clock(), key, self.owner, CLAIMED),
+        )
+
+    def release(self, key: str) -> bool:
+        """完了せずに手放す（他のインスタンスがすぐに取得できる）"""
+        return self._update_own(
+            "DELETE FROM leases WHERE work_key = ? AND owner = ? AND status = ?", (key, self.owner, CLAIMED)
+        )
+
+    @contextmanager
+    def hold(self, key: str) -> Iterator[threading.Event]:
+        """
+        取得済みのリースを処理中、期限の1/3ごとに延長し続ける。
+        延長に失敗した（引き継がれた）場合は yield したイベントがセットされる。
+        """
+        stop = threading.Event()
+        lost = threading.Event()
+
+        def beat():
+            while not stop.wait(self.ttl / 3):
+                if not self.heartbeat(key):
+                    print(f"⚠️ リースを失いました: {key}")
+                    lost.set()
+                    return
+
+        thread = threading.Thread(target=beat, name="lease-heartbeat", daemon=True)
+        thread.start()
+        try:
+            yield lost
+        finally:
+            stop.set()
+            thread.join()
+
+    def all(self, limit: int = 50) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM leases ORDER BY updated_at DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(r) for r in rows]
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    if command == "status":
+        now = time.time()
+        for item in WorkLeases(owner="status").all():
+            left = item["expires_at"] - now
+            if item["status"] == DONE:
+                state = DONE
+            elif left > 0:
+                state = f"{CLAIMED}（残り {left:.0f}秒）"
+            else:
+                state = "expired"
+            print(f"{state:16} claims={item['claims']} {item['work_key']}  {item['owner']}")
+    else:
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+YouTube API レスポンスの永続キャッシュ
+API障害時のフォールバックや、同じリクエストの再取得を避けるために使います。
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+STATE_DIR = Path(__file__).parent / "state"
+CACHE_FILE = STATE_DIR / "youtube_cache.json"
+
+
+class YouTubeResponseCache:
+    """
+    エンドポイント＋パラメータ単位でレスポンス本文を保存するキャッシュ。
+    ファイルは一時ファイル経由で置き換えるため、書き込み途中で落ちても壊れない。
+    """
+
+    def __init__(self, path: Path = CACHE_FILE, max_entries: int = 2000, clock: Callable[[], float] = time.time):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.clock = clock
+        self.entries: Dict[str, Dict] = {}
+        self.stats = {"hits": 0, "misses": 0, "stale_hits": 0}
+        self._lock = threading.RLock()
+        self._load()
+
+    @staticmethod
+    def make_key(endpoint: str, params: Dict) -> str:
+        """APIキーを除いたパラメータからキーを作る（id の並び順には依存しない）"""
+        normalized = {}
+        for k, v in params.items():
+            if k == "key":
+                continue
+            if k == "id":
+                v = ",".join(sorted(str(v).split(",")))
+            normalized[k] = str(v)
+        return endpoint + "?" + json.dumps(normalized, ensure_ascii=False, sort_keys=True)
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("entries", {})
+        except FileNotFoundError:
+            self.entries = {}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ YouTubeキャッシュ読み込みエラー: {e}")
+            self.entries = {}
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[Dict]:
+        """
+        キャッシュエントリ（body, fetched_at, etag）を返す。
+        max_age を指定した場合、それより古いエントリはミス扱い。
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if max_age is not None and self.clock() - entry["fetched_at"] > max_age:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            return entry
+
+    def peek(self, key: str) -> Optional[Dict]:
+        """統計に数えずにエントリを返す"""
+        with self._lock:
+            return self.entries.get(key)
+
+    def get_stale(self, key: str) -> Optional[Dict]:
+        """鮮度を問わずにエントリを返す（フォールバック用）"""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.stats["stale_hits"] += 1
+            return entry
+
+    def put(self, key: str, body: Dict, etag: Optional[str] = None, size: int = 0) -> Dict:
+        """レスポンス本文を ETag・応答サイズ（バイト）とともに保存し、エントリを返す"""
+        with self._lock:
+            entry = self.entries[key] = {"body": body, "fetched_at": self.clock(), "etag": etag, "size": size}
+            if len(self.entries) > self.max_entries:
+                oldest = sorted(self.entries, key=lambda k: self.entries[k]["fetched_at"])
+                for k in oldest[:len(self.entries) - self.max_entries]:
+                    del self.entries[k]
+            self.save()
+            return entry
+
+    def touch(self, key: str) -> Optional[Dict]:
+        """再検証で未変更（304）だったエントリの取得時刻を更新して返す"""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry["fetched_at"] = self.clock()
+                self.save()
+            return entry
+
+    def save(self):
+        with self._lock:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=".youtube_cache-", suffix=".json")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    # json.dump はファイルへ少しずつ書き出すため遅い。C実装の dumps でまとめて書く
+                    f.write(json.dumps({"entries": self.entries}, ensure_ascii=False))
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"⚠️ YouTubeキャッシュ保存エラー: {e}")
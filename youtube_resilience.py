@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+YouTube API 呼び出しの耐障害レイヤー
+エンドポイントごとのサーキットブレーカーと、p95 ベースのヘッジリクエストを提供します。
+ブレーカーの状態と応答時間は state/youtube_resilience.json に保存し、cron の実行をまたいで引き継ぎます。
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+RESILIENCE_FILE = Path(__file__).parent / "state" / "youtube_resilience.json"
+
+
+class CircuitOpenError(Exception):
+    """サーキットが開いているため呼び出しを行わなかったことを示す"""
+
+
+class CircuitBreaker:
+    """
+    連続失敗が閾値に達すると一定時間呼び出しを即座に失敗させるサーキットブレーカー。
+    closed → (連続失敗) → open → (reset_timeout 経過) → half_open → 成功で closed / 失敗で open
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._half_open_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.clock() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._half_open_in_flight = False
+            if self.state == self.HALF_OPEN:
+                # 試験的な呼び出しは同時に1つだけ通す
+                if self._half_open_in_flight:
+                    self.rejected += 1
+                    return False
+                self._half_open_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._half_open_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._half_open_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"🚧 サーキットオープン: {self.name}（連続失敗 {self.consecutive_failures}回）")
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+
+class LatencyTracker:
+    """直近の応答時間を保持し、パーセンタイルを返す"""
+
+    def __init__(self, window: int = 100):
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+        return ordered[idx]
+
+
+class ResilientCaller:
+    """
+    エンドポイント単位でサーキットブレーカーとレイテンシ統計を管理し、
+    必要に応じてヘッジリクエスト（p95 経過後に同じ呼び出しをもう1本投げ、先に成功した方を採用）を行う。
+    ヘッジは重複実行しても安全な冪等 GET にのみ使うこと。
+    path を指定すると、呼び出しごとにブレーカーの状態と応答時間をそのファイルに保存し、次のプロセスで読み込む。
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 60.0,
+                 default_hedge_delay: float = 1.0, min_hedge_delay: float = 0.05,
+                 min_samples: int = 5, is_failure: Optional[Callable[[BaseException], bool]] = None,
+                 path: Optional[Path] = None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+        self.is_failure = is_failure or (lambda e: True)
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.latencies: Dict[str, LatencyTracker] = {}
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "hedged": 0, "hedge_wins": 0}
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="yt-hedge")
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.path = Path(path) if path else None
+        if self.path is not None:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"⚠️ ブレーカー状態の読み込みエラー: {e}")
+            return
+        # 開いてからの経過時間は保存時点の値に、保存からの経過時間を足して引き継ぐ
+        idle = max(0.0, time.time() - data.get("saved_at", time.time()))
+        for endpoint, saved in data.get("endpoints", {}).items():
+            breaker = self.breaker(endpoint)
+            breaker.consecutive_failures = int(saved.get("consecutive_failures", 0))
+            if saved.get("state", CircuitBreaker.CLOSED) != CircuitBreaker.CLOSED:
+                # 試験中（half_open）だったものは、次の呼び出しを試験的な呼び出しにする
+                elapsed = self.reset_timeout if saved["state"] == CircuitBreaker.HALF_OPEN else saved.get("open_for", 0.0)
+                breaker.state = CircuitBreaker.OPEN
+                breaker.opened_at = breaker.clock() - elapsed - idle
+            self.latencies[endpoint].samples.extend(saved.get("samples", []))
+
+    def save(self):
+        """ブレーカーの状態・連続失敗数・直近の応答時間を保存する"""
+        if self.path is None:
+            return
+        with self._lock:
+            endpoints = {}
+            for endpoint, breaker in self.breakers.items():
+                with breaker._lock, self.latencies[endpoint]._lock:
+                    endpoints[endpoint] = {"state": breaker.state,
+                                           "consecutive_failures": breaker.consecutive_failures,
+                                           "open_for": round(breaker.clock() - breaker.opened_at, 3),
+                                           "samples": [round(x, 4) for x in self.latencies[endpoint].samples]}
+        with self._save_lock:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=".youtube_resilience-", suffix=".json")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(json.dumps({"saved_at": time.time(), "endpoints": endpoints}))
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"⚠️ ブレーカー状態の保存エラー: {e}")
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            if endpoint not in self.breakers:
+                self.breakers[endpoint] = CircuitBreaker(endpoint, self.failure_threshold, self.reset_timeout)
+                self.latencies[endpoint] = LatencyTracker()
+            return self.breakers[endpoint]
+
+    def _count(self, name: str):
+        """stats を加算する（ヘッジやジョブのスレッドから同時に呼ばれるためロックを取る）"""
+        with self._lock:
+            self.stats[name] += 1
+
+    def hedge_delay(self, endpoint: str) -> float:
+        tracker = self.latencies.get(endpoint)
+        if tracker is None or len(tracker.samples) < self.min_samples:
+            return self.default_hedge_delay
+        return max(self.min_hedge_delay, tracker.percentile(95))
+
+    def call(self, endpoint: str, fn: Callable[[], T], hedge: bool = False) -> T:
+        """
+        fn を呼び出す。サーキットが開いていれば CircuitOpenError を送出する。
+        fn が送出した例外は is_failure が真ならブレーカーの失敗として数えた上で再送出する。
+        """
+        breaker = self.breaker(endpoint)
+        if not breaker.allow_request():
+            self._count("rejected")
+            raise CircuitOpenError(f"{endpoint} のサーキットが開いています")
+
+        self._count("calls")
+        start = time.monotonic()
+        try:
+            result = self._call_hedged(endpoint, fn) if hedge else fn()
+        except BaseException as e:
+            if self.is_failure(e):
+                self._count("failures")
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            self.save()
+            raise
+        self.latencies[endpoint].record(time.monotonic() - start)
+        breaker.record_success()
+        self.save()
+        return result
+
+    def _call_hedged(self, endpoint: str, fn: Callable[[], T]) -> T:
+        primary = self._executor.submit(fn)
+        done, _ = wait([primary], timeout=self.hedge_delay(endpoint))
+        if done:
+            return primary.result()
+
+        self._count("hedged")
+        hedge = self._executor.submit(fn)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def summary(self) -> Dict[str, Dict]:
+        """エンドポイントごとのブレーカー状態とレイテンシ"""
+        report = {}
+        for endpoint, breaker in self.breakers.items():
+            tracker = self.latencies[endpoint]
+            report[endpoint] = {
+                "state": breaker.state,
+                "rejected": breaker.rejected,
+                "p50": tracker.percentile(50),
+                "p95": tracker.percentile(95),
+            }
+        return report